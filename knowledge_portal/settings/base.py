@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     "modelcluster",
     "taggit",
     "django_filters",
+    "django_tasks",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -59,13 +60,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "portal.db_routing.ReplicaMiddleware",
+    "portal.surrogate_keys.SurrogateKeyMiddleware",
+    "portal.conditional.ConditionalPageMiddleware",
+    "portal.flash.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "wagtail.contrib.redirects.middleware.RedirectMiddleware",
+    "portal.redirects.RedirectMiddleware",
+    "portal.routing.RouteCacheMiddleware",
 ]
 
 ROOT_URLCONF = "knowledge_portal.urls"
@@ -107,6 +112,125 @@ DATABASES = {
     }
 }
 
+# Read replicas for anonymous GET traffic (portal/db_routing.py), from
+# "postgres_replicas" in data.json: [{"host": ..., "port": ...}, ...]. User,
+# password and database name default to the primary's.
+PORTAL_DB_REPLICAS = []
+for number, replica in enumerate(data.get("postgres_replicas", []), start=1):
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": replica.get("db", data["postgres_db"]),
+        "USER": replica.get("user", data["postgres_user"]),
+        "PASSWORD": replica.get("pass", data["postgres_pass"]),
+        "HOST": replica["host"],
+        "PORT": str(replica.get("port", data["postgres_port"])),
+        "OPTIONS": {"connect_timeout": 2},
+        "TEST": {"MIRROR": "default"},
+    }
+    PORTAL_DB_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["portal.db_routing.ReplicaRouter"]
+PORTAL_DB_REPLICA_MAX_LAG = data.get("replica_max_lag", 5)  # seconds
+PORTAL_DB_REPLICA_CHECK_INTERVAL = 5
+# Reads stay on the primary this long after a visitor's POST, and for all
+# visitors after a publish/unpublish
+PORTAL_DB_PRIMARY_AFTER_WRITE = 10
+PORTAL_DB_PRIMARY_PATHS = ["/admin/", "/django-admin/", "/login/", "/logout/"]
+
+# Cache shared by all workers: Redis when "redis_url" is set in data.json
+# (needs the redis package), otherwise a file-based cache, which the workers
+# of a single host share.
+if data.get("redis_url"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": data["redis_url"],
+            "KEY_PREFIX": "portal",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": BASE_DIR / "tmp" / "cache",
+            "OPTIONS": {"MAX_ENTRIES": 10_000},
+        }
+    }
+
+# Small hot objects (site lookup, site settings, nav index pages, taxonomies,
+# redirects) get a per-process LRU in front of the shared cache
+# (portal/tiered_cache.py). Invalidations reach every worker within
+# CHECK_INTERVAL seconds.
+PORTAL_TIERED_CACHE = {
+    "SHARED": "default",
+    "L1_MAX_ENTRIES": 5000,
+    "L1_TIMEOUT": 5 * 60,
+    "L2_TIMEOUT": 60 * 60,
+    "CHECK_INTERVAL": 1.0,
+    "STATS_INTERVAL": 30,
+}
+
+# Expensive computed values (home page summary, repository count) are
+# recomputed by one worker at a time, with the previous value served
+# meanwhile and early refresh before expiry (portal/single_flight.py).
+PORTAL_SINGLE_FLIGHT = {
+    "TIMEOUT": 5 * 60,
+    "STALE_TIMEOUT": 60 * 60,
+    "LEASE": 30,  # seconds before another worker may take over a recompute
+    "WAIT": 5.0,  # seconds to wait for a first computation elsewhere
+}
+
+# Edge cache: page responses carry Surrogate-Key/Cache-Tag headers and
+# content changes purge exactly those keys (portal/surrogate_keys.py) by
+# sending them to "edge_purge_url" (e.g. Fastly's
+# https://api.fastly.com/service/<id>/purge with a Fastly-Key in
+# "edge_purge_headers"). `manage.py edge_cache_proxy` is a local stand-in.
+PORTAL_SURROGATE_KEY_HEADERS = ["Surrogate-Key", "Cache-Tag"]
+PORTAL_EDGE_PURGE = {
+    "URL": data.get("edge_purge_url"),
+    "METHOD": "POST",
+    "KEY_HEADER": "Surrogate-Key",
+    "HEADERS": data.get("edge_purge_headers", {}),
+    "BATCH_SIZE": 256,
+    "TIMEOUT": 5,
+    # With the ImmediateBackend purges would be sent from the request, so they
+    # are skipped unless this is True
+    "INLINE": None,
+}
+
+# Conditional GET for pages (portal/conditional.py): ETag/Last-Modified from
+# last_published_at and per-scope content generations, 304 before rendering.
+# Set "release" per deploy so template changes reach clients (defaults to the
+# newest template mtime); listing validators roll over every bucket seconds.
+PORTAL_CONDITIONAL_RELEASE = data.get("release")
+PORTAL_CONDITIONAL_LISTING_BUCKET = 5 * 60
+
+# Page routes (portal/routing.py) have their own per-process LRU; URLs that
+# match no page are remembered only there, for NEGATIVE_TIMEOUT seconds.
+PORTAL_ROUTE_CACHE = {
+    "MAX_ENTRIES": 5000,
+    "NEGATIVE_MAX_ENTRIES": 10000,
+    "NEGATIVE_TIMEOUT": 10 * 60,
+    "L2_TIMEOUT": 60 * 60,
+}
+
+# Redirects are looked up in a cached table (portal/redirects.py), and 404s
+# without one are remembered per process so repeated junk skips the database.
+PORTAL_REDIRECTS = {
+    "NEGATIVE_MAX_ENTRIES": 10000,
+    "NEGATIVE_TIMEOUT": 10 * 60,
+    "NEGATIVE_MAX_PATH_LENGTH": 1024,
+}
+
+# Anonymous visitors' flash messages travel in a signed cookie that expires
+# after PORTAL_FLASH_MAX_AGE seconds, never in the session, and leftover
+# anonymous sessions are dropped (portal/flash.py): sessions only exist for
+# logged-in users, so anonymous GETs never load one. Logged-in users' messages
+# are kept in their session.
+MESSAGE_STORAGE = "portal.flash.FlashStorage"
+PORTAL_FLASH_MAX_AGE = 5 * 60
+
 # Email settings
 EMAIL_BACKEND = data.get(
     "email_backend",
@@ -218,3 +342,131 @@ WAGTAILADMIN_BASE_URL = "http://example.com"
 WAGTAILDOCS_EXTENSIONS = ['csv', 'docx', 'key', 'odt', 'pdf', 'pptx', 'rtf', 'txt', 'xlsx', 'zip']
 
 X_FRAME_OPTIONS = "SAMEORIGIN"
+
+# Rendered StreamField bodies (ResourcePage/TrainingPage) are cached per
+# page revision and host; document/media/embed changes invalidate them.
+PORTAL_BODY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Background tasks (django-tasks, already used by Wagtail for reference
+# indexing) are queued in the database and run by `manage.py db_worker`
+# (started next to gunicorn in the Dockerfile). For development without a
+# worker, set "tasks_backend" to "django_tasks.backends.immediate.ImmediateBackend"
+# in data.json: tasks then run inline in the request that queues them.
+TASKS = {
+    "default": {
+        "BACKEND": data.get(
+            "tasks_backend",
+            "django_tasks.backends.database.DatabaseBackend",
+        ),
+    }
+}
+if TASKS["default"]["BACKEND"].startswith("django_tasks.backends.database"):
+    INSTALLED_APPS += ["django_tasks.backends.database"]
+
+# Generate the renditions an image is used with on page publish/partner save,
+# on the task worker, instead of on the first page view (skipped when tasks
+# run inline).
+PORTAL_PREWARM_RENDITIONS = True
+
+# Image uploads are stored as a master capped at this longest edge, with
+# EXIF/ICC metadata stripped (see portal/image_ingest.py). Set
+# PORTAL_IMAGE_KEEP_ORIGINAL to also keep the untouched upload under
+# original_uploads/.
+WAGTAILIMAGES_IMAGE_FORM_BASE = "portal.forms.PortalImageForm"
+PORTAL_IMAGE_MAX_EDGE = data.get("image_max_edge", 3200)
+PORTAL_IMAGE_KEEP_ORIGINAL = bool(data.get("image_keep_original", False))
+
+# Large document/image/media uploads from the admin choosers are sent in
+# checksummed chunks (portal/chunked_uploads.py) and assembled on disk here.
+WAGTAILDOCS_DOCUMENT_FORM_BASE = "portal.forms.PortalDocumentForm"
+WAGTAILMEDIA = {
+    "MEDIA_FORM_BASE": "portal.forms.PortalMediaForm",
+}
+PORTAL_CHUNKED_UPLOAD_DIR = BASE_DIR / "tmp" / "chunked_uploads"
+PORTAL_CHUNKED_UPLOAD_MAX_SIZE = {
+    "document": 1024 * 1024 * 1024,  # 1 GB
+    "media": 2 * 1024 * 1024 * 1024,  # 2 GB
+    # "image" defaults to WAGTAILIMAGES_MAX_UPLOAD_SIZE
+}
+PORTAL_CHUNKED_UPLOAD_MAX_CHUNK = 16 * 1024 * 1024
+PORTAL_CHUNKED_UPLOAD_MAX_CHUNKS = 10_000
+
+# Document downloads (portal/document_delivery.py): Django checks access,
+# then "x-accel-redirect" hands the file to nginx through an internal
+# location aliased to MEDIA_ROOT, e.g.
+#     location /protected-media/ { internal; alias /app/media/; }
+# "x-sendfile" does the same for Apache/lighttpd. "direct" streams from
+# Django with byte-range (Range/If-Range/ETag) support.
+PORTAL_DOCUMENT_DELIVERY = data.get("document_delivery", "direct")
+PORTAL_DOCUMENT_ACCEL_LOCATION = "/protected-media/"
+
+# Background PDF processing (portal/document_processing.py): linearised
+# "fast web view" copy, first-page preview and page count. Needs qpdf and
+# poppler-utils (pdftoppm) on the worker; each tool run is capped in time
+# and address space.
+PORTAL_DOCUMENT_PROCESSING = True
+PORTAL_DOCUMENT_PROCESSING_TIMEOUT = 60  # seconds per tool run
+PORTAL_DOCUMENT_PROCESSING_MEMORY_MB = 512
+PORTAL_DOCUMENT_PROCESSING_MAX_SIZE = 200 * 1024 * 1024
+PORTAL_DOCUMENT_PREVIEW_WIDTH = 600
+# Failed runs are retried after 15 min, 30 min, 1 h (deferred tasks, else the
+# next `process_documents` run)
+PORTAL_DOCUMENT_PROCESSING_MAX_ATTEMPTS = 4
+PORTAL_DOCUMENT_PROCESSING_RETRY_BASE = 15 * 60
+
+# Office attachments (DOCX/PPTX/XLSX...) are converted to PDF by a headless
+# LibreOffice on the worker and shown in the local PDF viewer. Office Online
+# (which must fetch the file from the public internet) is only used while
+# no conversion exists, and only if this is switched on.
+PORTAL_SOFFICE_BINARY = data.get("soffice_binary")
+PORTAL_DOCUMENT_CONVERSION_TIMEOUT = 180
+PORTAL_DOCUMENT_CONVERSION_MEMORY_MB = 2048
+PORTAL_OFFICE_ONLINE_FALLBACK = bool(data.get("office_online_fallback", False))
+
+# Outgoing email outbox (portal/outbox.py). Contact notifications and
+# auto-replies are queued in the database with the submission and sent by
+# the task worker (or `manage.py send_outbox --loop`) over a reused SMTP
+# connection. With the ImmediateBackend nothing is sent from the request:
+# run `manage.py send_outbox`, or set PORTAL_OUTBOX_SEND_ON_COMMIT = True to
+# send inline anyway. For local testing, `manage.py smtp_sink` is an SMTP
+# stand-in on localhost:1025.
+PORTAL_OUTBOX_BATCH_SIZE = 50
+PORTAL_OUTBOX_MAX_ATTEMPTS = 8
+PORTAL_OUTBOX_RETRY_BASE = 30  # seconds, doubled per attempt
+PORTAL_OUTBOX_RETRY_MAX = 60 * 60
+PORTAL_OUTBOX_LEASE = 5 * 60
+PORTAL_OUTBOX_IDLE_PROBE = 30  # seconds idle before a kept-open connection is NOOP-checked
+
+# Contact submissions are spam-scored in the background (portal/spam.py)
+# before their notifications are queued; at or above the threshold they are
+# marked spam and not emailed.
+PORTAL_SPAM_THRESHOLD = 1.0
+PORTAL_SPAM_BATCH_SIZE = 100
+
+# Contact submissions are partitioned by month on PostgreSQL; resolved/spam
+# ones older than this many months are moved to gzip JSONL files by
+# `manage.py archive_contact_submissions` (run monthly, e.g. from cron).
+PORTAL_CONTACT_ARCHIVE_AFTER_MONTHS = 12
+PORTAL_CONTACT_ARCHIVE_DIR = data.get("contact_archive_dir", BASE_DIR / "archive")
+
+# Large admin listings (contact submissions, newsletter subscribers) show the
+# planner's row estimate instead of an exact COUNT(*) above this many rows,
+# and page by keyset on their default ordering (portal/pagination.py).
+PORTAL_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Rate limits for the newsletter and contact form POSTs (portal/rate_limits.py):
+# scope -> {"ip" | "email": (max attempts, sliding window in seconds)}. The
+# counters need a cache shared by all workers with atomic increments (Redis or
+# Memcached, i.e. redis_url in data.json); with the file-based fallback the
+# limits are approximate and `manage.py check` warns (portal.W001).
+PORTAL_RATE_LIMIT_CACHE = "default"
+PORTAL_RATE_LIMITS = {
+    "newsletter": {"ip": (10, 60 * 60), "email": (3, 60 * 60)},
+    "contact": {"ip": (5, 60 * 60), "email": (3, 60 * 60)},
+}
+
+# Newsletter campaigns (portal/campaigns.py, `manage.py send_campaign`).
+PORTAL_CAMPAIGN_RATE = 10  # messages per second; 0 = as fast as the relay allows
+PORTAL_CAMPAIGN_BATCH_SIZE = 200
+PORTAL_CAMPAIGN_MESSAGES_PER_CONNECTION = 100
+PORTAL_CAMPAIGN_LEASE = 10 * 60  # seconds a sender holds a campaign, renewed while sending
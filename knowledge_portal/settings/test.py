@@ -0,0 +1,8 @@
+from .dev import *
+
+# manage.py test --settings=knowledge_portal.settings.test
+#
+# Without configured replicas, a "replica" alias mirroring the test database
+# for the routing tests (portal/tests/test_db_routing.py)
+if not PORTAL_DB_REPLICAS:
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.urls import include, path
+from django.urls import include, path, re_path
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 
@@ -7,11 +7,16 @@ from wagtail.admin import urls as wagtailadmin_urls
 from wagtail import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 
+from portal import views as portal_views
 from search import views as search_views
 
 urlpatterns = [
     path("django-admin/", admin.site.urls),
     path("admin/", include(wagtailadmin_urls)),
+    re_path(r"^documents/(\d+)/preview/(.*)$", portal_views.serve_document_preview, name="portal_document_preview"),
+    re_path(r"^documents/(\d+)/web/(.*)$", portal_views.serve_document_web, name="portal_document_web"),
+    # Same URL as wagtaildocs_serve, so doc.url keeps working
+    re_path(r"^documents/(\d+)/(.*)$", portal_views.serve_document, name="portal_document_serve"),
     path("documents/", include(wagtaildocs_urls)),
     path("search/", search_views.search, name="search"),
      path(
@@ -1,15 +1,73 @@
-from django.contrib import admin
+import io
+from datetime import timedelta
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 
 # Register your models here.
-from .models import ContactSubmission
+from .forms import SubscriberImportForm
+from .models import ContactSubmission, NewsletterSubscriber, OutgoingEmail
+from .outbox import schedule_delivery
+from .pagination import KeysetPaginationAdminMixin
+from .spam import cancel_notifications
+from .subscriber_csv import export_rows, import_rows
+
+
+class ReceivedFilter(admin.SimpleListFilter):
+    """
+    Date filter over the monthly partitions. It shows everything by default,
+    so no submission (least of all an untriaged NEW one) is hidden by age;
+    picking a period lets the changelist and its search scan only the newest
+    partitions.
+    """
+    title = "received"
+    parameter_name = "received"
+    default = "all"
+
+    def lookups(self, request, model_admin):
+        return [
+            ("all", "All time"),
+            ("7", "Last 7 days"),
+            ("90", "Last 3 months"),
+            ("365", "Last 12 months"),
+        ]
+
+    def value(self):
+        return super().value() or self.default
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == lookup,
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        if self.value() == "all":
+            return queryset
+        try:
+            days = int(self.value())
+        except ValueError:
+            return queryset
+        return queryset.filter(created_at__gte=timezone.now() - timedelta(days=days))
 
 
 @admin.register(ContactSubmission)
-class ContactSubmissionAdmin(admin.ModelAdmin):
-    list_display = ("created_at", "name", "email", "subject", "status", "page")
-    list_filter = ("status", "created_at", "page")
+class ContactSubmissionAdmin(KeysetPaginationAdminMixin, admin.ModelAdmin):
+    list_display = ("created_at", "name", "email", "subject", "status", "spam_score", "page")
+    list_filter = (ReceivedFilter, "status", "page")
     search_fields = ("name", "email", "subject", "message", "organization")
-    readonly_fields = ("created_at", "ip_address", "user_agent")
+    readonly_fields = (
+        "created_at", "ip_address", "user_agent", "spam_score", "spam_reasons", "scored_at", "held_at",
+    )
+    actions = ["mark_spam", "mark_not_spam"]
+    change_list_template = "admin/portal/keyset_change_list.html"
 
     fieldsets = (
         ("Submission", {
@@ -24,4 +82,132 @@ class ContactSubmissionAdmin(admin.ModelAdmin):
         ("Technical", {
             "fields": ("ip_address", "user_agent")
         }),
+        ("Spam scoring", {
+            "fields": ("spam_score", "spam_reasons", "scored_at", "held_at")
+        }),
     )
+
+    @admin.action(description="Mark selected submissions as spam")
+    def mark_spam(self, request, queryset):
+        cancelled = cancel_notifications(queryset)
+        updated = queryset.update(status=ContactSubmission.Status.SPAM)
+        self.message_user(request, f"{updated} submissions marked as spam, {cancelled} queued emails cancelled.")
+
+    @admin.action(description="Not spam: restore and send notifications")
+    def mark_not_spam(self, request, queryset):
+        restored = 0
+        for submission in queryset.filter(status=ContactSubmission.Status.SPAM).select_related("page"):
+            # Spam held by the scorer never had its emails queued; anything
+            # else was notified when it arrived
+            held = submission.held_at is not None
+            submission.status = ContactSubmission.Status.NEW
+            submission.held_at = None
+            submission.save(update_fields=["status", "held_at"])
+            if held and submission.page is not None:
+                submission.page.queue_notifications(submission)
+            restored += 1
+        self.message_user(request, f"{restored} submissions restored.")
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "subject", "recipients", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("subject", "recipients")
+    readonly_fields = (
+        "created_at", "sent_at", "attempts", "last_error", "submission",
+    )
+    actions = ["retry_now"]
+
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutgoingEmail.Status.SENT).update(
+            status=OutgoingEmail.Status.QUEUED,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        schedule_delivery()
+        self.message_user(request, f"{updated} emails queued for retry.")
+
+
+def _csv_response(queryset, filename):
+    response = StreamingHttpResponse(export_rows(queryset), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@admin.register(NewsletterSubscriber)
+class NewsletterSubscriberAdmin(KeysetPaginationAdminMixin, admin.ModelAdmin):
+    list_display = ("email", "full_name", "status", "source", "site", "subscribed_at")
+    list_filter = ("status", "source", "site")
+    search_fields = ("email", "full_name")
+    keyset_field = "subscribed_at"
+    actions = ["export_csv"]
+    change_list_template = "admin/portal/newslettersubscriber/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "export/",
+                self.admin_site.admin_view(self.export_view),
+                name="portal_newslettersubscriber_export",
+            ),
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="portal_newslettersubscriber_import",
+            ),
+        ] + super().get_urls()
+
+    @admin.action(description="Export selected subscribers as CSV", permissions=["view"])
+    def export_csv(self, request, queryset):
+        return _csv_response(queryset, "newsletter-subscribers-selected.csv")
+
+    def export_view(self, request):
+        """Export everything matching the current changelist filters."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        queryset = self.get_changelist_instance(request).get_queryset(request)
+        return _csv_response(queryset, f"newsletter-subscribers-{timezone.localdate():%Y%m%d}.csv")
+
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = SubscriberImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            # Decode the upload incrementally; it is never read into memory whole
+            stream = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+            try:
+                result = import_rows(
+                    stream,
+                    update_existing=form.cleaned_data["update_existing"],
+                    default_source=form.cleaned_data["source"] or "import",
+                    resubscribe=form.cleaned_data["resubscribe"],
+                )
+            except (ValidationError, UnicodeDecodeError) as e:
+                form.add_error("file", getattr(e, "messages", [str(e)])[0])
+            else:
+                self.message_user(
+                    request,
+                    f"Imported {result.written} of {result.rows} rows ({result.invalid} invalid). "
+                    "Run ./manage.py update_index to refresh the admin search.",
+                    messages.WARNING if result.invalid else messages.SUCCESS,
+                )
+                if result.kept_unsubscribed:
+                    self.message_user(
+                        request,
+                        f"{result.kept_unsubscribed} unsubscribed addresses were left unsubscribed.",
+                        messages.INFO,
+                    )
+                for error in result.errors:
+                    self.message_user(request, error, messages.ERROR)
+                return redirect("admin:portal_newslettersubscriber_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import newsletter subscribers",
+            "form": form,
+        }
+        return TemplateResponse(request, "admin/portal/newslettersubscriber/import.html", context)
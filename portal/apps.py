@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PortalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal'
+
+    def ready(self):
+        from django.core import checks
+
+        from .rate_limits import check_cache
+        from .signal_handlers import register_signal_handlers
+
+        register_signal_handlers()
+        checks.register(check_cache, checks.Tags.caches)
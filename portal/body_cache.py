@@ -0,0 +1,173 @@
+# portal/body_cache.py
+"""
+Rendered StreamField cache.
+
+Resource and training bodies are rendered once per (page, revision, field,
+scheme/host) and the HTML is kept in the default cache. Each cache key also
+carries a fingerprint of the documents, media items and embeds the stream
+references (including document links inside rich text), so replacing one
+of those only invalidates the bodies that actually use it.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import get_random_string
+from django.utils.safestring import mark_safe
+from wagtail.fields import StreamField
+from wagtail.rich_text.rewriters import FIND_A_TAG, extract_attrs
+
+# Stream block types → dependency kind, for blocks whose raw value is an id/url
+_DIRECT_DEPENDENCIES = {
+    "document": "document",
+    "video": "media",
+    "embed": "embed",
+}
+
+# Struct blocks that wrap a document chooser
+_STRUCT_DOCUMENT_BLOCKS = ("office_viewer", "pdf_viewer")
+
+# Rich text blocks, whose document links render the document's URL
+_RICH_TEXT_BLOCKS = ("notes",)
+
+_KEY_PREFIX = "portal:body"
+_DEP_PREFIX = "portal:body-dep"
+
+
+def _timeout():
+    return getattr(settings, "PORTAL_BODY_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def dependency_key(kind, ref):
+    """
+    Cache key holding the current version token for one dependency.
+    Embeds are keyed by URL, so the URL is hashed to keep the key short.
+    """
+    if kind == "embed":
+        ref = hashlib.md5(str(ref).encode("utf-8")).hexdigest()
+    return f"{_DEP_PREFIX}:{kind}:{ref}"
+
+
+def stream_dependencies(stream_value):
+    """
+    Return the dependency keys a StreamValue refers to, read from the raw
+    JSON so no documents/media/embeds are loaded from the database.
+    """
+    keys = set()
+    for item in stream_value.raw_data:
+        block_type = item.get("type")
+        value = item.get("value")
+        if not value:
+            continue
+        if block_type in _DIRECT_DEPENDENCIES:
+            keys.add(dependency_key(_DIRECT_DEPENDENCIES[block_type], value))
+        elif block_type in _STRUCT_DOCUMENT_BLOCKS and isinstance(value, dict):
+            if value.get("document"):
+                keys.add(dependency_key("document", value["document"]))
+        elif block_type in _RICH_TEXT_BLOCKS and isinstance(value, str):
+            keys.update(dependency_key("document", pk) for pk in rich_text_documents(value))
+    return sorted(keys)
+
+
+def rich_text_documents(html):
+    """Ids of the documents linked from rich text (``<a linktype="document" id="...">``)."""
+    ids = set()
+    for match in FIND_A_TAG.finditer(html):
+        attrs = extract_attrs(match.group(1))
+        if attrs.get("linktype") == "document" and attrs.get("id"):
+            ids.add(attrs["id"])
+    return ids
+
+
+def page_dependencies(page):
+    """Dependency keys of all of ``page``'s StreamFields (for its conditional GET validators)."""
+    keys = set()
+    for field in page._meta.get_fields():
+        if isinstance(field, StreamField):
+            keys.update(stream_dependencies(getattr(page, field.name)))
+    return sorted(keys)
+
+
+def _new_version():
+    # When it changed (for Last-Modified), and a random part so a token never repeats
+    return f"{time.time():.3f}:{get_random_string(12)}"
+
+
+def version_time(version):
+    """When a dependency version was written, as a timestamp (0 if unknown)."""
+    try:
+        return float(str(version).split(":", 1)[0])
+    except ValueError:
+        return 0
+
+
+def touch_dependency(kind, ref):
+    """
+    Give a dependency a new version token. Every cached body that referenced
+    the old token now misses and re-renders on its next view.
+    """
+    cache.set(dependency_key(kind, ref), _new_version(), None)
+
+
+def dependency_versions(dep_keys):
+    """Current version token of each of ``dep_keys``, seeding missing ones."""
+    versions = cache.get_many(dep_keys)
+    missing = [key for key in dep_keys if key not in versions]
+    if missing:
+        # Never a constant: a culled token must not come back as one that a
+        # body was cached under before the last bump. add(), so concurrent
+        # seeders agree on the first token written
+        for key in missing:
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _fingerprint(dep_keys):
+    if not dep_keys:
+        return "0"
+    versions = dependency_versions(dep_keys)
+    raw = "|".join(f"{key}={versions.get(key)}" for key in dep_keys)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def body_cache_key(page, field_name, request, dep_keys):
+    revision_id = page.live_revision_id or page.latest_revision_id or 0
+    origin = "-"
+    if request is not None:
+        origin = f"{request.scheme}://{request.get_host()}"
+    origin = hashlib.md5(origin.encode("utf-8")).hexdigest()[:12]
+    return (
+        f"{_KEY_PREFIX}:{page.pk}:{revision_id}:{field_name}:"
+        f"{origin}:{_fingerprint(dep_keys)}"
+    )
+
+
+def _render(stream_value, context):
+    # Same output as {% include_block %}, with the request in the block context
+    return stream_value.render_as_block(context=context)
+
+
+def render_cached_stream(page, field_name, context):
+    """
+    Render ``page.<field_name>`` with a (flattened) template context, using
+    the cached HTML when the page revision and its dependencies are
+    unchanged. Previews and drafts are never cached.
+    """
+    stream_value = getattr(page, field_name)
+    request = context.get("request")
+
+    if (
+        page.pk is None
+        or getattr(request, "is_preview", False)
+        or not page.live
+    ):
+        return _render(stream_value, context)
+
+    key = body_cache_key(page, field_name, request, stream_dependencies(stream_value))
+    html = cache.get(key)
+    if html is None:
+        html = _render(stream_value, context)
+        cache.set(key, str(html), _timeout())
+    return mark_safe(html)
@@ -0,0 +1,305 @@
+# portal/campaigns.py
+"""
+Newsletter campaign sending.
+
+Recipients are streamed from the database (a server-side cursor on
+PostgreSQL, via ``QuerySet.iterator``) as plain ``(pk, email, name)`` tuples,
+skipping everyone who already has a ``CampaignDelivery`` for the campaign, so
+an interrupted send resumes where it stopped and memory stays flat however
+long the list is. Each chunk is re-checked against the current status before
+it is sent, so people who unsubscribe mid-send are not mailed.
+
+Every message carries an unsubscribe link and the List-Unsubscribe /
+List-Unsubscribe-Post (RFC 8058 one-click) headers, both pointing at the
+``newsletter_unsubscribe`` view with a signed per-subscriber token.
+
+Messages go out over one persistent SMTP connection, recycled every
+PORTAL_CAMPAIGN_MESSAGES_PER_CONNECTION messages (relays often cap this),
+paced to a configurable rate. Delivery rows are written once per batch, so
+at most one batch can be re-sent after a crash.
+
+A sender holds a lease on the campaign row (``lease_until``, for
+PORTAL_CAMPAIGN_LEASE seconds and renewed as it goes), so a second
+``send_campaign`` for the same campaign raises ``CampaignLocked`` instead of
+mailing the same recipients in parallel. A sender that crashed is taken over
+once its lease runs out.
+"""
+import re
+import time
+from datetime import timedelta
+from email.utils import formataddr
+from itertools import islice
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, F, OuterRef, Q
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html, strip_tags
+from wagtail.rich_text import expand_db_html
+
+from .outbox import is_connection_error
+
+_RELATIVE_LINK_RE = re.compile(r'(href|src)="/(?!/)')
+_UNSUBSCRIBE_SALT = "portal.campaigns.unsubscribe"
+
+
+class CampaignLocked(Exception):
+    """Another sender holds the campaign."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _lease_seconds():
+    return _setting("PORTAL_CAMPAIGN_LEASE", 10 * 60)
+
+
+def _lease_until():
+    return timezone.now() + timedelta(seconds=_lease_seconds())
+
+
+def is_locked(campaign):
+    """True while a sender holds ``campaign``'s lease."""
+    from .models import NewsletterCampaign
+
+    return NewsletterCampaign.objects.filter(pk=campaign.pk, lease_until__gt=timezone.now()).exists()
+
+
+def unsubscribe_token(subscriber_id):
+    """A signed token naming the subscriber, for their unsubscribe link."""
+    return signing.Signer(salt=_UNSUBSCRIBE_SALT).sign(str(subscriber_id))
+
+
+def subscriber_for_token(token):
+    """The subscriber id signed into ``token``, or None for a forged one."""
+    try:
+        return int(signing.Signer(salt=_UNSUBSCRIBE_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def unsubscribe_url(subscriber_id):
+    base_url = _setting("WAGTAILADMIN_BASE_URL", "").rstrip("/")
+    return base_url + reverse("newsletter_unsubscribe", args=[unsubscribe_token(subscriber_id)])
+
+
+def render_campaign(campaign):
+    """``(html, text)`` bodies; internal links are made absolute for mail clients."""
+    base_url = _setting("WAGTAILADMIN_BASE_URL", "").rstrip("/")
+    html = expand_db_html(campaign.body)
+    if base_url:
+        html = _RELATIVE_LINK_RE.sub(rf'\1="{base_url}/', html)
+    text = re.sub(r"\n{3,}", "\n\n", strip_tags(html.replace("</p>", "</p>\n\n"))).strip()
+    return html, text
+
+
+def pending_recipients(campaign, chunk_size):
+    """
+    Stream SUBSCRIBED subscribers with no delivery recorded for ``campaign``.
+    The cursor reads a snapshot, so each chunk is re-checked for who is still
+    subscribed just before it is handed out.
+    """
+    from .models import CampaignDelivery, NewsletterSubscriber
+
+    delivered = CampaignDelivery.objects.filter(
+        campaign=campaign, subscriber=OuterRef("pk")
+    )
+    rows = (
+        NewsletterSubscriber.objects
+        .filter(status=NewsletterSubscriber.Status.SUBSCRIBED)
+        .filter(~Exists(delivered))
+        .order_by("pk")
+        .values_list("pk", "email", "full_name")
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        subscribed = set(
+            NewsletterSubscriber.objects
+            .filter(pk__in=[row[0] for row in chunk], status=NewsletterSubscriber.Status.SUBSCRIBED)
+            .values_list("pk", flat=True)
+        )
+        yield from (row for row in chunk if row[0] in subscribed)
+
+
+class _Pacer:
+    """Spaces calls ``1 / rate`` seconds apart (no-op when rate is 0)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(self.next_at, now) + self.interval
+
+
+class CampaignSender:
+    def __init__(self, campaign, rate=None, batch_size=None, messages_per_connection=None, report=None):
+        self.campaign = campaign
+        self.rate = _setting("PORTAL_CAMPAIGN_RATE", 10) if rate is None else rate
+        self.batch_size = batch_size or _setting("PORTAL_CAMPAIGN_BATCH_SIZE", 200)
+        self.messages_per_connection = (
+            messages_per_connection or _setting("PORTAL_CAMPAIGN_MESSAGES_PER_CONNECTION", 100)
+        )
+        self.report = report or (lambda stats: None)
+        self.connection = None
+        self._sent_on_connection = 0
+        self.html, self.text = render_campaign(campaign)
+
+    # Connection handling
+
+    def _connection(self):
+        if self.connection is not None and self._sent_on_connection >= self.messages_per_connection:
+            self._close()
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+            self._sent_on_connection = 0
+        return self.connection
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.connection = None
+
+    def _message(self, subscriber_id, email, name):
+        url = unsubscribe_url(subscriber_id)
+        message = EmailMultiAlternatives(
+            subject=self.campaign.subject,
+            body=f"{self.text}\n\n--\nUnsubscribe: {url}",
+            from_email=self.campaign.from_email or None,
+            to=[formataddr((name, email)) if name else email],
+            connection=self._connection(),
+            headers={
+                "List-Unsubscribe": f"<{url}>",
+                "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+            },
+        )
+        message.attach_alternative(
+            self.html + format_html('<p><a href="{}">Unsubscribe</a></p>', url), "text/html"
+        )
+        return message
+
+    def _send_one(self, subscriber_id, email, name):
+        """
+        Send one message, reconnecting once if the relay dropped us. Returns
+        the error for a rejected recipient; a relay that stays unreachable
+        aborts the whole send (it resumes on the next run).
+        """
+        try:
+            self._message(subscriber_id, email, name).send()
+        except Exception as exc:
+            if not is_connection_error(exc):
+                return exc
+            self._close()
+            try:
+                self._message(subscriber_id, email, name).send()
+            except Exception as retry_exc:
+                if is_connection_error(retry_exc):
+                    raise
+                return retry_exc
+        self._sent_on_connection += 1
+        return None
+
+    # Sending
+
+    def _record(self, batch):
+        from .models import CampaignDelivery, NewsletterCampaign
+
+        CampaignDelivery.objects.bulk_create(batch, ignore_conflicts=True)
+        sent = sum(1 for d in batch if d.status == CampaignDelivery.Status.SENT)
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            sent_count=F("sent_count") + sent,
+            failed_count=F("failed_count") + len(batch) - sent,
+        )
+
+    def _claim(self):
+        from .models import NewsletterCampaign
+
+        campaign = self.campaign
+        claimed = (
+            NewsletterCampaign.objects
+            .filter(pk=campaign.pk)
+            .filter(Q(lease_until__isnull=True) | Q(lease_until__lte=timezone.now()))
+            .update(
+                status=NewsletterCampaign.Status.SENDING,
+                started_at=campaign.started_at or timezone.now(),
+                lease_until=_lease_until(),
+            )
+        )
+        if not claimed:
+            raise CampaignLocked(f"Campaign {campaign.pk} is already being sent.")
+        self._renew_at = time.monotonic() + _lease_seconds() / 3
+
+    def _renew(self):
+        from .models import NewsletterCampaign
+
+        if time.monotonic() >= self._renew_at:
+            NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(lease_until=_lease_until())
+            self._renew_at = time.monotonic() + _lease_seconds() / 3
+
+    def send(self):
+        from .models import CampaignDelivery, NewsletterCampaign
+
+        campaign = self.campaign
+        if campaign.status == NewsletterCampaign.Status.SENT:
+            return {"sent": 0, "failed": 0, "elapsed": 0.0, "rate": 0.0}
+        self._claim()
+
+        pacer = _Pacer(self.rate)
+        started = time.monotonic()
+        stats = {"sent": 0, "failed": 0}
+        batch = []
+
+        def flush():
+            self._record(batch)
+            batch.clear()
+            elapsed = time.monotonic() - started
+            stats["elapsed"] = elapsed
+            stats["rate"] = (stats["sent"] + stats["failed"]) / elapsed if elapsed else 0.0
+            self.report(dict(stats))
+
+        try:
+            for subscriber_id, email, name in pending_recipients(campaign, self.batch_size):
+                pacer.wait()
+                error = self._send_one(subscriber_id, email, name)
+                if error is None:
+                    stats["sent"] += 1
+                    batch.append(CampaignDelivery(
+                        campaign=campaign, subscriber_id=subscriber_id,
+                        status=CampaignDelivery.Status.SENT,
+                    ))
+                else:
+                    stats["failed"] += 1
+                    batch.append(CampaignDelivery(
+                        campaign=campaign, subscriber_id=subscriber_id,
+                        status=CampaignDelivery.Status.FAILED,
+                        error=f"{type(error).__name__}: {error}"[:500],
+                    ))
+                if len(batch) >= self.batch_size:
+                    flush()
+                self._renew()
+        finally:
+            if batch:
+                flush()
+            self._close()
+            NewsletterCampaign.objects.filter(pk=campaign.pk).update(lease_until=None)
+
+        NewsletterCampaign.objects.filter(pk=campaign.pk).update(
+            status=NewsletterCampaign.Status.SENT,
+            finished_at=timezone.now(),
+        )
+        elapsed = time.monotonic() - started
+        stats["elapsed"] = elapsed
+        stats["rate"] = (stats["sent"] + stats["failed"]) / elapsed if elapsed else 0.0
+        return stats
@@ -0,0 +1,277 @@
+# portal/chunked_uploads.py
+"""
+Chunked, resumable uploads for the document, image and media choosers.
+
+The browser opens an upload session, PUTs the file in fixed-size chunks
+(each with an X-Chunk-SHA256 header) and asks for the session status to
+resume after a network failure. Chunks are streamed straight to disk and
+only kept once their checksum matches. ``complete`` concatenates them into
+one file, and the admin form then picks that file up by session id (see
+``ChunkedUploadFormMixin`` in portal/forms.py) so the final POST carries no
+file body at all.
+
+Session state lives next to the chunks (``manifest.json``), so every
+gunicorn worker on the host sees the same uploads without a DB table.
+"""
+import hashlib
+import json
+import math
+import mimetypes
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files.uploadedfile import UploadedFile
+
+_READ_BLOCK = 64 * 1024
+_MANIFEST = "manifest.json"
+_ASSEMBLED = "assembled"
+
+KINDS = ("document", "image", "media")
+
+
+class ChunkedUploadError(ValidationError):
+    pass
+
+
+def upload_root():
+    return Path(getattr(
+        settings, "PORTAL_CHUNKED_UPLOAD_DIR", Path(settings.BASE_DIR) / "tmp" / "chunked_uploads"
+    ))
+
+
+def max_size(kind):
+    limits = getattr(settings, "PORTAL_CHUNKED_UPLOAD_MAX_SIZE", {})
+    if kind == "image":
+        return limits.get("image", getattr(settings, "WAGTAILIMAGES_MAX_UPLOAD_SIZE", 10 * 1024 * 1024))
+    return limits.get(kind, 1024 * 1024 * 1024)
+
+
+def chunk_size_limits():
+    return (
+        int(getattr(settings, "PORTAL_CHUNKED_UPLOAD_MIN_CHUNK", 256 * 1024)),
+        int(getattr(settings, "PORTAL_CHUNKED_UPLOAD_MAX_CHUNK", 16 * 1024 * 1024)),
+    )
+
+
+def max_chunks():
+    return int(getattr(settings, "PORTAL_CHUNKED_UPLOAD_MAX_CHUNKS", 10_000))
+
+
+def _session_dir(upload_id):
+    # Validate before touching the filesystem; ids are always uuid4 hex
+    try:
+        upload_id = uuid.UUID(hex=str(upload_id)).hex
+    except ValueError:
+        raise ChunkedUploadError("Unknown upload.")
+    return upload_root() / upload_id
+
+
+def _write_manifest(path, manifest):
+    tmp = path / f"{_MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, path / _MANIFEST)
+
+
+def _permission_policy(kind):
+    if kind == "document":
+        from wagtail.documents.permissions import permission_policy
+    elif kind == "image":
+        from wagtail.images.permissions import permission_policy
+    else:
+        from wagtailmedia.permissions import permission_policy
+    return permission_policy
+
+
+def can_upload(user, kind):
+    """Whether ``user`` may add the document, image or media an upload becomes."""
+    try:
+        policy = _permission_policy(kind)
+    except ImportError:
+        return False
+    return policy.user_has_permission(user, "add")
+
+
+def load_session(upload_id, user):
+    path = _session_dir(upload_id)
+    try:
+        manifest = json.loads((path / _MANIFEST).read_text())
+    except (OSError, ValueError):
+        raise ChunkedUploadError("Unknown upload.")
+    # Checked on every request, so revoking the permission stops an upload
+    if manifest["user_id"] != user.pk or not can_upload(user, manifest["kind"]):
+        raise PermissionDenied
+    return path, manifest
+
+
+def received_chunks(path, manifest):
+    return sorted(
+        i for i in range(manifest["total_chunks"])
+        if (path / f"{i}.part").exists()
+    )
+
+
+def create_session(user, filename, total_size, chunk_size, kind):
+    if kind not in KINDS:
+        raise ChunkedUploadError("Unsupported upload kind.")
+    if not can_upload(user, kind):
+        raise PermissionDenied
+    if total_size <= 0:
+        raise ChunkedUploadError("Empty file.")
+    if total_size > max_size(kind):
+        raise ChunkedUploadError("File is too large.")
+
+    min_chunk, max_chunk = chunk_size_limits()
+    if not min_chunk <= chunk_size <= max_chunk:
+        raise ChunkedUploadError(f"Chunk size must be between {min_chunk} and {max_chunk} bytes.")
+    total_chunks = math.ceil(total_size / chunk_size)
+    if total_chunks > max_chunks():
+        raise ChunkedUploadError("Too many chunks; use a larger chunk size.")
+
+    upload_id = uuid.uuid4().hex
+    path = upload_root() / upload_id
+    path.mkdir(parents=True)
+    manifest = {
+        "id": upload_id,
+        "user_id": user.pk,
+        "kind": kind,
+        "filename": os.path.basename(filename)[:255] or "upload",
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "total_chunks": total_chunks,
+        "created_at": time.time(),
+        "sha256": None,
+    }
+    _write_manifest(path, manifest)
+    return manifest
+
+
+def expected_chunk_length(manifest, index):
+    if index == manifest["total_chunks"] - 1:
+        return manifest["total_size"] - manifest["chunk_size"] * index
+    return manifest["chunk_size"]
+
+
+def store_chunk(path, manifest, index, stream, checksum):
+    """
+    Stream one chunk to disk, rejecting it if it is longer or shorter than
+    expected or its SHA-256 does not match ``checksum``. Re-sending a chunk
+    that was already stored is a no-op, so clients can retry blindly.
+    """
+    if not 0 <= index < manifest["total_chunks"]:
+        raise ChunkedUploadError("Chunk index out of range.")
+    if not checksum:
+        raise ChunkedUploadError("Missing X-Chunk-SHA256 header.")
+    final = path / f"{index}.part"
+    if final.exists():
+        return
+
+    expected = expected_chunk_length(manifest, index)
+    digest = hashlib.sha256()
+    written = 0
+    tmp = path / f"{index}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                block = stream.read(min(_READ_BLOCK, expected + 1 - written))
+                if not block:
+                    break
+                written += len(block)
+                if written > expected:
+                    raise ChunkedUploadError("Chunk is larger than expected.")
+                digest.update(block)
+                out.write(block)
+        if written != expected:
+            raise ChunkedUploadError("Chunk is incomplete.")
+        if digest.hexdigest() != checksum.strip().lower():
+            raise ChunkedUploadError("Chunk checksum mismatch.")
+        os.replace(tmp, final)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def complete_session(path, manifest):
+    """
+    Concatenate the chunks into one file (block by block, never in memory)
+    and record its SHA-256. Safe to call again once complete.
+    """
+    assembled = path / _ASSEMBLED
+    if manifest["sha256"] and assembled.exists():
+        return manifest
+
+    missing = set(range(manifest["total_chunks"])) - set(received_chunks(path, manifest))
+    if missing:
+        raise ChunkedUploadError(f"{len(missing)} chunks are missing.")
+
+    digest = hashlib.sha256()
+    tmp = path / f"{_ASSEMBLED}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as out:
+        for index in range(manifest["total_chunks"]):
+            with open(path / f"{index}.part", "rb") as part:
+                while block := part.read(_READ_BLOCK):
+                    digest.update(block)
+                    out.write(block)
+    if tmp.stat().st_size != manifest["total_size"]:
+        tmp.unlink()
+        raise ChunkedUploadError("Assembled file size does not match.")
+    os.replace(tmp, assembled)
+
+    for index in range(manifest["total_chunks"]):
+        (path / f"{index}.part").unlink(missing_ok=True)
+
+    manifest["sha256"] = digest.hexdigest()
+    _write_manifest(path, manifest)
+    return manifest
+
+
+def discard_session(upload_id):
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
+
+
+class ChunkedUploadedFile(UploadedFile):
+    """
+    An assembled upload, exposed like Django's TemporaryUploadedFile so that
+    FileSystemStorage moves it into place instead of copying it.
+    """
+
+    def __init__(self, path, manifest, content_type=None):
+        self._path = str(path)
+        # Hashed while it was assembled
+        self.sha256 = manifest["sha256"]
+        super().__init__(
+            file=open(path, "rb"),
+            name=manifest["filename"],
+            content_type=content_type or "application/octet-stream",
+            size=manifest["total_size"],
+            charset=None,
+        )
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def open_completed(upload_id, user, kind):
+    path, manifest = load_session(upload_id, user)
+    if manifest["kind"] != kind or not manifest["sha256"]:
+        raise ChunkedUploadError("Upload is not complete.")
+    content_type = mimetypes.guess_type(manifest["filename"])[0]
+    return ChunkedUploadedFile(path / _ASSEMBLED, manifest, content_type)
+
+
+def clear_expired(max_age_seconds):
+    """Remove sessions older than ``max_age_seconds``; returns how many."""
+    root = upload_root()
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in root.iterdir():
+        if path.is_dir() and path.stat().st_mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
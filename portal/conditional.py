@@ -0,0 +1,177 @@
+# portal/conditional.py
+"""
+Conditional GET for Wagtail pages.
+
+Each anonymous page response carries a weak ``ETag`` and a ``Last-Modified``
+derived, before anything is rendered, from:
+
+* the page's ``last_published_at``
+* the content generations of the scopes rendered into it: ``site`` (site
+  settings, partners), the nav index page types, the page itself, and the
+  types a listing page lists (or the taxonomy types, for detail pages)
+* the versions of the documents, media items and embeds its StreamFields
+  reference (portal/body_cache.py), so replacing one changes the validators
+  of the pages that show it
+* the release (PORTAL_CONDITIONAL_RELEASE, else the newest template mtime),
+  so a deploy that changes templates changes every ETag
+
+A content generation is the time a scope last changed, kept in the shared
+cache under the same names as the surrogate keys (portal/surrogate_keys.py)
+and bumped alongside their purges. Listing pages also show time-dependent
+things (upcoming webinars), so their validators roll over every
+PORTAL_CONDITIONAL_LISTING_BUCKET seconds.
+
+An ``on_serve_page`` hook (wagtail_hooks.py), inside Wagtail's view
+restriction check, answers ``If-None-Match`` / ``If-Modified-Since`` with a
+304 before the page's ``serve`` runs: no context, listing queries or
+template rendering. ``ConditionalPageMiddleware`` adds the validators to the
+responses that did get rendered.
+
+Requests with a session cookie (editors, logged-in users, visitors who
+entered a page password) or a pending flash message (portal/flash.py) are
+left alone.
+"""
+import hashlib
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.template import engines
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .body_cache import dependency_versions, page_dependencies, version_time
+from .flash import has_flash
+from .surrogate_keys import LISTINGS, SITE_KEY, TAXONOMY_FIELDS, TAXONOMY_MODELS, page_key, type_key
+from .tiered_cache import tiered_cache
+
+_KEY_PREFIX = "portal:cg"
+
+# Page types in the nav/footer of every page (context_processors.py)
+NAV_TYPES = (
+    "portal.repositoryindexpage", "portal.expertindexpage", "portal.webinarindexpage",
+    "portal.testimonialindexpage", "portal.trainingindexpage", "portal.aboutpage", "portal.contactpage",
+)
+
+DEFAULT_LISTING_BUCKET = 5 * 60
+
+
+# Content generations
+
+def _generation_key(scope):
+    return f"{_KEY_PREFIX}:{scope}"
+
+
+def bump(scopes):
+    """Record that ``scopes`` changed, once the current transaction commits."""
+    scopes = set(scopes)
+    if scopes:
+        transaction.on_commit(lambda: tiered_cache.shared.set_many(
+            {_generation_key(scope): time.time() for scope in scopes}, None
+        ))
+
+
+def generations(scopes):
+    """Last-change time of each scope. Unknown (or evicted) scopes start now."""
+    shared = tiered_cache.shared
+    keys = {scope: _generation_key(scope) for scope in scopes}
+    found = shared.get_many(keys.values())
+    missing = {key: time.time() for key in keys.values() if key not in found}
+    if missing:
+        for key, value in missing.items():
+            shared.add(key, value, None)
+        # Another worker may have seeded or bumped the same scopes meanwhile
+        found.update(shared.get_many(missing))
+    return {scope: found.get(key, missing.get(key)) for scope, key in keys.items()}
+
+
+# Validators
+
+@lru_cache(maxsize=None)
+def _release():
+    configured = getattr(settings, "PORTAL_CONDITIONAL_RELEASE", None)
+    if configured:
+        return str(configured)
+    newest = 0
+    for engine in engines.all():
+        for directory in getattr(engine, "template_dirs", ()):
+            for path in Path(directory).rglob("*.html"):
+                newest = max(newest, path.stat().st_mtime)
+    return f"{newest:.0f}"
+
+
+def page_scopes(page):
+    """The content generations ``page`` (specific) depends on."""
+    label = page._meta.label_lower
+    scopes = {SITE_KEY, page_key(page), *(type_key(nav) for nav in NAV_TYPES)}
+    if label in LISTINGS:
+        scopes.update(type_key(listed) for listed in LISTINGS[label])
+    elif any(hasattr(page, field) for field in TAXONOMY_FIELDS):
+        scopes.update(type_key(model) for model in TAXONOMY_MODELS)
+    return sorted(scopes)
+
+
+def page_validators(page):
+    """``(etag, last_modified)`` for serving ``page``, last_modified as a timestamp."""
+    versions = generations(page_scopes(page))
+    published = page.last_published_at.timestamp() if page.last_published_at else 0
+    parts = [_release(), str(page.pk), repr(published)]
+    parts += [f"{scope}={versions[scope]!r}" for scope in sorted(versions)]
+    last_modified = max([published, *versions.values()])
+
+    dependencies = page_dependencies(page)
+    if dependencies:
+        dependency_tokens = dependency_versions(dependencies)
+        parts += [f"{key}={dependency_tokens.get(key)}" for key in dependencies]
+        last_modified = max([last_modified, *map(version_time, dependency_tokens.values())])
+
+    if page._meta.label_lower in LISTINGS:
+        bucket = getattr(settings, "PORTAL_CONDITIONAL_LISTING_BUCKET", DEFAULT_LISTING_BUCKET)
+        started = time.time() // bucket * bucket
+        parts.append(repr(started))
+        last_modified = max(last_modified, started)
+
+    digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"', int(last_modified)
+
+
+def _eligible(request):
+    # A pending flash message must be rendered, not revalidated away
+    return (
+        request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and not has_flash(request)
+    )
+
+
+def conditional_page_response(page, request):
+    """A 304 (or 412) if the client's copy of ``page`` is current, else None."""
+    if not _eligible(request):
+        return None
+    etag, last_modified = page_validators(page)
+    request.page_validators = (etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        # As the full response would (session and CSRF cookies)
+        patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+class ConditionalPageMiddleware:
+    """Adds the validators computed while serving a page to its response."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        validators = getattr(request, "page_validators", None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            if not response.has_header("ETag"):
+                response["ETag"] = etag
+            if not response.has_header("Last-Modified"):
+                response["Last-Modified"] = http_date(last_modified)
+        return response
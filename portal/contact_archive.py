@@ -0,0 +1,88 @@
+# portal/contact_archive.py
+"""
+Archival of old contact submissions.
+
+Resolved and spam submissions older than a cutoff are written to one
+gzip-compressed JSON Lines file per month (``contact-submissions-YYYY-MM.jsonl.gz``)
+and then deleted, batch by batch: a batch is flushed to disk before its rows
+are deleted, so an interrupted run can at worst archive a batch twice. A
+rerun appends another gzip member to the month's file, which gzip readers
+treat as one stream.
+
+Months left empty afterwards have their partition dropped (see
+portal/partitions.py).
+"""
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .partitions import add_months, month_start
+
+ARCHIVE_FIELDS = [
+    "id", "created_at", "status", "page_id", "name", "email", "organization",
+    "subject", "message", "ip_address", "user_agent", "spam_score", "spam_reasons",
+]
+
+
+def archive_dir():
+    return Path(getattr(settings, "PORTAL_CONTACT_ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+
+
+def archivable(before):
+    from .models import ContactSubmission
+
+    return ContactSubmission.objects.filter(
+        created_at__lt=before,
+        status__in=[ContactSubmission.Status.RESOLVED, ContactSubmission.Status.SPAM],
+    )
+
+
+def archive_month(month, before, directory, batch_size=1000):
+    """
+    Archive and delete the archivable rows created in ``month`` (and before
+    ``before``). Returns the number of rows archived.
+    """
+    from .models import ContactSubmission
+
+    end = min(add_months(month, 1), before)
+    # Bounded on created_at, so every query stays inside one partition
+    queryset = archivable(end).filter(created_at__gte=month).order_by("created_at", "pk")
+    path = Path(directory) / f"contact-submissions-{month:%Y-%m}.jsonl.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    archived = 0
+    while True:
+        rows = list(queryset.values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            return archived
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+                f.write("\n")
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        with transaction.atomic():
+            # delete() also nulls OutgoingEmail.submission (no DB constraint)
+            ContactSubmission.objects.filter(
+                pk__in=[row["id"] for row in rows], created_at__gte=month, created_at__lt=end,
+            ).delete()
+        archived += len(rows)
+
+
+def archive_months(before):
+    """Months that have archivable rows older than ``before``."""
+    from django.db.models.functions import TruncMonth
+
+    months = (
+        archivable(before)
+        .annotate(month=TruncMonth("created_at", tzinfo=month_start(before).tzinfo))
+        .values_list("month", flat=True)
+        .distinct()
+        .order_by("month")
+    )
+    return [month_start(month) for month in months]
@@ -1,14 +1,12 @@
 # portal/context_processors.py
 from wagtail.models import Site
 from .models import RepositoryIndexPage, ExpertIndexPage, WebinarIndexPage, TestimonialIndexPage,TrainingIndexPage,AboutPage,ContactPage
+from .sites import site_id_for_request
+from .surrogate_keys import SITE_KEY, add_keys, page_key
+from .tiered_cache import tiered_cache
 
-def portal_index_pages(request):
-    site = Site.find_for_request(request)
-    if not site:
-        return {}
-
-    root = site.root_page
 
+def _index_pages(root):
     return {
         "repo_index": RepositoryIndexPage.objects.child_of(root).live().first(),
         "experts_index": ExpertIndexPage.objects.child_of(root).live().first(),
@@ -18,3 +16,18 @@ def portal_index_pages(request):
         "about_index": AboutPage.objects.live().public().first(),
         "contact_index": ContactPage.objects.live().public().first(),
     }
+
+
+def portal_index_pages(request):
+    # Cached site id: the fast 404s (redirects.py) render this without queries
+    site_id = site_id_for_request(request)
+    if not site_id:
+        return {}
+
+    # Invalidated on page publish/unpublish/move/delete (signal_handlers.py)
+    pages = tiered_cache.get_or_set(
+        "index-pages", site_id, lambda: _index_pages(Site.objects.get(pk=site_id).root_page)
+    )
+    # Every page shows these in the nav/footer, plus the site-wide footer bits
+    add_keys(request, [SITE_KEY, *(page_key(page) for page in pages.values() if page)])
+    return pages
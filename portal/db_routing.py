@@ -0,0 +1,227 @@
+# portal/db_routing.py
+"""
+Read replicas for anonymous page traffic.
+
+``ReplicaMiddleware`` decides per request whether reads may go to a replica:
+only GET/HEAD requests without a session cookie (anonymous visitors: page
+serving, ``search/``, document links), outside PORTAL_DB_PRIMARY_PATHS
+(the admins, login) and outside a read-your-writes window. ``ReplicaRouter``
+then sends that request's reads to one replica, picked once per request so
+every query sees the same snapshot. Everything else (writes, POSTs, editors,
+management commands and tasks) stays on ``default``, the primary.
+
+Read-your-writes:
+
+* A POST (or other unsafe request) that writes anything gets a
+  ``portal_primary_until`` cookie, so the same visitor reads from the
+  primary for PORTAL_DB_PRIMARY_AFTER_WRITE seconds (e.g. the page shown
+  after a form post).
+* Publishing or unpublishing a page pins *all* traffic to the primary for
+  the same window, so a freshly published page is never re-rendered (and
+  cached) from a replica that has not replayed it yet. The pin is kept in
+  the default cache, so it covers all workers only with a shared cache.
+* Within a request, reads after a write go to the primary too.
+
+Each worker checks its replicas' replay lag every
+PORTAL_DB_REPLICA_CHECK_INTERVAL seconds and skips replicas that are behind
+by more than PORTAL_DB_REPLICA_MAX_LAG or unreachable. ``manage.py
+replica_status`` runs the same check.
+
+Local setup with a second PostgreSQL as a streaming replica of the first::
+
+    pg_basebackup -h localhost -p 5432 -U postgres -D /tmp/replica -R -X stream
+    pg_ctl -D /tmp/replica -o "-p 5434" start
+
+then add ``"postgres_replicas": [{"host": "localhost", "port": 5434}]`` to
+data.json. Under ``manage.py test`` replicas mirror the test database.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "portal_primary_until"
+_PIN_KEY = "portal:db:primary-until"
+
+_LAG_SQL = """
+    SELECT pg_is_in_recovery(),
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END
+"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def replica_aliases():
+    return list(_setting("PORTAL_DB_REPLICAS", []))
+
+
+@dataclass
+class _RequestState:
+    replica: str = None  # alias reads go to, None for the primary
+    wrote: bool = False
+
+
+_state = ContextVar("portal_db_routing", default=None)
+
+
+class ReplicaRouter:
+    """Reads of replica-eligible requests go to their replica; writes to ``default``."""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # Never None: Django would fall back to the db the instance was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+# Replica health
+
+@dataclass
+class ReplicaStatus:
+    alias: str
+    in_recovery: bool = None
+    lag: float = None  # seconds
+    error: str = ""
+
+    @property
+    def usable(self):
+        return not self.error and self.lag is not None and self.lag <= _setting("PORTAL_DB_REPLICA_MAX_LAG", 5)
+
+
+def check_replica(alias):
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(_LAG_SQL)
+            in_recovery, lag = cursor.fetchone()
+    except DatabaseError as exc:
+        connection.close()
+        return ReplicaStatus(alias, error=" ".join(str(exc).split()) or exc.__class__.__name__)
+    if not in_recovery:
+        # Not a standby (e.g. the test database mirror): nothing to lag behind
+        lag = 0
+    return ReplicaStatus(alias, in_recovery, None if lag is None else float(lag))
+
+
+_usable = []
+_checked_at = None
+_check_lock = threading.Lock()
+
+
+def usable_replicas():
+    """Replicas within the lag tolerance, re-checked every PORTAL_DB_REPLICA_CHECK_INTERVAL."""
+    global _usable, _checked_at
+    aliases = replica_aliases()
+    if not aliases:
+        return []
+    interval = _setting("PORTAL_DB_REPLICA_CHECK_INTERVAL", 5)
+    if _checked_at is not None and time.monotonic() - _checked_at < interval:
+        return _usable
+    # One thread re-checks; the others keep using the previous result
+    if not _check_lock.acquire(blocking=_checked_at is None):
+        return _usable
+    try:
+        if _checked_at is None or time.monotonic() - _checked_at >= interval:
+            statuses = [check_replica(alias) for alias in aliases]
+            for status in statuses:
+                if not status.usable:
+                    logger.warning(
+                        "Replica %s skipped: %s", status.alias,
+                        status.error or f"lag {status.lag}s",
+                    )
+            _usable = [status.alias for status in statuses if status.usable]
+            _checked_at = time.monotonic()
+    finally:
+        _check_lock.release()
+    return _usable
+
+
+# Read-your-writes
+
+def _window():
+    return _setting("PORTAL_DB_PRIMARY_AFTER_WRITE", 10)
+
+
+def pin_primary():
+    """Send all reads to the primary for the read-your-writes window (after a publish)."""
+    window = _window()
+    cache.set(_PIN_KEY, time.time() + window, timeout=window)
+
+
+def primary_pinned_until():
+    return cache.get(_PIN_KEY) or 0
+
+
+def _cookie_until(request):
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+def _replica_eligible(request):
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    if request.path.startswith(tuple(_setting("PORTAL_DB_PRIMARY_PATHS", ()))):
+        return False
+    now = time.time()
+    return _cookie_until(request) <= now and primary_pinned_until() <= now
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RequestState()
+        if _replica_eligible(request):
+            replicas = usable_replicas()
+            if replicas:
+                state.replica = random.choice(replicas)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        # Writes on GET (e.g. a first-time image rendition) are not the visitor's own
+        if state.wrote and request.method not in ("GET", "HEAD", "OPTIONS"):
+            window = _window()
+            response.set_cookie(
+                PRIMARY_COOKIE, str(int(time.time() + window)),
+                max_age=window, httponly=True, samesite="Lax",
+                secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,155 @@
+# portal/document_delivery.py
+"""
+Document delivery for the /documents/<id>/<filename> URLs.
+
+Django does the lookup and permission checks (Wagtail's before_serve_document
+hooks, e.g. collection view restrictions) and then, depending on
+PORTAL_DOCUMENT_DELIVERY:
+
+- ``"x-accel-redirect"``: hands the transfer to nginx through an internal
+  location (PORTAL_DOCUMENT_ACCEL_LOCATION) that maps onto MEDIA_ROOT;
+- ``"x-sendfile"``: hands it to Apache/lighttpd with the absolute path;
+- ``"direct"`` (default): streams the file itself, honouring single byte
+  ``Range`` requests with ``If-Range``, ``ETag`` and ``Last-Modified``.
+
+Conditional requests (If-None-Match / If-Modified-Since) are answered with a
+304 before any of these. In proxy modes nginx/Apache handle byte ranges.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+_READ_BLOCK = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(?P<start>\d*)-(?P<end>\d*)$")
+
+MODES = ("direct", "x-accel-redirect", "x-sendfile")
+
+
+def delivery_mode():
+    mode = getattr(settings, "PORTAL_DOCUMENT_DELIVERY", "direct")
+    return mode if mode in MODES else "direct"
+
+
+def document_etag(document):
+    # file_hash is the SHA-1 Wagtail records on upload
+    return f'"{document.file_hash}"' if document.file_hash else None
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single ``bytes=`` range, None to
+    ignore the header (absent, malformed, multi-range) or ``False`` when the
+    range can't be satisfied.
+    """
+    match = _RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    start, end = match.group("start"), match.group("end")
+    if not start:
+        if not end:
+            return None
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    if start >= size:
+        return False
+    end = int(end) if end else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A Range is only honoured if If-Range (when sent) still matches."""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # Weak validators never match for ranges
+        return bool(etag) and if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(last_modified) == date
+
+
+def _iter_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(_READ_BLOCK, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _direct_response(request, path, size, etag, last_modified):
+    byte_range = None
+    if request.method == "GET" and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        # Full body: FileResponse lets the WSGI server use sendfile(2)
+        response = FileResponse(open(path, "rb"))
+        response["Content-Length"] = size
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_iter_range(path, start, length), status=206)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = length
+    return response
+
+
+def _proxy_response(mode, path):
+    response = HttpResponse()
+    if mode == "x-sendfile":
+        response["X-Sendfile"] = path
+        return response
+    location = getattr(settings, "PORTAL_DOCUMENT_ACCEL_LOCATION", "/protected-media/")
+    relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+    response["X-Accel-Redirect"] = quote(location.rstrip("/") + "/" + relative)
+    return response
+
+
+def deliver_document(request, document, path, content_type=None, content_disposition=None, etag=None):
+    """
+    Build the response for a local document file the user may read. The
+    headers default to the document's own; derived files (previews, web
+    PDFs) pass their own type, disposition and validator.
+    """
+    stat = os.stat(path)
+    etag = etag or document_etag(document)
+    last_modified = stat.st_mtime
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is None:
+        mode = delivery_mode()
+        if mode == "direct":
+            response = _direct_response(request, path, stat.st_size, etag, last_modified)
+        else:
+            response = _proxy_response(mode, path)
+
+    if response.status_code in (200, 206):
+        response["Content-Type"] = content_type or document.content_type
+        response["Content-Disposition"] = content_disposition or document.content_disposition
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(last_modified)
+    if etag:
+        response["ETag"] = etag
+    return response
@@ -0,0 +1,377 @@
+# portal/document_processing.py
+"""
+Background processing of uploaded documents.
+
+For each distinct PDF (one per DocumentBlob, so duplicates are processed
+once) a background task:
+
+- linearises it with ``qpdf --linearize`` ("fast web view"), so the inline
+  viewer can show page one before the whole file has arrived;
+- reads the page count (``qpdf --show-npages``);
+- renders the first page to PNG with ``pdftoppm`` (poppler-utils).
+
+Office files (DOCX/PPTX/XLSX, OpenDocument, RTF) are first converted to PDF
+with a headless LibreOffice (``soffice --convert-to pdf``) and then go
+through the same steps, so OfficeEmbedBlock can show them in the local PDF
+viewer.
+
+Results are stored as a ``DocumentPreview`` next to the blob. Each external
+tool runs with a wall-clock timeout (PORTAL_DOCUMENT_PROCESSING_TIMEOUT)
+and an address-space cap (PORTAL_DOCUMENT_PROCESSING_MEMORY_MB); a missing
+tool just skips its step.
+
+A failed run, or one missing its converter, is retried with exponential
+backoff (PORTAL_DOCUMENT_PROCESSING_RETRY_BASE seconds, doubling) up to
+PORTAL_DOCUMENT_PROCESSING_MAX_ATTEMPTS times: by a deferred task where the
+task backend supports it, else by the next ``process_documents`` run. Files
+that are too large or of a type with no pipeline are not retried.
+"""
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from wagtail.documents import get_document_model
+
+logger = logging.getLogger(__name__)
+
+PREVIEWS_DIR = "documents/previews"
+PDF_EXTENSIONS = ("pdf",)
+OFFICE_EXTENSIONS = ("doc", "docx", "odt", "rtf", "ppt", "pptx", "odp", "xls", "xlsx", "ods")
+
+
+class ProcessingError(Exception):
+    pass
+
+
+class ToolNotInstalled(Exception):
+    pass
+
+
+def processing_enabled():
+    return bool(getattr(settings, "PORTAL_DOCUMENT_PROCESSING", True))
+
+
+def _timeout():
+    return int(getattr(settings, "PORTAL_DOCUMENT_PROCESSING_TIMEOUT", 60))
+
+
+def _memory_limit_bytes():
+    return int(getattr(settings, "PORTAL_DOCUMENT_PROCESSING_MEMORY_MB", 512)) * 1024 * 1024
+
+
+def _conversion_timeout():
+    return int(getattr(settings, "PORTAL_DOCUMENT_CONVERSION_TIMEOUT", 180))
+
+
+def _conversion_memory_limit_bytes():
+    return int(getattr(settings, "PORTAL_DOCUMENT_CONVERSION_MEMORY_MB", 2048)) * 1024 * 1024
+
+
+def _max_size():
+    return int(getattr(settings, "PORTAL_DOCUMENT_PROCESSING_MAX_SIZE", 200 * 1024 * 1024))
+
+
+def _preview_width():
+    return int(getattr(settings, "PORTAL_DOCUMENT_PREVIEW_WIDTH", 600))
+
+
+def _max_attempts():
+    return int(getattr(settings, "PORTAL_DOCUMENT_PROCESSING_MAX_ATTEMPTS", 4))
+
+
+def retry_delay(attempts):
+    base = int(getattr(settings, "PORTAL_DOCUMENT_PROCESSING_RETRY_BASE", 15 * 60))
+    return base * 2 ** max(attempts - 1, 0)
+
+
+def _memory_limiter(limit):
+    def _limit():
+        # Runs in the child between fork and exec
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return _limit
+
+
+def run_tool(args, ok_codes=(0,), timeout=None, memory_limit=None):
+    """Run an external converter with the time and memory caps applied."""
+    if shutil.which(args[0]) is None:
+        raise ToolNotInstalled(args[0])
+    try:
+        result = subprocess.run(
+            args,
+            capture_output=True,
+            timeout=timeout or _timeout(),
+            preexec_fn=_memory_limiter(memory_limit or _memory_limit_bytes()),
+            check=False,
+        )
+    except subprocess.TimeoutExpired:
+        raise ProcessingError(f"{args[0]} timed out")
+    if result.returncode not in ok_codes:
+        stderr = result.stderr.decode("utf-8", "replace").strip()[-500:]
+        raise ProcessingError(f"{args[0]} exited with {result.returncode}: {stderr}")
+    return result.stdout.decode("utf-8", "replace")
+
+
+def preview_name(sha256, filename):
+    return f"{PREVIEWS_DIR}/{sha256[:2]}/{sha256}/{filename}"
+
+
+def _replace_file(field_file, name, path):
+    storage = field_file.storage
+    if field_file.name:
+        storage.delete(field_file.name)
+    if storage.exists(name):
+        storage.delete(name)
+    with open(path, "rb") as f:
+        field_file.name = storage.save(name, File(f))
+
+
+def _page_count(pdf_path):
+    try:
+        return int(run_tool(["qpdf", "--show-npages", pdf_path]).strip())
+    except (ToolNotInstalled, ValueError):
+        return None
+
+
+def _linearise(pdf_path, workdir):
+    out = os.path.join(workdir, "web.pdf")
+    try:
+        # Exit code 3 means "succeeded with warnings"
+        run_tool(["qpdf", "--linearize", pdf_path, out], ok_codes=(0, 3))
+    except ToolNotInstalled:
+        return None
+    return out
+
+
+def _render_first_page(pdf_path, workdir):
+    prefix = os.path.join(workdir, "page-1")
+    try:
+        run_tool([
+            "pdftoppm", "-png", "-f", "1", "-l", "1", "-singlefile",
+            "-scale-to-x", str(_preview_width()), "-scale-to-y", "-1",
+            pdf_path, prefix,
+        ])
+    except ToolNotInstalled:
+        return None
+    return f"{prefix}.png"
+
+
+def _local_copy(document, workdir):
+    """Path of the document's file on local disk, copying remote files first."""
+    storage = document.file.storage
+    try:
+        return storage.path(document.file.name)
+    except NotImplementedError:
+        pass
+    local = os.path.join(workdir, "source")
+    with storage.open(document.file.name, "rb") as src, open(local, "wb") as out:
+        shutil.copyfileobj(src, out, 1024 * 1024)
+    return local
+
+
+def _convert_office(source, extension, workdir):
+    """Convert an Office file to PDF with headless LibreOffice."""
+    # soffice picks the import filter from the extension
+    named = os.path.join(workdir, f"document.{extension}")
+    os.symlink(source, named)
+    outdir = os.path.join(workdir, "converted")
+    run_tool(
+        [
+            _soffice_binary(), "--headless", "--norestore", "--nolockcheck",
+            # A private profile per run, so conversions can run in parallel
+            f"-env:UserInstallation=file://{workdir}/lo-profile",
+            "--convert-to", "pdf", "--outdir", outdir, named,
+        ],
+        timeout=_conversion_timeout(),
+        memory_limit=_conversion_memory_limit_bytes(),
+    )
+    pdf = os.path.join(outdir, "document.pdf")
+    if not os.path.exists(pdf):
+        raise ProcessingError("LibreOffice did not produce a PDF")
+    return pdf
+
+
+def _soffice_binary():
+    return getattr(settings, "PORTAL_SOFFICE_BINARY", None) or shutil.which("soffice") or "libreoffice"
+
+
+def source_pdf(document, workdir):
+    """
+    Return ``(pdf_path, converted)`` for ``document``, or ``(None, False)``
+    when its type has no PDF pipeline.
+    """
+    extension = document.file_extension.lower()
+    if extension in PDF_EXTENSIONS:
+        return _local_copy(document, workdir), False
+    if extension in OFFICE_EXTENSIONS:
+        return _convert_office(_local_copy(document, workdir), extension, workdir), True
+    return None, False
+
+
+def _preview_for(blob):
+    """The blob's preview row, created if missing (maybe by a concurrent task)."""
+    from .models import DocumentPreview
+
+    preview = DocumentPreview.objects.filter(blob=blob).first()
+    if preview is not None:
+        return preview
+    try:
+        with transaction.atomic():
+            return DocumentPreview.objects.create(blob=blob)
+    except IntegrityError:
+        # Another task processing a duplicate of this file got there first
+        return DocumentPreview.objects.get(blob=blob)
+
+
+def _is_due(preview):
+    from .models import DocumentPreview
+
+    if preview.status == DocumentPreview.Status.PENDING:
+        return True
+    return preview.retry_at is not None and preview.retry_at <= timezone.now()
+
+
+def _give_up(preview, status, error, document_id, retry=False):
+    """Record a failed run; ``retry`` schedules another attempt with backoff."""
+    preview.status = status
+    preview.error = error
+    preview.retry_at = None
+    if retry:
+        preview.attempts += 1
+        if preview.attempts < _max_attempts():
+            preview.retry_at = timezone.now() + timedelta(seconds=retry_delay(preview.attempts))
+    preview.save()
+    if preview.retry_at is not None:
+        _schedule_retry(document_id, preview.retry_at)
+    return preview
+
+
+def _schedule_retry(document_id, run_after):
+    from .tasks import process_document_task
+
+    # Without deferred tasks, the next process_documents run picks it up
+    if process_document_task.get_backend().supports_defer:
+        task = process_document_task.using(run_after=run_after)
+        transaction.on_commit(lambda: task.enqueue(document_id))
+
+
+def process_document(document_id, force=False):
+    """Build (or rebuild with ``force``) the preview for one document's blob."""
+    from .models import DocumentBlobLink, DocumentPreview
+
+    Document = get_document_model()
+    document = Document.objects.filter(pk=document_id).first()
+    link = DocumentBlobLink.objects.filter(document_id=document_id).select_related("blob").first()
+    if document is None or link is None:
+        return None
+    blob = link.blob
+
+    preview = _preview_for(blob)
+    if not (force or _is_due(preview)):
+        return preview
+
+    if blob.size > _max_size():
+        return _give_up(
+            preview, DocumentPreview.Status.UNSUPPORTED,
+            "File is larger than PORTAL_DOCUMENT_PROCESSING_MAX_SIZE.", document_id,
+        )
+
+    with tempfile.TemporaryDirectory(prefix="portal-doc-") as workdir:
+        try:
+            pdf_path, converted = source_pdf(document, workdir)
+            if pdf_path is None:
+                return _give_up(preview, DocumentPreview.Status.UNSUPPORTED, "", document_id)
+
+            web_pdf = _linearise(pdf_path, workdir)
+            if web_pdf is None and converted:
+                # The conversion is the point; serve it even if not linearised
+                web_pdf = pdf_path
+            page_count = _page_count(web_pdf or pdf_path)
+            image = _render_first_page(web_pdf or pdf_path, workdir)
+        except ToolNotInstalled as exc:
+            # The converter for this type is not installed (yet)
+            return _give_up(
+                preview, DocumentPreview.Status.UNSUPPORTED, f"{exc} is not installed.", document_id, retry=True,
+            )
+        except (ProcessingError, OSError) as exc:
+            logger.warning("Processing document %s failed: %s", document_id, exc)
+            return _give_up(preview, DocumentPreview.Status.FAILED, str(exc), document_id, retry=True)
+
+        if not (web_pdf or image or page_count):
+            return _give_up(
+                preview, DocumentPreview.Status.UNSUPPORTED, "qpdf and pdftoppm are not installed.", document_id,
+                retry=True,
+            )
+
+        if web_pdf:
+            _replace_file(preview.web_pdf, preview_name(blob.sha256, "web.pdf"), web_pdf)
+        if image and os.path.exists(image):
+            _replace_file(preview.preview_image, preview_name(blob.sha256, "page-1.png"), image)
+
+    preview.page_count = page_count
+    preview.status = DocumentPreview.Status.READY
+    preview.error = ""
+    preview.attempts = 0
+    preview.retry_at = None
+    preview.save()
+    _invalidate_bodies(blob)
+    return preview
+
+
+def _invalidate_bodies(blob):
+    # Cached page bodies embedding these documents should now show the preview
+    from .body_cache import touch_dependency
+
+    for document_id in blob.links.values_list("document_id", flat=True):
+        touch_dependency("document", document_id)
+
+
+def enqueue_processing(document):
+    """Queue processing for a document whose blob has no preview yet."""
+    from .models import DocumentPreview
+    from .tasks import process_document_task
+
+    if not processing_enabled() or not document.file:
+        return
+    if DocumentPreview.objects.filter(blob__links__document=document).exists():
+        return
+    transaction.on_commit(lambda: process_document_task.enqueue(document.pk))
+
+
+def delete_preview_files(preview):
+    for field_file in (preview.preview_image, preview.web_pdf):
+        if field_file.name:
+            field_file.storage.delete(field_file.name)
+
+
+def document_preview(document):
+    """The ready ``DocumentPreview`` for a document, or None."""
+    from .models import DocumentPreview
+
+    if document is None:
+        return None
+    preview = getattr(document, "_portal_preview", False)
+    if preview is False:
+        preview = (
+            DocumentPreview.objects
+            .filter(blob__links__document=document, status=DocumentPreview.Status.READY)
+            .first()
+        )
+        document._portal_preview = preview
+    return preview
+
+
+def preview_image_url(document):
+    return reverse("portal_document_preview", args=[document.pk, document.filename])
+
+
+def web_pdf_url(document):
+    return reverse("portal_document_web", args=[document.pk, document.filename])
@@ -0,0 +1,141 @@
+# portal/document_storage.py
+"""
+Content-addressed storage for Wagtail documents.
+
+Every document file is hashed (SHA-256, streamed) and recorded against a
+``DocumentBlob``. The first upload of some content becomes the blob; later
+uploads of the same bytes are stored as hard links to it, so the data exists
+once on disk however many documents (ResourceFile attachments, StreamField
+document blocks...) point at it. ``DocumentBlobLink`` rows are the
+reference count: when the last document using a blob goes away, the blob
+file is removed too.
+
+Wagtail keeps deleting each document's own path as usual; with hard links
+that only drops one reference to the data. Storages without local paths
+(e.g. S3) still get blob records, but files are not linked.
+"""
+import hashlib
+import os
+import uuid
+
+from django.db import transaction
+
+_READ_BLOCK = 1024 * 1024
+BLOBS_DIR = "documents/blobs"
+
+
+def sha256_filelike(f):
+    position = f.tell() if hasattr(f, "tell") else 0
+    f.seek(0)
+    digest = hashlib.sha256()
+    while block := f.read(_READ_BLOCK):
+        digest.update(block)
+    f.seek(position)
+    return digest.hexdigest()
+
+
+def blob_name(sha256, filename):
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256}/{os.path.basename(filename)}"
+
+
+def _local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+def _link_in_place(source, target):
+    """Atomically replace ``target`` with a hard link to ``source``."""
+    tmp = f"{target}.{uuid.uuid4().hex}.link"
+    os.link(source, tmp)
+    os.replace(tmp, target)
+
+
+def link_document(document, sha256=None):
+    """
+    Record ``document``'s file against its blob, hard-linking the file to an
+    existing blob with the same content. Returns bytes reclaimed on disk.
+    A no-op when the file is unchanged since it was last linked.
+    """
+    from .models import DocumentBlob, DocumentBlobLink
+
+    if not document.file:
+        return 0
+    link = DocumentBlobLink.objects.filter(document=document).select_related("blob").first()
+    if link and link.file_name == document.file.name:
+        return 0
+
+    storage = document.file.storage
+    if sha256 is None:
+        with storage.open(document.file.name, "rb") as f:
+            sha256 = sha256_filelike(f)
+
+    doc_path = _local_path(storage, document.file.name)
+    reclaimed = 0
+
+    with transaction.atomic():
+        blob = DocumentBlob.objects.select_for_update().filter(sha256=sha256).first()
+        created = False
+        if blob is None:
+            # Give the blob its own content-addressed name, so it outlives
+            # this document's path. A concurrent upload of the same bytes may
+            # insert the row first; get_or_create then re-reads theirs.
+            name = blob_name(sha256, document.file.name) if doc_path else document.file.name
+            blob, created = DocumentBlob.objects.get_or_create(
+                sha256=sha256,
+                defaults={
+                    "size": document.file_size or storage.size(document.file.name),
+                    "path": name,
+                },
+            )
+            if created and doc_path:
+                target = _local_path(storage, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if not os.path.exists(target):
+                    os.link(doc_path, target)
+        if not created and doc_path:
+            blob_path = _local_path(storage, blob.path)
+            if blob_path and os.path.exists(blob_path) and not _same_file(doc_path, blob_path):
+                if os.stat(doc_path).st_nlink == 1:
+                    reclaimed = os.path.getsize(doc_path)
+                _link_in_place(blob_path, doc_path)
+
+        previous_blob_id = link.blob_id if link else None
+        DocumentBlobLink.objects.update_or_create(
+            document=document,
+            defaults={"blob": blob, "file_name": document.file.name},
+        )
+        if previous_blob_id and previous_blob_id != blob.pk:
+            release_blob(previous_blob_id)
+
+    return reclaimed
+
+
+def release_blob(blob_id):
+    """Delete a blob (row and file) once no document references it."""
+    from .models import DocumentBlob
+
+    def _release():
+        blob = DocumentBlob.objects.filter(pk=blob_id).first()
+        if blob is None or blob.links.exists():
+            return
+        storage = _blob_storage()
+        blob.delete()
+        if storage.exists(blob.path):
+            storage.delete(blob.path)
+
+    transaction.on_commit(_release)
+
+
+def _blob_storage():
+    from wagtail.documents import get_document_model
+
+    return get_document_model()._meta.get_field("file").storage
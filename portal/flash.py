@@ -0,0 +1,119 @@
+# portal/flash.py
+"""
+Flash messages without sessions, so anonymous visitors never get one.
+
+Django's default message storage falls back to the session, and the portal
+never displayed messages, so a newsletter signup or contact submission
+left the visitor with a session that every later page view loaded from
+the database. Such a visitor also lost the fast paths that require no
+session cookie: replica reads, conditional GETs and the edge cache.
+
+* ``FlashStorage`` (MESSAGE_STORAGE) keeps an anonymous visitor's messages
+  only in a signed cookie (``FlashCookieStorage``) that expires after
+  PORTAL_FLASH_MAX_AGE seconds, both in the browser and when its timestamp
+  is checked. base.html shows them as toasts, which consumes them, and the
+  cookie is deleted on that response. Logged-in users have a session
+  anyway, and admin messages (e.g. a subscriber import's errors) can
+  outgrow a cookie, so theirs are kept in the session.
+* ``SessionMiddleware`` replaces Django's. A session is still loaded only
+  when something reads it, which for a visitor without a session cookie
+  needs no database. Anonymous sessions that hold nothing but old messages
+  are deleted, cookie and row, the first time they are loaded.
+
+With both, sessions only exist for logged-in users and for visitors who
+entered a page password.
+"""
+import binascii
+import json
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages.storage.base import BaseStorage
+from django.contrib.messages.storage.cookie import CookieStorage, MessageSerializer
+from django.contrib.messages.storage.session import SessionStorage
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.core import signing
+from django.utils.functional import cached_property
+
+DEFAULT_MAX_AGE = 5 * 60
+
+# Left by the old session message storage; not worth keeping a session for
+_DISPOSABLE_KEYS = {SessionStorage.session_key}
+
+
+def _max_age():
+    return getattr(settings, "PORTAL_FLASH_MAX_AGE", DEFAULT_MAX_AGE)
+
+
+def has_flash(request):
+    # Session-stored messages need no check: their requests carry a session cookie
+    return FlashCookieStorage.cookie_name in request.COOKIES
+
+
+class FlashCookieStorage(CookieStorage):
+    """Cookie message storage with an expiry, and no session fallback."""
+
+    cookie_name = "portal_flash"
+
+    def _update_cookie(self, encoded_data, response):
+        if encoded_data:
+            response.set_cookie(
+                self.cookie_name,
+                encoded_data,
+                max_age=_max_age(),
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        else:
+            super()._update_cookie(encoded_data, response)
+
+    def _decode(self, data):
+        if not data:
+            return None
+        try:
+            # SignatureExpired (older than max_age) is a BadSignature too
+            return self.signer.unsign_object(data, serializer=MessageSerializer, max_age=_max_age())
+        except (signing.BadSignature, binascii.Error, json.JSONDecodeError):
+            pass
+        # Dropped from the response, as Django does with tampered cookies
+        self.used = True
+        return None
+
+
+class FlashStorage(BaseStorage):
+    """The session for logged-in users, else ``FlashCookieStorage``."""
+
+    def __init__(self, request, *args, **kwargs):
+        super().__init__(request, *args, **kwargs)
+        self._args, self._kwargs = args, kwargs
+
+    @cached_property
+    def _storage(self):
+        # Picked on first use: request.user loads the session
+        user = getattr(self.request, "user", None)
+        storage_class = SessionStorage if user is not None and user.is_authenticated else FlashCookieStorage
+        return storage_class(self.request, *self._args, **self._kwargs)
+
+    def _get(self, *args, **kwargs):
+        return self._storage._get(*args, **kwargs)
+
+    def _store(self, messages, response, *args, **kwargs):
+        return self._storage._store(messages, response, *args, **kwargs)
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """Django's session middleware, dropping anonymous leftover sessions."""
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if (
+            session is not None
+            and session.accessed
+            and session.session_key
+            and SESSION_KEY not in session
+            and set(session.keys()) <= _DISPOSABLE_KEYS
+        ):
+            session.flush()
+        return super().process_response(request, response)
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.exceptions import PermissionDenied
+from wagtail.documents.forms import BaseDocumentForm
+from wagtail.images.forms import BaseImageForm
 
 class FooterNewsletterForm(forms.Form):
     email = forms.EmailField(
@@ -69,4 +72,133 @@ class ContactUsForm(forms.Form):
             "class": "hidden",
             "aria-hidden": "true",
         })
-    )    
\ No newline at end of file
+    )    
+
+class SubscriberImportForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV with a header row and at least an 'email' column; also read: "
+                  "full_name, status, source, site_id, subscribed_at, unsubscribed_at, notes.",
+    )
+    update_existing = forms.BooleanField(
+        required=False,
+        initial=True,
+        help_text="Update the name, status and site of addresses already on the list "
+                  "(only the columns the CSV has).",
+    )
+    resubscribe = forms.BooleanField(
+        required=False,
+        help_text="Let the status column re-subscribe addresses that unsubscribed.",
+    )
+    source = forms.CharField(
+        required=False,
+        max_length=50,
+        help_text="Source recorded for rows without one (default: import).",
+    )
+
+
+class ChunkedUploadFormMixin:
+    """
+    Lets a Wagtail upload form take its file from a completed chunked upload:
+    the chooser JS posts ``<file field>-chunked=<upload id>`` instead of the
+    file body (see portal/chunked_uploads.py).
+    """
+    chunked_upload_kind = None
+
+    def __init__(self, *args, **kwargs):
+        self._chunked_upload_user = kwargs.get("user")
+        self._chunked_upload_error = None
+        super().__init__(*args, **kwargs)
+        if self.is_bound and "file" in self.fields:
+            self._attach_chunked_upload()
+
+    def _attach_chunked_upload(self):
+        from .chunked_uploads import ChunkedUploadError, open_completed
+
+        field_name = self.add_prefix("file")
+        upload_id = self.data.get(f"{field_name}-chunked")
+        if not upload_id or self.files.get(field_name) or self._chunked_upload_user is None:
+            return
+        try:
+            uploaded = open_completed(upload_id, self._chunked_upload_user, self.chunked_upload_kind)
+        except (ChunkedUploadError, PermissionDenied):
+            self._chunked_upload_error = "The uploaded file could not be found. Please upload it again."
+            return
+        # Into the request's own FILES (the Wagtail views pass request.FILES),
+        # so Django closes the handle with the other uploads when the
+        # response ends, whether or not the form was valid or saved
+        self.files[field_name] = uploaded
+
+    def clean_file(self):
+        if self._chunked_upload_error:
+            raise forms.ValidationError(self._chunked_upload_error)
+        return self.cleaned_data.get("file")
+
+
+class PortalDocumentForm(ChunkedUploadFormMixin, BaseDocumentForm):
+    """
+    Wagtail document form (WAGTAILDOCS_DOCUMENT_FORM_BASE) with chunked
+    uploads. The upload's hash is handed to the post_save handler that links
+    the saved file to an existing blob with the same content
+    (portal/document_storage.py), so nothing is linked for a form that is
+    never saved.
+    """
+    chunked_upload_kind = "document"
+
+    def clean_file(self):
+        from .document_storage import sha256_filelike
+
+        uploaded = super().clean_file()
+        if not uploaded or "file" not in self.changed_data:
+            return uploaded
+
+        # Chunked uploads were already hashed when they were assembled
+        self.instance._portal_sha256 = getattr(uploaded, "sha256", None) or sha256_filelike(uploaded)
+        return uploaded
+
+
+class PortalImageForm(ChunkedUploadFormMixin, BaseImageForm):
+    """
+    Wagtail image form (WAGTAILIMAGES_IMAGE_FORM_BASE) with chunked uploads,
+    that swaps oversized or metadata-heavy uploads for a downscaled, stripped
+    master before saving.
+    """
+    chunked_upload_kind = "image"
+
+    def clean_file(self):
+        from .image_ingest import ingest_image, keep_original
+
+        uploaded = super().clean_file()
+        if not uploaded or "file" not in self.changed_data:
+            return uploaded
+
+        master, geometry = ingest_image(uploaded)
+        if master is None:
+            uploaded.seek(0)
+            return uploaded
+
+        if keep_original():
+            # Stored next to the master once the image row is saved
+            self.instance._portal_original_upload = uploaded
+        self._ingest_geometry = geometry
+        return master
+
+    def clean(self):
+        cleaned_data = super().clean()
+        geometry = getattr(self, "_ingest_geometry", None)
+        names = ("focal_point_x", "focal_point_y", "focal_point_width", "focal_point_height")
+        if geometry is not None and all(cleaned_data.get(name) is not None for name in names):
+            # A focal point sent with the upload refers to the original's pixels
+            focal_point = geometry.map_rect(*(cleaned_data[name] for name in names))
+            cleaned_data.update(zip(names, focal_point))
+        return cleaned_data
+
+
+try:
+    from wagtailmedia.forms import BaseMediaForm
+except Exception:
+    BaseMediaForm = None
+
+if BaseMediaForm is not None:
+    class PortalMediaForm(ChunkedUploadFormMixin, BaseMediaForm):
+        """wagtailmedia form (WAGTAILMEDIA["MEDIA_FORM_BASE"]) with chunked uploads."""
+        chunked_upload_kind = "media"
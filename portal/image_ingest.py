@@ -0,0 +1,172 @@
+# portal/image_ingest.py
+"""
+Ingest-time processing for uploaded images.
+
+Uploads larger than PORTAL_IMAGE_MAX_EDGE on their longest side are replaced
+by a downscaled master before they are stored, and EXIF/ICC/XMP metadata is
+dropped (orientation and colour profile are applied first). Every rendition
+is later generated from this master instead of the full-size original.
+
+JPEGs are decoded at reduced DCT scale (``Image.draft``), resizing happens in
+place and a per-process lock makes sure a worker never holds more than one
+decoded upload at a time. The result is written to a temporary file on disk,
+never to memory.
+
+A focal point sent with the upload is given in the upload's pixels, so it is
+mapped onto the master with the same downscale and orientation transpose
+(``MasterGeometry``). Focal points are not detected here: Wagtail's feature
+detection needs OpenCV, which the portal does not install.
+"""
+import io
+import os
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image as PILImage
+
+_INGEST_LOCK = threading.BoundedSemaphore(1)
+
+# Formats we re-encode; anything else (GIF, SVG, animated images) is stored as-is
+_SAVE_OPTIONS = {
+    "JPEG": {"quality": 88, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 85, "method": 4},
+}
+
+_CONTENT_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp",
+}
+
+# EXIF orientation → transpose needed to display the pixels upright
+_ORIENTATION_TRANSPOSE = {
+    2: PILImage.Transpose.FLIP_LEFT_RIGHT,
+    3: PILImage.Transpose.ROTATE_180,
+    4: PILImage.Transpose.FLIP_TOP_BOTTOM,
+    5: PILImage.Transpose.TRANSPOSE,
+    6: PILImage.Transpose.ROTATE_270,
+    7: PILImage.Transpose.TRANSVERSE,
+    8: PILImage.Transpose.ROTATE_90,
+}
+
+ORIGINALS_DIR = "original_uploads"
+
+
+@dataclass
+class MasterGeometry:
+    """How a master's pixels relate to the upload's."""
+    scale: float  # master / upload, before orientation
+    size: tuple  # (width, height) after scaling, before orientation
+    orientation: int = 1  # EXIF orientation baked into the master
+
+    def map_rect(self, x, y, width, height):
+        """Map a centre-based rect (a Wagtail focal point) from the upload onto the master."""
+        x, y, width, height = (value * self.scale for value in (x, y, width, height))
+        w, h = self.size
+        transpose = _ORIENTATION_TRANSPOSE.get(self.orientation)
+        if transpose == PILImage.Transpose.FLIP_LEFT_RIGHT:
+            x = w - x
+        elif transpose == PILImage.Transpose.ROTATE_180:
+            x, y = w - x, h - y
+        elif transpose == PILImage.Transpose.FLIP_TOP_BOTTOM:
+            y = h - y
+        elif transpose == PILImage.Transpose.TRANSPOSE:
+            x, y, width, height = y, x, height, width
+        elif transpose == PILImage.Transpose.ROTATE_270:
+            x, y, width, height = h - y, x, height, width
+        elif transpose == PILImage.Transpose.TRANSVERSE:
+            x, y, width, height = h - y, w - x, height, width
+        elif transpose == PILImage.Transpose.ROTATE_90:
+            x, y, width, height = y, w - x, height, width
+        return tuple(round(value) for value in (x, y, width, height))
+
+
+def max_edge():
+    return int(getattr(settings, "PORTAL_IMAGE_MAX_EDGE", 3200))
+
+
+def keep_original():
+    return bool(getattr(settings, "PORTAL_IMAGE_KEEP_ORIGINAL", False))
+
+
+def original_upload_name(image_file_name):
+    """Storage path of the kept original for a stored master."""
+    return f"{ORIGINALS_DIR}/{os.path.basename(image_file_name)}"
+
+
+def _has_metadata(img):
+    return bool(
+        img.info.get("exif")
+        or img.info.get("icc_profile")
+        or img.info.get("xmp")
+        or img.info.get("XML:com.adobe.xmp")
+    )
+
+
+def _to_srgb(img, icc_profile):
+    """Apply an embedded colour profile so it can be dropped without a colour shift."""
+    if not icc_profile or img.mode not in ("RGB", "RGBA"):
+        return img
+    try:
+        from PIL import ImageCms
+
+        source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        target = ImageCms.createProfile("sRGB")
+        return ImageCms.profileToProfile(img, source, target, outputMode=img.mode) or img
+    except Exception:
+        return img
+
+
+def ingest_image(uploaded_file):
+    """
+    Return ``(master_file, geometry)`` for an uploaded image, or
+    ``(None, None)`` when it is already small and metadata-free (or in a
+    format we leave alone). ``geometry`` (a MasterGeometry) maps coordinates
+    given against the upload, such as a focal point, onto the master.
+    """
+    with _INGEST_LOCK:
+        uploaded_file.seek(0)
+        with PILImage.open(uploaded_file) as img:
+            fmt = img.format
+            if fmt not in _SAVE_OPTIONS or getattr(img, "is_animated", False):
+                return None, None
+
+            limit = max_edge()
+            original_width = img.width
+            oversized = max(img.size) > limit
+            if not oversized and not _has_metadata(img):
+                return None, None
+
+            icc_profile = img.info.get("icc_profile")
+            orientation = img.getexif().get(0x0112, 1)
+
+            if oversized and fmt == "JPEG":
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full size
+                img.draft(None, (limit, limit))
+
+            img.load()
+            if oversized:
+                img.thumbnail((limit, limit), PILImage.Resampling.LANCZOS, reducing_gap=3.0)
+            geometry = MasterGeometry(img.width / original_width, img.size, orientation)
+
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img = _to_srgb(img, icc_profile)
+            # The orientation tag is dropped with the rest of EXIF, so bake it in
+            if orientation in _ORIENTATION_TRANSPOSE:
+                img = img.transpose(_ORIENTATION_TRANSPOSE[orientation])
+
+            master = TemporaryUploadedFile(
+                name=os.path.basename(uploaded_file.name),
+                content_type=_CONTENT_TYPES[fmt],
+                size=0,
+                charset=None,
+            )
+            # No exif/icc_profile/pnginfo arguments: metadata is not written back
+            img.save(master, format=fmt, **_SAVE_OPTIONS[fmt])
+            master.size = master.tell()
+            master.seek(0)
+            return master, geometry
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal.contact_archive import archivable, archive_dir, archive_month, archive_months
+from portal.partitions import add_months, drop_empty_partitions, ensure_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Move resolved/spam contact submissions older than N whole months into "
+        "gzip JSONL archives (one per month), drop emptied monthly partitions "
+        "and create the partitions for the coming months. Run it monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int,
+            default=getattr(settings, "PORTAL_CONTACT_ARCHIVE_AFTER_MONTHS", 12),
+            help="Keep this many whole months besides the current one.",
+        )
+        parser.add_argument("--dir", help="Archive directory (default: PORTAL_CONTACT_ARCHIVE_DIR).")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        before = add_months(month_start(now), -options["months"])
+        directory = options["dir"] or archive_dir()
+
+        if options["dry_run"]:
+            count = archivable(before).count()
+            self.stdout.write(f"{count} submissions created before {before:%Y-%m-%d} would be archived.")
+            return
+
+        for name in ensure_partitions(now):
+            self.stdout.write(f"Created partition {name}")
+
+        total = 0
+        for month in archive_months(before):
+            archived = archive_month(month, before, directory, batch_size=options["batch_size"])
+            total += archived
+            self.stdout.write(f"{month:%Y-%m}: archived {archived} submissions")
+
+        for name in drop_empty_partitions(before):
+            self.stdout.write(f"Dropped empty partition {name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} submissions to {directory}."))
@@ -0,0 +1,167 @@
+import re
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.test import Client
+from wagtail.models import Site
+
+from portal.models import (
+    ExpertIndexPage, HomePage, RepositoryIndexPage, TrainingIndexPage,
+)
+
+_SIZES_ENTRY_RE = re.compile(r"^\(min-width:\s*(\d+)px\)\s+(.+)$")
+
+
+class _ImageCollector(HTMLParser):
+    """
+    Collect every image on a page as {"sources": [(type, srcset)], "img": attrs}.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.images = []
+        self._picture = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "picture":
+            self._picture = {"sources": [], "img": None}
+        elif tag == "source" and self._picture is not None:
+            self._picture["sources"].append((attrs.get("type", ""), attrs))
+        elif tag == "img":
+            if self._picture is not None:
+                self._picture["img"] = attrs
+            else:
+                self.images.append({"sources": [], "img": attrs})
+
+    def handle_endtag(self, tag):
+        if tag == "picture" and self._picture is not None:
+            if self._picture["img"] is not None:
+                self.images.append(self._picture)
+            self._picture = None
+
+
+def _parse_srcset(srcset):
+    candidates = []
+    for part in (srcset or "").split(","):
+        bits = part.strip().split()
+        if not bits:
+            continue
+        width = int(bits[1][:-1]) if len(bits) > 1 and bits[1].endswith("w") else None
+        candidates.append((bits[0], width))
+    return candidates
+
+
+def _slot_width(sizes, viewport):
+    for entry in (sizes or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        match = _SIZES_ENTRY_RE.match(entry)
+        if match:
+            if viewport < int(match.group(1)):
+                continue
+            entry = match.group(2).strip()
+        if entry.endswith("vw"):
+            return viewport * float(entry[:-2]) / 100
+        if entry.endswith("px"):
+            return float(entry[:-2])
+    return viewport
+
+
+def _pick(candidates, target):
+    """Smallest candidate covering the target width, as a browser would."""
+    sized = sorted((c for c in candidates if c[1]), key=lambda c: c[1])
+    for url, width in sized:
+        if width >= target:
+            return url
+    if sized:
+        return sized[-1][0]
+    return candidates[0][0] if candidates else None
+
+
+def _file_size(url):
+    if not url:
+        return 0
+    path = unquote(urlsplit(url).path)
+    if not path.startswith(settings.MEDIA_URL):
+        return 0
+    name = path[len(settings.MEDIA_URL):]
+    try:
+        return default_storage.size(name)
+    except Exception:
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Report image bytes a browser downloads per listing page: the single "
+        "base-size rendition (before) vs the srcset candidate it would pick (after)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", help="Page paths (default: home and index pages).")
+        parser.add_argument("--viewport", type=int, default=390, help="CSS viewport width (default: 390).")
+        parser.add_argument("--dpr", type=float, default=2.0, help="Device pixel ratio (default: 2).")
+        parser.add_argument(
+            "--accept", default="avif,webp",
+            help="Comma-separated <source> formats the client supports (default: avif,webp).",
+        )
+
+    def _default_paths(self):
+        paths = []
+        for model in (HomePage, RepositoryIndexPage, ExpertIndexPage, TrainingIndexPage):
+            for page in model.objects.live().public():
+                url = page.get_url()
+                if url:
+                    paths.append(url)
+        return paths
+
+    def handle(self, *args, **options):
+        site = Site.objects.filter(is_default_site=True).first()
+        host = site.hostname if site else "localhost"
+        accepted = {f"image/{fmt.strip()}" for fmt in options["accept"].split(",") if fmt.strip()}
+        viewport, dpr = options["viewport"], options["dpr"]
+
+        client = Client(HTTP_HOST=host)
+        total_before = total_after = 0
+
+        for path in options["paths"] or self._default_paths():
+            response = client.get(path)
+            if response.status_code != 200:
+                self.stderr.write(f"{path}: HTTP {response.status_code}")
+                continue
+
+            collector = _ImageCollector()
+            collector.feed(response.content.decode(response.charset or "utf-8"))
+
+            before = after = 0
+            for image in collector.images:
+                img = image["img"]
+                # The fallback <img src> is the base-size rendition the
+                # template used to emit on its own.
+                before += _file_size(img.get("src"))
+
+                target = _slot_width(img.get("sizes"), viewport) * dpr
+                srcset = next(
+                    (attrs.get("srcset") for mime, attrs in image["sources"] if mime in accepted),
+                    img.get("srcset"),
+                )
+                candidates = _parse_srcset(srcset) or [(img.get("src"), None)]
+                after += _file_size(_pick(candidates, target))
+
+            total_before += before
+            total_after += after
+            self.stdout.write(
+                f"{path}: {len(collector.images)} images, "
+                f"{before / 1024:.1f} KiB -> {after / 1024:.1f} KiB"
+            )
+
+        saved = (1 - total_after / total_before) * 100 if total_before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {total_before / 1024:.1f} KiB -> {total_after / 1024:.1f} KiB "
+            f"({saved:.0f}% less) at {viewport}px @{dpr:g}x"
+        ))
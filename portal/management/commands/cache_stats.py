@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from portal.tiered_cache import NAMESPACES, tiered_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the tiered cache hit rates per namespace, summed over all "
+        "workers (each worker adds its counters every STATS_INTERVAL seconds)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--namespace", action="append", help="Limit to this namespace (repeatable).")
+        parser.add_argument("--reset", action="store_true", help="Clear the counters after printing.")
+        parser.add_argument("--invalidate", action="store_true", help="Start a new generation of the namespaces.")
+
+    def handle(self, *args, **options):
+        namespaces = options["namespace"] or NAMESPACES
+        stats = tiered_cache.shared_stats(namespaces)
+
+        self.stdout.write(f"{'namespace':<15} {'lookups':>9} {'L1 hit':>8} {'L2 hit':>8} {'overall':>8}")
+        for namespace in namespaces:
+            l1, l2, miss = (stats[namespace][event] for event in ("l1_hit", "l2_hit", "miss"))
+            total = l1 + l2 + miss
+            # L2 only sees L1 misses
+            self.stdout.write(
+                f"{namespace:<15} {total:>9} {_rate(l1, total):>8} {_rate(l2, l2 + miss):>8} "
+                f"{_rate(l1 + l2, total):>8}"
+            )
+
+        if options["reset"]:
+            tiered_cache.reset_stats(namespaces)
+            self.stdout.write("Counters cleared.")
+        if options["invalidate"]:
+            for namespace in namespaces:
+                tiered_cache.invalidate(namespace)
+            self.stdout.write(f"Invalidated: {', '.join(namespaces)}.")
+
+
+def _rate(hits, total):
+    return f"{100 * hits / total:.1f}%" if total else "-"
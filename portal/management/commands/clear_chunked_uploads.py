@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from portal.chunked_uploads import clear_expired
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions (and their chunks) older than --hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24, help="Maximum age in hours (default: 24).")
+
+    def handle(self, *args, **options):
+        removed = clear_expired(options["hours"] * 3600)
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} upload sessions."))
@@ -0,0 +1,66 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from wagtail.documents import get_document_model
+
+from portal.document_storage import link_document, sha256_filelike
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash every stored document, record it against a content blob and "
+        "collapse files with identical content into hard links to one copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report duplicate groups and the space they use.",
+        )
+
+    def handle(self, *args, **options):
+        Document = get_document_model()
+        documents = Document.objects.order_by("pk").iterator(chunk_size=200)
+
+        if options["dry_run"]:
+            self._report(documents)
+            return
+
+        linked = missing = reclaimed = 0
+        for document in documents:
+            storage = document.file.storage
+            if not document.file or not storage.exists(document.file.name):
+                missing += 1
+                continue
+            reclaimed += link_document(document)
+            linked += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {linked} documents ({missing} missing files), "
+            f"reclaimed {reclaimed / 1024 / 1024:.1f} MiB."
+        ))
+
+    def _report(self, documents):
+        groups = defaultdict(list)
+        for document in documents:
+            storage = document.file.storage
+            if not document.file or not storage.exists(document.file.name):
+                continue
+            with storage.open(document.file.name, "rb") as f:
+                sha256 = sha256_filelike(f)
+            groups[sha256].append(document)
+
+        duplicate_bytes = 0
+        for sha256, docs in groups.items():
+            if len(docs) < 2:
+                continue
+            size = docs[0].file.storage.size(docs[0].file.name)
+            duplicate_bytes += size * (len(docs) - 1)
+            self.stdout.write(f"{sha256[:12]}  {size} bytes  ×{len(docs)}")
+            for document in docs:
+                self.stdout.write(f"    #{document.pk} {document.file.name}")
+
+        self.stdout.write(
+            f"{len(groups)} distinct files; duplicates use "
+            f"{duplicate_bytes / 1024 / 1024:.1f} MiB."
+        )
@@ -0,0 +1,163 @@
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+# Not forwarded in either direction
+_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    """Just enough of a caching reverse proxy to exercise surrogate-key purges."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, headers, body, cache_status=None):
+        self.send_response(status)
+        for name, value in headers:
+            if name.lower() not in _HOP_HEADERS and name.lower() != "content-length":
+                self.send_header(name, value)
+        if cache_status:
+            self.send_header("X-Cache", cache_status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _forward(self):
+        upstream = self.server.upstream
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in _HOP_HEADERS}
+        connection = http.client.HTTPConnection(upstream.hostname, upstream.port or 80, timeout=30)
+        try:
+            connection.request(self.command, self.path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.getheaders(), response.read()
+        finally:
+            connection.close()
+
+    def _cacheable(self, status, headers):
+        if self.command != "GET" or status != 200 or "Cookie" in self.headers:
+            return False
+        names = {name.lower(): value.lower() for name, value in headers}
+        if "set-cookie" in names and not self.server.ignore_set_cookie:
+            return False
+        if "no-store" in names.get("surrogate-control", ""):
+            return False
+        return not any(word in names.get("cache-control", "") for word in ("private", "no-store"))
+
+    def do_GET(self):
+        cached = None if "Cookie" in self.headers else self.server.lookup(self.path)
+        if cached is not None:
+            status, headers, body = cached
+            self._send(status, headers, body, "HIT")
+            return
+        status, headers, body = self._forward()
+        if self._cacheable(status, headers):
+            self.server.store(
+                self.path, status, [(k, v) for k, v in headers if k.lower() != "set-cookie"], body
+            )
+            cache_status = "MISS"
+        else:
+            cache_status = "PASS"
+        headers = [(name, value) for name, value in headers if name.lower() != "surrogate-control"]
+        self._send(status, headers, body, cache_status)
+
+    do_HEAD = do_GET
+
+    def _purge(self):
+        keys = self.headers.get("Surrogate-Key", "").split()
+        evicted = self.server.purge(keys)
+        self.server.command.stdout.write(f"PURGE {len(keys)} keys ({' '.join(keys)}): {evicted} evicted")
+        body = json.dumps({"keys": len(keys), "evicted": evicted}).encode()
+        self._send(200, [("Content-Type", "application/json")], body)
+
+    def _pass(self):
+        if self.path == self.server.purge_path:
+            return self._purge()
+        status, headers, body = self._forward()
+        self._send(status, headers, body, "PASS")
+
+    do_POST = do_PUT = do_DELETE = _pass
+
+    def do_PURGE(self):
+        self._purge()
+
+
+class _ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, command, upstream, purge_path, ignore_set_cookie=False):
+        super().__init__(address, _ProxyHandler)
+        self.command = command
+        self.ignore_set_cookie = ignore_set_cookie
+        self.upstream = upstream
+        self.purge_path = purge_path
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (status, headers, body, keys)
+
+    def lookup(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+        return entry[:3] if entry else None
+
+    def store(self, path, status, headers, body):
+        keys = set()
+        for name, value in headers:
+            if name.lower() == "surrogate-key":
+                keys.update(value.split())
+        with self._lock:
+            self._entries[path] = (status, headers, body, keys)
+
+    def purge(self, keys):
+        keys = set(keys)
+        with self._lock:
+            doomed = [path for path, entry in self._entries.items() if entry[3] & keys]
+            for path in doomed:
+                del self._entries[path]
+        return len(doomed)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local caching reverse proxy in front of the portal that caches "
+        "anonymous GETs, records their Surrogate-Key headers and evicts by key "
+        "on POST/PURGE to the purge path. A stand-in for the edge cache: set "
+        "edge_purge_url to http://HOST:PORT/purge in dev and tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--upstream", default="http://127.0.0.1:8000")
+        parser.add_argument("--purge-path", default="/purge")
+        parser.add_argument(
+            "--ignore-set-cookie", action="store_true",
+            help="Cache responses that set cookies too, minus the Set-Cookie (a common VCL rule).",
+        )
+
+    def handle(self, *args, **options):
+        server = _ProxyServer(
+            (options["host"], options["port"]), self,
+            urlsplit(options["upstream"]), options["purge_path"], options["ignore_set_cookie"],
+        )
+        self.stdout.write(
+            f"Edge cache stand-in on {options['host']}:{options['port']} → {options['upstream']}, "
+            f"purge at {options['purge_path']}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
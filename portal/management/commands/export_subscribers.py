@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from portal.models import NewsletterSubscriber
+from portal.subscriber_csv import export_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream newsletter subscribers to CSV (stdout or a file) without "
+        "loading the list into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", "-o", default="-",
+            help="File to write; '-' (default) writes to stdout.",
+        )
+        parser.add_argument(
+            "--status", choices=NewsletterSubscriber.Status.values,
+            help="Only export subscribers with this status.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = NewsletterSubscriber.objects.all()
+        if options["status"]:
+            queryset = queryset.filter(status=options["status"])
+
+        rows = export_rows(queryset, chunk_size=options["chunk_size"])
+        if options["output"] == "-":
+            sys.stdout.writelines(rows)
+            return
+
+        count = -1  # header
+        with open(options["output"], "w", encoding="utf-8", newline="") as f:
+            for line in rows:
+                f.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} subscribers to {options['output']}."))
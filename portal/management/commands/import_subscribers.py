@@ -0,0 +1,74 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.subscriber_csv import DEFAULT_BATCH_SIZE, import_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import newsletter subscribers from CSV, validating and normalising "
+        "each row and upserting in batches (INSERT ... ON CONFLICT)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to read; '-' reads stdin.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--skip-existing", action="store_true",
+            help="Leave addresses that are already on the list untouched.",
+        )
+        parser.add_argument(
+            "--resubscribe", action="store_true",
+            help="Let the status column re-subscribe addresses that unsubscribed.",
+        )
+        parser.add_argument(
+            "--source", default="import",
+            help="Source recorded for rows without one.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Validate the file and report, without writing.",
+        )
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options["path"], encoding="utf-8-sig", newline="")
+            except OSError as e:
+                raise CommandError(e)
+
+        try:
+            result = import_rows(
+                stream,
+                update_existing=not options["skip_existing"],
+                batch_size=options["batch_size"],
+                dry_run=options["dry_run"],
+                default_source=options["source"],
+                resubscribe=options["resubscribe"],
+            )
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(error)
+        if result.invalid > len(result.errors):
+            self.stderr.write(f"... and {result.invalid - len(result.errors)} more invalid rows")
+
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.written} of {result.rows} rows ({result.invalid} invalid)."
+        ))
+        if result.kept_unsubscribed:
+            self.stdout.write(
+                f"{result.kept_unsubscribed} unsubscribed addresses were left unsubscribed "
+                "(use --resubscribe to change them)."
+            )
+        if result.written and not options["dry_run"]:
+            self.stdout.write("Run ./manage.py update_index to refresh the admin search index.")
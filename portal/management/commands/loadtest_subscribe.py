@@ -0,0 +1,99 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from portal.models import NewsletterSubscriber
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent POSTs at the newsletter subscribe view (many for the "
+        "same addresses, some previously unsubscribed) and report latency and "
+        "errors. Run against a disposable PostgreSQL database whose "
+        "max_connections exceeds --concurrency (each worker thread holds a "
+        "connection). Rate limits are switched off for the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument(
+            "--addresses", type=int, default=500,
+            help="Distinct addresses to spread the requests over (default: 500).",
+        )
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Keep the loadtest-*@example.invalid subscribers afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        addresses = [f"loadtest-{i}@example.invalid" for i in range(options["addresses"])]
+        NewsletterSubscriber.objects.filter(email__startswith="loadtest-").delete()
+        # A tenth start out unsubscribed, to exercise re-activation races
+        NewsletterSubscriber.objects.bulk_create([
+            NewsletterSubscriber(email=email, status=NewsletterSubscriber.Status.UNSUBSCRIBED)
+            for email in addresses[::10]
+        ])
+
+        url = reverse("newsletter_subscribe")
+        local = threading.local()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def post(i):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(SERVER_NAME=options["host"])
+            email = addresses[i % len(addresses)]
+            started = time.perf_counter()
+            try:
+                response = client.post(url, {"email": email, "source": "loadtest", "next": "/"})
+                ok = response.status_code == 302
+                error = None if ok else f"HTTP {response.status_code}"
+            except IntegrityError as exc:
+                error = f"IntegrityError: {exc}"
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+
+        started = time.perf_counter()
+        # Measures the upsert, not portal/rate_limits.py (one client IP, few addresses)
+        with override_settings(PORTAL_RATE_LIMITS={}), ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(post, range(options["requests"])))
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        subscribed = NewsletterSubscriber.objects.filter(
+            email__startswith="loadtest-", status=NewsletterSubscriber.Status.SUBSCRIBED
+        ).count()
+        self.stdout.write(
+            f"{len(latencies)} requests in {wall:.1f}s ({len(latencies) / wall:.0f} req/s), "
+            f"concurrency {options['concurrency']}\n"
+            f"latency ms: p50 {pct(0.5):.1f}, p95 {pct(0.95):.1f}, p99 {pct(0.99):.1f}, "
+            f"max {latencies[-1] * 1000:.1f}, stdev {statistics.pstdev(latencies) * 1000:.1f}\n"
+            f"subscribed rows: {subscribed}/{len(addresses)}"
+        )
+        integrity = [e for e in errors if e.startswith("IntegrityError")]
+        if errors:
+            self.stderr.write(f"{len(errors)} errors ({len(integrity)} IntegrityError), e.g. {errors[0]}")
+        else:
+            self.stdout.write(self.style.SUCCESS("No errors."))
+
+        if not options["keep"]:
+            NewsletterSubscriber.objects.filter(email__startswith="loadtest-").delete()
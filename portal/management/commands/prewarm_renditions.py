@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from portal.renditions import discover_filter_specs, generate_renditions, used_filter_specs
+
+
+def _warm(image_id, filter_specs):
+    # Each pool process opens its own DB connection on first query
+    return image_id, generate_renditions(image_id, filter_specs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the renditions used by the portal templates for existing "
+        "images (the specs of the attributes each image is used as), in a "
+        "pool of worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2,
+            help="Number of worker processes (default: 2).",
+        )
+        parser.add_argument(
+            "--image", type=int, action="append", dest="image_ids",
+            help="Only warm this image id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        for attribute, field_specs in sorted(discover_filter_specs().items()):
+            self.stdout.write(f"{attribute}: {', '.join(field_specs)}")
+
+        # Only the specs each image is used with
+        specs_by_image = used_filter_specs(options["image_ids"])
+        image_ids = sorted(specs_by_image)
+
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+
+        done = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            futures = [
+                pool.submit(_warm, image_id, sorted(specs_by_image[image_id])) for image_id in image_ids
+            ]
+            for future in as_completed(futures):
+                try:
+                    image_id, generated = future.result()
+                except Exception as exc:
+                    self.stderr.write(f"Failed: {exc}")
+                    continue
+                done += 1
+                self.stdout.write(f"Image {image_id}: {len(generated)} renditions")
+
+        self.stdout.write(self.style.SUCCESS(f"Warmed {done}/{len(image_ids)} images."))
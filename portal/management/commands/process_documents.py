@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from wagtail.documents import get_document_model
+
+from portal.document_processing import process_document
+from portal.document_storage import link_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Build web-optimised PDFs, first-page previews and page counts for "
+        "existing documents (once per distinct file)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Rebuild previews that are already ready, failed or unsupported "
+                 "(without it, failed ones are only retried once their retry is due).",
+        )
+        parser.add_argument(
+            "--document", type=int, action="append", dest="document_ids",
+            help="Only process this document id (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        qs = get_document_model().objects.order_by("pk")
+        if options["document_ids"]:
+            qs = qs.filter(pk__in=options["document_ids"])
+
+        seen_blobs = set()
+        counts = {}
+        for document in qs.iterator(chunk_size=200):
+            # Documents uploaded before blobs existed need linking first
+            link_document(document)
+            preview = process_document(document.pk, force=options["force"])
+            if preview is None or preview.blob_id in seen_blobs:
+                continue
+            seen_blobs.add(preview.blob_id)
+            counts[preview.status] = counts.get(preview.status, 0) + 1
+            if preview.error:
+                self.stderr.write(f"#{document.pk} {document.filename}: {preview.error}")
+
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f"Processed {len(seen_blobs)} files: {summary or 'none'}."))
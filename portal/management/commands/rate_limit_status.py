@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import rate_limits
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the rate-limit counters for an IP address and/or email in each "
+        "scope (newsletter, contact), optionally resetting them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ip")
+        parser.add_argument("--email")
+        parser.add_argument("--scope", action="append", help="Limit to this scope (repeatable).")
+        parser.add_argument("--reset", action="store_true", help="Clear the matching counters.")
+
+    def handle(self, *args, **options):
+        identities = {"ip": options["ip"], "email": options["email"]}
+        if not any(identities.values()):
+            raise CommandError("Pass --ip and/or --email.")
+
+        scopes = options["scope"] or list(rate_limits.DEFAULT_LIMITS)
+        for scope in scopes:
+            for kind, value in identities.items():
+                if not value or kind not in rate_limits.limits_for(scope):
+                    continue
+                if options["reset"]:
+                    rate_limits.reset(scope, kind, value)
+                u = rate_limits.usage(scope, kind, value)
+                status = self.style.ERROR("LIMITED") if u.exceeded else self.style.SUCCESS("ok")
+                self.stdout.write(
+                    f"{scope:<11} {kind:<6} {value}: {u.estimated:.1f}/{u.limit} per {u.window}s "
+                    f"(current {u.current}, previous {u.previous}) {status}"
+                    + (f", retry after {u.retry_after}s" if u.exceeded else "")
+                )
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from portal import db_routing
+
+
+class Command(BaseCommand):
+    help = (
+        "Check the configured read replicas: whether each is a standby, its "
+        "replay lag, and whether anonymous traffic would be routed to it."
+    )
+
+    def handle(self, *args, **options):
+        aliases = db_routing.replica_aliases()
+        if not aliases:
+            self.stdout.write("No read replicas configured (postgres_replicas in data.json).")
+            return
+
+        for alias in aliases:
+            status = db_routing.check_replica(alias)
+            if status.error:
+                detail = f"unreachable: {status.error}"
+            elif status.lag is None:
+                detail = "standby, lag unknown (nothing replayed yet)"
+            else:
+                role = "standby" if status.in_recovery else "not a standby"
+                detail = f"{role}, lag {status.lag:.2f}s"
+            state = self.style.SUCCESS("usable") if status.usable else self.style.ERROR("skipped")
+            self.stdout.write(f"{alias:<10} {detail} {state}")
+
+        pinned = db_routing.primary_pinned_until()
+        if pinned:
+            until = datetime.fromtimestamp(pinned, timezone.utc)
+            self.stdout.write(f"All reads pinned to the primary until {until:%H:%M:%S} UTC (recent publish).")
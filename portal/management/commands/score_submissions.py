@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal.models import ContactSubmission
+from portal.spam import rescore, score_all_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Score contact submissions that are waiting for the spam scorer "
+        "(queuing their notifications), or re-score the stored backlog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rescore", action="store_true",
+            help="Re-score already scored submissions; NEW ones that now score as spam are "
+                 "marked SPAM and their queued emails cancelled.",
+        )
+        parser.add_argument(
+            "--days", type=int, default=30,
+            help="With --rescore, only submissions from the last N days (0 = all).",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        scored, spam = score_all_pending()
+        self.stdout.write(f"Scored {scored} pending submissions, {spam} marked as spam.")
+
+        if not options["rescore"]:
+            return
+
+        queryset = ContactSubmission.objects.filter(scored_at__isnull=False)
+        if options["days"]:
+            queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=options["days"]))
+        scored, spam = rescore(queryset, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Re-scored {scored} submissions, {spam} newly marked as spam."))
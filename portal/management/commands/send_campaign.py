@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.campaigns import CampaignLocked, CampaignSender, is_locked
+from portal.models import CampaignDelivery, NewsletterCampaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a newsletter campaign to all subscribed addresses. Re-running "
+        "it resumes after the last recorded delivery."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("campaign_id", type=int)
+        parser.add_argument(
+            "--rate", type=float,
+            help="Messages per second (default: PORTAL_CAMPAIGN_RATE; 0 = unthrottled).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int,
+            help="Recipients fetched and recorded per batch (default: PORTAL_CAMPAIGN_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--retry-failed", action="store_true",
+            help="Forget failed deliveries first so they are attempted again.",
+        )
+        parser.add_argument(
+            "--resend", action="store_true",
+            help="Send again even if the campaign is marked as sent (only to recipients without a delivery).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options["campaign_id"])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError("Campaign not found.")
+        if is_locked(campaign):
+            raise CommandError("Campaign is already being sent by another process.")
+
+        if options["retry_failed"]:
+            failed = campaign.deliveries.filter(status=CampaignDelivery.Status.FAILED)
+            count = failed.count()
+            failed.delete()
+            NewsletterCampaign.objects.filter(pk=campaign.pk).update(failed_count=0)
+            self.stdout.write(f"Retrying {count} failed deliveries.")
+        if options["resend"] or options["retry_failed"]:
+            campaign.status = NewsletterCampaign.Status.SENDING
+
+        def report(stats):
+            self.stdout.write(
+                f"sent {stats['sent']}, failed {stats['failed']}, "
+                f"{stats['rate']:.1f} msg/s, {stats['elapsed']:.0f}s elapsed"
+            )
+
+        try:
+            stats = CampaignSender(
+                campaign,
+                rate=options["rate"],
+                batch_size=options["batch_size"],
+                report=report,
+            ).send()
+        except CampaignLocked as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {stats['sent']} sent, {stats['failed']} failed in "
+            f"{stats['elapsed']:.1f}s ({stats['rate']:.1f} msg/s)."
+        ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal.outbox import OutboxSender
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued outbox emails. With --loop, keep running and reuse one "
+        "SMTP connection between polls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling for due emails instead of exiting when the queue is empty.",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5.0,
+            help="Seconds between polls when idle (default: 5).",
+        )
+        parser.add_argument(
+            "--idle-disconnect", type=float, default=60.0,
+            help="Close the SMTP connection after this many idle seconds (default: 60).",
+        )
+
+    def handle(self, *args, **options):
+        sender = OutboxSender()
+        idle_since = None
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = sender.send_batch()
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    idle_since = None
+                    self.stdout.write(f"sent {sent}, failed {failed}")
+                    continue
+                if not options["loop"]:
+                    break
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > options["idle_disconnect"]:
+                    sender.close()
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sender.close()
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent}, failed {total_failed}."))
@@ -0,0 +1,163 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from portal.single_flight import NAMESPACE, SingleFlight, single_flight
+from portal.tiered_cache import tiered_cache
+
+
+def _pct(latencies, p):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent workers missing the same cache key at once, "
+        "with a plain get/compute/set and with portal.single_flight, and "
+        "report how often the value was computed. With --url, hit a real "
+        "page (e.g. the home page) after invalidating its fragments instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=50)
+        parser.add_argument("--rounds", type=int, default=5, help="Invalidations to simulate.")
+        parser.add_argument("--compute-ms", type=int, default=200, help="Simulated compute time.")
+        parser.add_argument(
+            "--duration", type=float, default=3.0,
+            help="Seconds of steady traffic on a 1s TTL, to exercise early refresh.",
+        )
+        parser.add_argument("--url", help="Request this page instead of the synthetic computation.")
+        parser.add_argument("--host", default="localhost")
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            self.simulate_page(options)
+        else:
+            self.simulate_synthetic(options)
+
+    def _run_workers(self, count, target):
+        """Start ``count`` threads together; return each call's latency."""
+        barrier = threading.Barrier(count)
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                target()
+            finally:
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies
+
+    def _report(self, label, computes, latencies, extra=""):
+        self.stdout.write(
+            f"{label:<14} computed {computes:>4}x  latency ms p50 {_pct(latencies, 0.5):7.1f} "
+            f"p99 {_pct(latencies, 0.99):7.1f} max {max(latencies) * 1000:7.1f}"
+            + (f"  {extra}" if extra else "")
+        )
+
+    def simulate_synthetic(self, options):
+        workers, rounds = options["workers"], options["rounds"]
+        compute_seconds = options["compute_ms"] / 1000
+        shared = LocMemCache(f"stampede-{uuid.uuid4().hex}", {})
+        generations = {NAMESPACE: "0"}
+        computes = Counter()
+        lock = threading.Lock()
+
+        def compute(mode):
+            with lock:
+                computes[mode] += 1
+            time.sleep(compute_seconds)
+            return time.time()
+
+        def naive_get(timeout=300):
+            value = shared.get("naive")
+            if value is None:
+                value = compute("naive")
+                shared.set("naive", value, timeout)
+            return value
+
+        flight = SingleFlight(shared, generation=lambda namespace: generations[namespace])
+
+        def flight_get(timeout=300):
+            return flight.get("value", lambda: compute("single_flight"), timeout=timeout)
+
+        self.stdout.write(
+            f"{workers} workers, {rounds} invalidations, {options['compute_ms']} ms per computation"
+        )
+        for mode, get, invalidate in (
+            ("naive", naive_get, lambda: shared.delete("naive")),
+            ("single_flight", flight_get, lambda: generations.update({NAMESPACE: uuid.uuid4().hex})),
+        ):
+            latencies = []
+            for _ in range(rounds):
+                invalidate()
+                latencies += self._run_workers(workers, get)
+            self._report(mode, computes[mode], latencies)
+
+        # Steady traffic on a short TTL: expiries vs. early refreshes
+        duration, ttl = options["duration"], 1
+        if duration <= 0:
+            return
+        computes.clear()
+        shared.clear()
+        flight = SingleFlight(shared, generation=lambda namespace: generations[namespace])
+        for mode, get in (("naive", naive_get), ("single_flight", flight_get)):
+            latencies = []
+            stop = time.monotonic() + duration
+
+            def loop():
+                while time.monotonic() < stop:
+                    started = time.perf_counter()
+                    get(timeout=ttl)
+                    latencies.append(time.perf_counter() - started)
+                    time.sleep(0.01)
+
+            self._run_workers(workers, loop)
+            self._report(
+                f"{mode} (ttl {ttl}s)", computes[mode], latencies,
+                extra=f"over {duration:.0f}s, stats {flight.stats()}" if mode == "single_flight" else "",
+            )
+
+    def simulate_page(self, options):
+        workers, rounds = options["workers"], options["rounds"]
+        statuses = Counter()
+        lock = threading.Lock()
+        local = threading.local()
+
+        def get():
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(SERVER_NAME=options["host"])
+            response = client.get(options["url"])
+            with lock:
+                statuses[response.status_code] += 1
+
+        before = single_flight.stats()
+        latencies = []
+        for _ in range(rounds):
+            tiered_cache.invalidate(NAMESPACE)
+            latencies += self._run_workers(workers, get)
+        after = single_flight.stats()
+        delta = {event: after.get(event, 0) - before.get(event, 0) for event in after}
+        self._report(
+            options["url"], delta.get("computed", 0), latencies,
+            extra=f"statuses {dict(statuses)}, stats {delta}",
+        )
@@ -0,0 +1,97 @@
+import socketserver
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail from Django's SMTP backend."""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 portal smtp sink")
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self._reply("250-portal smtp sink")
+                self._reply("250 8BITMIME")
+            elif verb == "HELO":
+                self._reply("250 portal smtp sink")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = command[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(command[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b".\n", b""):
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                self.server.deliver(mail_from, rcpt_to, b"".join(data))
+                self._reply("250 OK queued")
+            elif verb == "RSET":
+                mail_from, rcpt_to = None, []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, command, outdir):
+        super().__init__(address, _SMTPHandler)
+        self.command = command
+        self.outdir = outdir
+        self.count = 0
+
+    def deliver(self, mail_from, rcpt_to, message):
+        self.count += 1
+        self.command.stdout.write(f"#{self.count} {mail_from} → {', '.join(rcpt_to)} ({len(message)} bytes)")
+        if self.outdir:
+            path = self.outdir / f"{time.time():.6f}-{self.count}.eml"
+            path.write_bytes(message)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local SMTP stand-in that accepts every message and writes it "
+        "to stdout or a directory. Point EMAIL_HOST/EMAIL_PORT at it in dev "
+        "and tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=1025)
+        parser.add_argument(
+            "--outdir",
+            help="Directory to store received messages as .eml files.",
+        )
+
+    def handle(self, *args, **options):
+        outdir = Path(options["outdir"]) if options["outdir"] else None
+        if outdir:
+            outdir.mkdir(parents=True, exist_ok=True)
+        server = _SMTPServer((options["host"], options["port"]), self, outdir)
+        self.stdout.write(f"SMTP sink listening on {options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
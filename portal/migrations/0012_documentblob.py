@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_contactpage_contactsubmission'),
+        ('wagtaildocs', '0014_alter_document_file_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('path', models.CharField(help_text='Storage name of the blob file.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document blob',
+                'verbose_name_plural': 'Document blobs',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentBlobLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(help_text='Document file name at the time it was linked.', max_length=255)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='links', to='portal.documentblob')),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='blob_link', to='wagtaildocs.document')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_documentblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed'), ('unsupported', 'Unsupported')], default='pending', max_length=20)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('preview_image', models.FileField(blank=True, upload_to='documents/previews')),
+                ('web_pdf', models.FileField(blank=True, upload_to='documents/previews')),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preview', to='portal.documentblob')),
+            ],
+            options={
+                'verbose_name': 'Document preview',
+                'verbose_name_plural': 'Document previews',
+            },
+        ),
+    ]
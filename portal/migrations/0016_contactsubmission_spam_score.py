@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_scored(apps, schema_editor):
+    # Existing submissions were already emailed when they arrived; the
+    # scorer must not queue their notifications again
+    ContactSubmission = apps.get_model("portal", "ContactSubmission")
+    ContactSubmission.objects.filter(scored_at__isnull=True).update(scored_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_newslettercampaign'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='message_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='spam_reasons',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='spam_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='contactsubmission',
+            index=models.Index(fields=['ip_address', 'created_at'], name='portal_contact_ip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactsubmission',
+            index=models.Index(condition=models.Q(('scored_at__isnull', True)), fields=['created_at'], name='portal_contact_unscored_idx'),
+        ),
+        migrations.RunPython(mark_existing_scored, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:56
+
+import django.db.models.deletion
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+TABLE = "portal_contactsubmission"
+OLD_TABLE = "portal_contactsubmission_old"
+SEQUENCE = "portal_contactsubmission_id_seq"
+# Used when the table has no page_id foreign key to take the name from
+DEFAULT_PAGE_FK = f"{TABLE}_page_id_fk"
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _secondary_indexes(cursor, table):
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f"{table}_pkey"],
+    )
+    # Indexes of a partitioned table are listed as "ON ONLY <table>"
+    return [row[0].replace(" ON ONLY ", " ON ") for row in cursor.fetchall()]
+
+
+def _page_fk_name(cursor, table):
+    """The page_id foreign key's name, as created on this database."""
+    cursor.execute(
+        "SELECT con.conname FROM pg_constraint con "
+        "JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = ANY (con.conkey) "
+        "WHERE con.conrelid = %s::regclass AND con.contype = 'f' AND att.attname = 'page_id'",
+        [table],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else DEFAULT_PAGE_FK
+
+
+def _swap_in(cursor, index_defs, primary_key, page_fk):
+    # Index definitions name the table, which has its old name again by now
+    cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})")
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT "{page_fk}" FOREIGN KEY (page_id) '
+        "REFERENCES portal_contactpage (page_ptr_id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    for index_def in index_defs:
+        cursor.execute(index_def)
+
+
+def partition(apps, schema_editor):
+    """
+    Rebuild the table as PARTITION BY RANGE (created_at), one partition per
+    month from the oldest row to MONTHS_AHEAD months out, plus DEFAULT.
+    PostgreSQL requires the partition key in the primary key, so it becomes
+    (id, created_at); ids still come from one sequence and stay unique.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(created_at), now() FROM {TABLE}")
+        oldest, now = cursor.fetchone()
+        index_defs = _secondary_indexes(cursor, TABLE)
+        page_fk = _page_fk_name(cursor, TABLE)
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        # Free the sequence name (identity, or plain after a reverse migration)
+        cursor.execute(f"ALTER TABLE {OLD_TABLE} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {OLD_TABLE} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+
+        first = (oldest or now).astimezone(timezone.utc)
+        month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+        last = _add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [month, _add_months(month, 1)],
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+        cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+        cursor.execute(f"DROP TABLE {OLD_TABLE}")
+        _swap_in(cursor, index_defs, "id, created_at", page_fk)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        index_defs = _secondary_indexes(cursor, TABLE)
+        page_fk = _page_fk_name(cursor, TABLE)
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+        cursor.execute(f"DROP TABLE {OLD_TABLE} CASCADE")
+        _swap_in(cursor, index_defs, "id", page_fk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0016_contactsubmission_spam_score'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outgoingemail',
+            name='submission',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='emails', to='portal.contactsubmission'),
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0017_partition_contactsubmission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Set while a sender holds the campaign (see portal/campaigns.py).', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0018_newslettercampaign_lease_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='held_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
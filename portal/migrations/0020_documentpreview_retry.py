@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0019_contactsubmission_held_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentpreview',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentpreview',
+            name='retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
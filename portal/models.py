@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from modelcluster.fields import ParentalKey, ParentalManyToManyField
@@ -23,15 +23,17 @@ from modelcluster.models import ClusterableModel
 from wagtail.contrib.settings.models import BaseSiteSetting, register_setting
 from django.utils import timezone
 from wagtail.models import Site 
+import copy
 import urllib.parse
 from wagtail import blocks
 from django.conf import settings
 from django import forms
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.shortcuts import redirect, render
 from django.utils.html import strip_tags
 
+from .tiered_cache import cached_list, tiered_cache
+
 
 
 # Optional media (video/audio) support
@@ -266,7 +268,28 @@ class PortalSiteSettings(BaseSiteSetting):
         FieldPanel("footer_partner_row"),
     ]
 
-@register_snippet
+    @classmethod
+    def for_site(cls, site):
+        """
+        Served from the tiered cache; invalidated when the settings or a
+        partner row are saved (signal_handlers.py).
+        """
+        if site is None:
+            return super().for_site(site)
+
+        def load():
+            instance = super(PortalSiteSettings, cls).for_site(site)
+            # Load the rows now so the cached copy carries them
+            instance.default_partner_row, instance.footer_partner_row
+            return instance
+
+        cached = tiered_cache.get_or_set("site-settings", site.pk, load)
+        # for_request() sets per-request attributes on the instance it returns
+        instance = copy.copy(cached)
+        instance._page_url_cache = {}
+        return instance
+
+# Registered as a snippet with a custom viewset in wagtail_hooks.py
 class NewsletterSubscriber(index.Indexed, models.Model):
     class Status(models.TextChoices):
         SUBSCRIBED = "subscribed", "Subscribed"
@@ -321,9 +344,146 @@ class NewsletterSubscriber(index.Indexed, models.Model):
     def __str__(self):
         return self.email
 
+    @staticmethod
+    def normalise_email(email):
+        """The stored form of an address: stripped and lowercased."""
+        return (email or "").strip().lower()
+
     def save(self, *args, **kwargs):
-        self.email = (self.email or "").strip().lower()
+        self.email = self.normalise_email(self.email)
         super().save(*args, **kwargs)
+
+    @classmethod
+    def subscribe(cls, email, site_id=None, source=""):
+        """
+        Subscribe ``email`` in one atomic statement (INSERT ... ON CONFLICT DO
+        UPDATE ... RETURNING), safe against concurrent signups for the same
+        address. Returns ``(pk, outcome)`` with outcome "created",
+        "reactivated" (was UNSUBSCRIBED) or "existing" (pk is None then).
+
+        An existing row only has its blank site/source filled in, as the
+        previous get_or_create() flow did. The conflict update only fires for
+        UNSUBSCRIBED rows; a new row is told apart from a reactivated one by
+        subscribed_at, which the update leaves alone.
+        """
+        email = cls.normalise_email(email)
+        now = timezone.now()
+        table = connection.ops.quote_name(cls._meta.db_table)
+        subscribed = cls.Status.SUBSCRIBED
+        unsubscribed = cls.Status.UNSUBSCRIBED
+        sql = f"""
+            INSERT INTO {table}
+                (email, full_name, site_id, source, status, subscribed_at, unsubscribed_at, notes)
+            VALUES (%s, '', %s, %s, %s, %s, NULL, '')
+            ON CONFLICT (email) DO UPDATE SET
+                status = %s,
+                unsubscribed_at = NULL,
+                site_id = COALESCE({table}.site_id, EXCLUDED.site_id),
+                source = CASE WHEN {table}.source = '' THEN EXCLUDED.source ELSE {table}.source END
+            WHERE {table}.status = %s
+            RETURNING id, subscribed_at = %s
+        """
+        # Let the backend adapt the datetime (aware/naive, text on SQLite)
+        now = cls._meta.get_field("subscribed_at").get_db_prep_value(now, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [email, site_id, source, subscribed, now, subscribed, unsubscribed, now])
+            row = cursor.fetchone()
+        if row is None:
+            return None, "existing"
+
+        pk, inserted = row
+        return pk, ("created" if inserted else "reactivated")
+
+    @classmethod
+    def unsubscribe(cls, pk):
+        """Unsubscribe subscriber ``pk``; False if it already was unsubscribed."""
+        return bool(
+            cls.objects.filter(pk=pk, status=cls.Status.SUBSCRIBED)
+            .update(status=cls.Status.UNSUBSCRIBED, unsubscribed_at=timezone.now())
+        )
+
+
+@register_snippet
+class NewsletterCampaign(models.Model):
+    """
+    A newsletter issue sent to every SUBSCRIBED subscriber by
+    ``manage.py send_campaign`` (see portal/campaigns.py).
+    """
+    class Status(models.TextChoices):
+        DRAFT = "draft", "Draft"
+        SENDING = "sending", "Sending"
+        SENT = "sent", "Sent"
+
+    subject = models.CharField(max_length=200)
+    body = RichTextField()
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        help_text="Leave blank to use DEFAULT_FROM_EMAIL.",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.DRAFT,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    lease_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Set while a sender holds the campaign (see portal/campaigns.py).",
+    )
+
+    panels = [
+        FieldPanel("subject"),
+        FieldPanel("from_email"),
+        FieldPanel("body"),
+    ]
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Newsletter campaign"
+        verbose_name_plural = "Newsletter campaigns"
+
+    def __str__(self):
+        return self.subject
+
+
+class CampaignDelivery(models.Model):
+    """Per-recipient send state; a campaign resumes after the last recorded one."""
+    class Status(models.TextChoices):
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    campaign = models.ForeignKey(
+        NewsletterCampaign,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+    )
+    subscriber = models.ForeignKey(
+        NewsletterSubscriber,
+        on_delete=models.CASCADE,
+        related_name="campaign_deliveries",
+    )
+    status = models.CharField(max_length=20, choices=Status.choices)
+    error = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["campaign", "subscriber"],
+                name="portal_campaign_delivery_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} → {self.subscriber_id} ({self.status})"
+
 # ============================================================
 #  TAGGING SUPPORT (ad-hoc tags)
 # ============================================================
@@ -341,17 +501,28 @@ class ResourceTag(TaggedItemBase):
 
 
 class OfficeEmbedBlock(blocks.StructBlock):
+    """
+    Shows an Office document through the local PDF viewer, using the PDF
+    converted in the background (portal/document_processing.py). Until the
+    conversion is ready the block offers the download, or uses Office Online
+    when PORTAL_OFFICE_ONLINE_FALLBACK is on.
+    """
     document = DocumentChooserBlock(required=True)
 
     def get_context(self, value, parent_context=None):
+        from .document_processing import document_preview, web_pdf_url
+
         context = super().get_context(value, parent_context)
 
         doc = value.get("document")
         request = (parent_context or {}).get("request")
 
         embed_url = None
+        preview = document_preview(doc) if doc else None
 
-        if doc:
+        if preview and preview.web_pdf:
+            embed_url = web_pdf_url(doc)
+        elif doc and getattr(settings, "PORTAL_OFFICE_ONLINE_FALLBACK", False):
             # 1) Try to build an absolute URL from the request (if available)
             if request is not None:
                 absolute_url = request.build_absolute_uri(doc.url)
@@ -369,6 +540,7 @@ class OfficeEmbedBlock(blocks.StructBlock):
             )
 
         context["embed_url"] = embed_url
+        context["preview"] = preview
         context["document"] = doc
         return context
 
@@ -409,16 +581,17 @@ class HomePage(Page):
         FieldPanel("partner_row"),
     ]
 
-    def get_context(self, request):
+    def get_summary(self):
+        """
+        The listings and counts shown on the home page. Cached stampede-safe
+        in get_context (portal/single_flight.py); querysets are evaluated so
+        the result can be cached.
+        """
         from .models import (
             RepositoryIndexPage, ExpertIndexPage,
             WebinarIndexPage, TestimonialIndexPage, ResourcePage,
             WebinarPage, ExpertPage, TestimonialPage
         )
-        context = super().get_context(request)
-        site_settings = PortalSiteSettings.for_request(request)
-        resolved_partner_row = self.partner_row or site_settings.default_partner_row
-
         repo_index = RepositoryIndexPage.objects.live().first()
         experts_index = ExpertIndexPage.objects.live().first()
         webinars_index = WebinarIndexPage.objects.live().first()
@@ -453,13 +626,11 @@ class HomePage(Page):
             if testimonials_index else TestimonialPage.objects.live().count()
         )
 
-        context.update({
+        return {
             "repo_index": repo_index,
             "experts_index": experts_index,
             "webinars_index": webinars_index,
             "testimonials_index": testimonials_index,
-            "partner_row": resolved_partner_row,
-            
 
             # Summary counts
             "resource_count": resource_count,
@@ -467,15 +638,27 @@ class HomePage(Page):
             "expert_count": expert_count,
             "testimonial_count": testimonial_count,
 
-            "featured_resources": featured_resources,
+            "featured_resources": list(featured_resources),
 
-            "upcoming_webinars": WebinarPage.objects.live()
+            "upcoming_webinars": list(
+                WebinarPage.objects.live()
                 .filter(start_datetime__gte=models.functions.Now())
-                .order_by("start_datetime")[:3],
+                .order_by("start_datetime")[:3]
+            ),
 
-            "experts": ExpertPage.objects.live()[:8],
-            "testimonials": TestimonialPage.objects.live()[:4],
-        })
+            "experts": list(ExpertPage.objects.live()[:8]),
+            "testimonials": list(TestimonialPage.objects.live()[:4]),
+        }
+
+    def get_context(self, request):
+        from .single_flight import cached
+
+        context = super().get_context(request)
+        site_settings = PortalSiteSettings.for_request(request)
+        resolved_partner_row = self.partner_row or site_settings.default_partner_row
+
+        context.update(cached(f"home-summary:{self.pk}", self.get_summary))
+        context["partner_row"] = resolved_partner_row
         return context
 
 
@@ -520,12 +703,20 @@ class RepositoryIndexPage(Page):
         if language:
             qs = qs.filter(languages__code=language)
 
+        if any((q, kind, topic, audience, region, language)):
+            resource_count = qs.count()
+        else:
+            from .single_flight import cached
+
+            resource_count = cached(f"repository-count:{self.pk}", qs.count)
+
         context.update({
             "resources": qs,
-            "topics": Topic.objects.all(),
-            "audiences": Audience.objects.all(),
-            "regions": Region.objects.all(),
-            "languages": Language.objects.all(),
+            "resource_count": resource_count,
+            "topics": cached_list(Topic),
+            "audiences": cached_list(Audience),
+            "regions": cached_list(Region),
+            "languages": cached_list(Language),
         })
         return context
 
@@ -768,9 +959,9 @@ class ExpertIndexPage(Page):
 
         ctx.update({
             "experts": qs,
-            "topics": Topic.objects.all(),
-            "regions": Region.objects.all(),
-            "languages": Language.objects.all(),
+            "topics": cached_list(Topic),
+            "regions": cached_list(Region),
+            "languages": cached_list(Language),
         })
         return ctx
 
@@ -852,7 +1043,7 @@ class WebinarIndexPage(Page):
 
         ctx.update({
             "webinars": qs,
-            "topics": Topic.objects.all(),
+            "topics": cached_list(Topic),
         })
         return ctx
 
@@ -988,10 +1179,10 @@ class TrainingIndexPage(Page):
         ctx.update({
             "trainings": qs,
             "featured_trainings": featured_trainings,
-            "topics": Topic.objects.all(),
-            "audiences": Audience.objects.all(),
-            "regions": Region.objects.all(),
-            "languages": Language.objects.all(),
+            "topics": cached_list(Topic),
+            "audiences": cached_list(Audience),
+            "regions": cached_list(Region),
+            "languages": cached_list(Language),
             "training_formats": TrainingPage.DeliveryFormat.choices,
             "training_statuses": TrainingPage.Status.choices,
             "training_levels": TrainingPage.Level.choices,
@@ -1310,7 +1501,7 @@ class TestimonialIndexPage(Page):
 
         ctx.update({
             "testimonials": qs,
-            "topics": Topic.objects.all(),
+            "topics": cached_list(Topic),
         })
         return ctx
 
@@ -1701,6 +1892,10 @@ class AboutPrinciple(Orderable):
 class ContactSubmission(models.Model):
     """
     Stores contact form submissions for review in Django admin.
+
+    On PostgreSQL the table is range-partitioned by month on created_at
+    (portal/partitions.py); old resolved/spam rows are moved to compressed
+    archives by the archive_contact_submissions command.
     """
     class Status(models.TextChoices):
         NEW = "new", "New"
@@ -1733,8 +1928,26 @@ class ContactSubmission(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Spam scoring (portal/spam.py); scored_at stays empty until the
+    # background scorer has looked at the submission
+    message_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    spam_score = models.FloatField(null=True, blank=True)
+    spam_reasons = models.CharField(max_length=255, blank=True)
+    scored_at = models.DateTimeField(null=True, blank=True)
+    # Set when the scorer marked it spam before its notifications were
+    # queued; "not spam" in the admin then sends them
+    held_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["ip_address", "created_at"], name="portal_contact_ip_idx"),
+            models.Index(
+                fields=["created_at"],
+                name="portal_contact_unscored_idx",
+                condition=models.Q(scored_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} — {self.subject}"
@@ -1902,6 +2115,46 @@ class ContactPage(Page, index.Indexed):
             if e.strip()
         ]
 
+    def queue_notifications(self, submission):
+        """Queue the team notification and the auto-reply for a submission."""
+        from .outbox import queue_email
+
+        # Notify admins/team
+        recipients = self._notification_recipient_list()
+        if recipients:
+            admin_subject = f"[SCACAF e-Hub Contact] {submission.subject}"
+            admin_body = (
+                f"New contact form submission\n\n"
+                f"Name: {submission.name}\n"
+                f"Email: {submission.email}\n"
+                f"Organization: {submission.organization or '-'}\n"
+                f"Subject: {submission.subject}\n\n"
+                f"Message:\n{submission.message}\n\n"
+                f"Submitted at: {submission.created_at}\n"
+                f"IP: {submission.ip_address or '-'}\n"
+            )
+            queue_email(
+                subject=admin_subject,
+                body=admin_body,
+                recipients=recipients,
+                reply_to=submission.email,
+                submission=submission,
+            )
+
+        # Auto reply to sender
+        if self.send_auto_reply and submission.email:
+            reply_subject = self.auto_reply_subject or "We received your message"
+            try:
+                reply_body = (self.auto_reply_body or "").format(name=submission.name)
+            except (KeyError, IndexError, ValueError):
+                reply_body = self.auto_reply_body or ""
+            queue_email(
+                subject=reply_subject,
+                body=reply_body,
+                recipients=[submission.email],
+                submission=submission,
+            )
+
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
 
@@ -1916,6 +2169,16 @@ class ContactPage(Page, index.Indexed):
         from .forms import ContactUsForm  # lazy import
 
         if request.method == "POST":
+            from .rate_limits import hit, too_many_requests
+
+            limited = hit(
+                "contact",
+                ip=self._get_client_ip(request),
+                email=request.POST.get("email"),
+            )
+            if limited:
+                return too_many_requests(limited)
+
             form = ContactUsForm(request.POST)
 
             if form.is_valid():
@@ -1923,7 +2186,11 @@ class ContactPage(Page, index.Indexed):
                 if form.cleaned_data.get("website"):
                     return redirect(f"{request.path}?sent=1")
 
-                submission = ContactSubmission.objects.create(
+                from .spam import message_hash, schedule_scoring
+
+                # Only the submission is stored here; the spam scorer runs
+                # after commit and queues the notifications if it is clean
+                ContactSubmission.objects.create(
                     page=self,
                     name=form.cleaned_data["name"],
                     email=form.cleaned_data["email"],
@@ -1932,47 +2199,9 @@ class ContactPage(Page, index.Indexed):
                     message=form.cleaned_data["message"],
                     ip_address=self._get_client_ip(request),
                     user_agent=request.META.get("HTTP_USER_AGENT", "")[:1000],
+                    message_hash=message_hash(form.cleaned_data["message"]),
                 )
-
-                # Notify admins/team
-                recipients = self._notification_recipient_list()
-                if recipients:
-                    try:
-                        admin_subject = f"[SCACAF e-Hub Contact] {submission.subject}"
-                        admin_body = (
-                            f"New contact form submission\n\n"
-                            f"Name: {submission.name}\n"
-                            f"Email: {submission.email}\n"
-                            f"Organization: {submission.organization or '-'}\n"
-                            f"Subject: {submission.subject}\n\n"
-                            f"Message:\n{submission.message}\n\n"
-                            f"Submitted at: {submission.created_at}\n"
-                            f"IP: {submission.ip_address or '-'}\n"
-                        )
-                        send_mail(
-                            subject=admin_subject,
-                            message=admin_body,
-                            from_email=None,  # uses DEFAULT_FROM_EMAIL
-                            recipient_list=recipients,
-                            fail_silently=True,
-                        )
-                    except Exception:
-                        pass
-
-                # Auto reply to sender
-                if self.send_auto_reply and submission.email:
-                    try:
-                        reply_subject = self.auto_reply_subject or "We received your message"
-                        reply_body = (self.auto_reply_body or "").format(name=submission.name)
-                        send_mail(
-                            subject=reply_subject,
-                            message=reply_body,
-                            from_email=None,
-                            recipient_list=[submission.email],
-                            fail_silently=True,
-                        )
-                    except Exception:
-                        pass
+                schedule_scoring()
 
                 messages.success(request, "Your message has been sent successfully.")
                 return redirect(f"{request.path}?sent=1")
@@ -1987,7 +2216,156 @@ class ContactPage(Page, index.Indexed):
 
     @staticmethod
     def _get_client_ip(request):
-        xff = request.META.get("HTTP_X_FORWARDED_FOR")
-        if xff:
-            return xff.split(",")[0].strip()
-        return request.META.get("REMOTE_ADDR")
+        from .rate_limits import client_ip
+
+        return client_ip(request)
+
+
+# ============================================================
+#  DOCUMENT STORAGE (content-addressed blobs)
+# ============================================================
+
+class DocumentBlob(models.Model):
+    """
+    One stored copy of some document content, keyed by SHA-256. Documents
+    with identical bytes share a blob (see portal/document_storage.py).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    path = models.CharField(max_length=255, help_text="Storage name of the blob file.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Document blob"
+        verbose_name_plural = "Document blobs"
+
+    def __str__(self):
+        return self.sha256
+
+
+class DocumentBlobLink(models.Model):
+    """A document's reference to its blob; the blob's reference count."""
+    document = models.OneToOneField(
+        "wagtaildocs.Document",
+        on_delete=models.CASCADE,
+        related_name="blob_link",
+    )
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        related_name="links",
+    )
+    file_name = models.CharField(
+        max_length=255,
+        help_text="Document file name at the time it was linked.",
+    )
+
+    def __str__(self):
+        return f"{self.document_id} → {self.blob_id}"
+
+
+class DocumentPreview(models.Model):
+    """
+    Derived files for a blob's content, shared by every document with the
+    same bytes: a web-optimised (linearised) PDF, a first-page preview and
+    the page count. Built in the background by portal/document_processing.py.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+        UNSUPPORTED = "unsupported", "Unsupported"
+
+    blob = models.OneToOneField(
+        DocumentBlob,
+        on_delete=models.CASCADE,
+        related_name="preview",
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    preview_image = models.FileField(upload_to="documents/previews", blank=True)
+    web_pdf = models.FileField(upload_to="documents/previews", blank=True)
+    error = models.TextField(blank=True)
+    # Failed runs, and when the next one is due (None: not retried)
+    attempts = models.PositiveIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Document preview"
+        verbose_name_plural = "Document previews"
+
+    def __str__(self):
+        return f"{self.blob_id} ({self.status})"
+
+    @property
+    def is_ready(self):
+        return self.status == self.Status.READY
+
+
+# ============================================================
+#  OUTGOING EMAIL (outbox, see portal/outbox.py)
+# ============================================================
+
+class OutgoingEmail(models.Model):
+    """
+    A queued email. Rows are written in the same transaction as whatever
+    triggered them and sent later by the outbox worker, with retries.
+    """
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        help_text="Leave blank to use DEFAULT_FROM_EMAIL.",
+    )
+    recipients = models.TextField(help_text="Comma-separated email addresses.")
+    reply_to = models.CharField(max_length=254, blank=True)
+
+    # No database constraint: the partitioned submission table has no
+    # unique index on id alone (see portal/partitions.py)
+    submission = models.ForeignKey(
+        ContactSubmission,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="emails",
+        db_constraint=False,
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="portal_outbox_due_idx"),
+        ]
+        verbose_name = "Outgoing email"
+        verbose_name_plural = "Outgoing emails"
+
+    def __str__(self):
+        return f"{self.subject} → {self.recipients}"
+
+    @property
+    def recipient_list(self):
+        return [e.strip() for e in self.recipients.split(",") if e.strip()]
@@ -0,0 +1,215 @@
+# portal/outbox.py
+"""
+Database-backed outbox for outgoing email.
+
+``queue_email`` only inserts an ``OutgoingEmail`` row, inside the caller's
+transaction, so the contact form commits without ever talking to SMTP. After
+commit a background task (or the long-running ``send_outbox --loop``
+worker) claims due rows and sends them over one reused SMTP connection.
+When tasks run inline (the ImmediateBackend), no task is queued: that would
+send in the request after all, so the rows wait for ``send_outbox``.
+
+Failed sends are retried with exponential backoff (PORTAL_OUTBOX_RETRY_BASE
+seconds, doubling, capped at PORTAL_OUTBOX_RETRY_MAX) until
+PORTAL_OUTBOX_MAX_ATTEMPTS, then marked failed. Claimed rows are leased for
+PORTAL_OUTBOX_LEASE seconds, so a worker that dies mid-batch doesn't lose
+mail and two workers never send the same row. A kept-open connection is
+only probed (NOOP) after PORTAL_OUTBOX_IDLE_PROBE seconds without a send.
+"""
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_connection_error(exc):
+    """
+    True for a lost/unreachable relay (reconnect and retry), False for errors
+    about the message itself. SMTPException subclasses OSError, hence the
+    explicit check.
+    """
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def queue_email(subject, body, recipients, from_email="", reply_to="", submission=None):
+    """Add an email to the outbox; it is sent once the transaction commits."""
+    from .models import OutgoingEmail
+
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    email = OutgoingEmail.objects.create(
+        subject=subject[:255],
+        body=body,
+        from_email=from_email or "",
+        recipients=", ".join(recipients),
+        reply_to=reply_to or "",
+        submission=submission,
+    )
+    schedule_delivery()
+    return email
+
+
+def schedule_delivery():
+    from .tasks import runs_inline, send_outbox_task
+
+    send_on_commit = _setting("PORTAL_OUTBOX_SEND_ON_COMMIT", None)
+    if send_on_commit is None:
+        send_on_commit = not runs_inline()
+    if not send_on_commit:
+        return
+
+    transaction.on_commit(lambda: send_outbox_task.enqueue())
+
+
+def retry_delay(attempts):
+    base = _setting("PORTAL_OUTBOX_RETRY_BASE", 30)
+    return min(base * 2 ** max(attempts - 1, 0), _setting("PORTAL_OUTBOX_RETRY_MAX", 3600))
+
+
+def claim_due(limit):
+    """
+    Lease up to ``limit`` due emails to this worker. Rows locked by another
+    worker are skipped, not waited for.
+    """
+    from .models import OutgoingEmail
+
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.Status.QUEUED, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:limit]
+        )
+        if emails:
+            OutgoingEmail.objects.filter(pk__in=[e.pk for e in emails]).update(
+                next_attempt_at=now + timedelta(seconds=_setting("PORTAL_OUTBOX_LEASE", 300))
+            )
+    return emails
+
+
+def _message(email, connection):
+    return EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email or None,
+        to=email.recipient_list,
+        reply_to=[email.reply_to] if email.reply_to else None,
+        connection=connection,
+    )
+
+
+def _mark_sent(email):
+    email.status = email.Status.SENT
+    email.attempts += 1
+    email.sent_at = timezone.now()
+    email.last_error = ""
+    email.save(update_fields=["status", "attempts", "sent_at", "last_error"])
+
+
+def _mark_failed(email, exc):
+    email.attempts += 1
+    email.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if email.attempts >= _setting("PORTAL_OUTBOX_MAX_ATTEMPTS", 8):
+        email.status = email.Status.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+    email.save(update_fields=["status", "attempts", "next_attempt_at", "last_error"])
+
+
+class OutboxSender:
+    """
+    Sends outbox batches over one SMTP connection, opened lazily and kept
+    open between batches (for the ``--loop`` worker) until ``close``.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection
+        self._last_used = None
+
+    def _idle(self):
+        if self._last_used is None:
+            return True
+        return time.monotonic() - self._last_used > _setting("PORTAL_OUTBOX_IDLE_PROBE", 30)
+
+    def _open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+        smtp = getattr(self.connection, "connection", None)
+        if smtp is not None and self._idle():
+            # The relay may have dropped an idle connection since the last
+            # batch; a drop mid-batch is a connection error, reset below
+            try:
+                smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._reset()
+                return self._open()
+        self.connection.open()
+        return self.connection
+
+    def _reset(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.connection = None
+        self._last_used = None
+
+    def close(self):
+        self._reset()
+
+    def send_batch(self, limit=None):
+        """Send one batch of due emails; returns ``(sent, failed)``."""
+        from .models import OutgoingEmail
+
+        emails = claim_due(limit or _setting("PORTAL_OUTBOX_BATCH_SIZE", 50))
+        sent = failed = 0
+        for email in emails:
+            if email.status != OutgoingEmail.Status.QUEUED:
+                continue
+            try:
+                connection = self._open()
+                _message(email, connection).send()
+            except Exception as exc:
+                logger.warning("Sending outbox email %s failed: %s", email.pk, exc)
+                _mark_failed(email, exc)
+                failed += 1
+                if is_connection_error(exc):
+                    self._reset()
+                else:
+                    self._last_used = time.monotonic()
+                continue
+            self._last_used = time.monotonic()
+            _mark_sent(email)
+            sent += 1
+        return sent, failed
+
+
+def send_due(limit=None):
+    """Send everything currently due (one connection for all batches)."""
+    sender = OutboxSender()
+    total_sent = total_failed = 0
+    try:
+        while True:
+            sent, failed = sender.send_batch(limit)
+            total_sent += sent
+            total_failed += failed
+            if not sent and not failed:
+                break
+    finally:
+        sender.close()
+    return total_sent, total_failed
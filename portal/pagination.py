@@ -0,0 +1,246 @@
+# portal/pagination.py
+"""
+Admin pagination for large tables.
+
+``EstimatedCountPaginator`` asks the PostgreSQL planner for the row count
+(table statistics when unfiltered, EXPLAIN otherwise) and only runs an exact
+``COUNT(*)`` when the estimate is below PORTAL_ADMIN_EXACT_COUNT_LIMIT.
+
+``KeysetPage`` pages through a listing on its default ordering, a
+descending ``(field, pk)`` pair, by seeking past the last row shown
+(``WHERE (field, pk) < (...)``) instead of using OFFSET, so every page costs
+the same. Pages are addressed by an opaque ``cursor`` query parameter.
+
+``KeysetChangeList`` and ``KeysetIndexViewMixin`` plug both into the Django
+admin changelist and Wagtail's generic index views respectively; listings
+with a column sort or a search fall back to numbered pages.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from wagtail.admin.paginator import WagtailPaginator
+
+CURSOR_VAR = "cursor"
+
+
+def _planner_estimate(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            # Sum over partitions too; reltuples is -1 until first ANALYZE
+            cursor.execute(
+                """
+                SELECT sum(c.reltuples) FILTER (WHERE c.reltuples >= 0), bool_and(c.reltuples < 0)
+                FROM pg_class c
+                WHERE c.oid = %s::regclass
+                   OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+                """,
+                [queryset.model._meta.db_table] * 2,
+            )
+            total, never_analyzed = cursor.fetchone()
+            return None if never_analyzed else int(total or 0)
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimated_count(queryset):
+    """``(count, is_estimate)``: the planner's estimate when it is large, else exact."""
+    limit = getattr(settings, "PORTAL_ADMIN_EXACT_COUNT_LIMIT", 10000)
+    estimate = _planner_estimate(queryset)
+    if estimate is not None and estimate >= limit:
+        return estimate, True
+    return queryset.count(), False
+
+
+class EstimatedCountPaginator(WagtailPaginator):
+    @cached_property
+    def _count(self):
+        if hasattr(self.object_list, "query"):
+            return estimated_count(self.object_list)
+        return len(self.object_list), False
+
+    @cached_property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def is_estimate(self):
+        return self._count[1]
+
+    @cached_property
+    def items_count_label(self):
+        label = super().items_count_label
+        return f"about {label}" if self.is_estimate else label
+
+
+# Keyset pagination
+
+def _encode(direction, value, pk):
+    raw = json.dumps([direction, value.isoformat() if hasattr(value, "isoformat") else value, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, value, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if direction not in ("after", "before"):
+        return None
+    return direction, parse_datetime(value) if isinstance(value, str) else value, pk
+
+
+class KeysetPage:
+    """
+    One page of ``queryset`` ordered by ``-field, -pk``, starting after (or
+    ending before) the row encoded in ``cursor``. Quacks enough like a Django
+    ``Page`` for the admin templates.
+    """
+
+    def __init__(self, queryset, field, per_page, cursor=None):
+        self.field = field
+        self.per_page = per_page
+        decoded = _decode(cursor) if cursor else None
+        direction, value, pk = decoded or (None, None, None)
+
+        if direction == "before":
+            rows = list(
+                queryset.filter(Q(**{f"{field}__gt": value}) | Q(**{field: value, "pk__gt": pk}))
+                .order_by(field, "pk")[: per_page + 1]
+            )
+            self._has_previous = len(rows) > per_page
+            self._has_next = True
+            rows = rows[:per_page][::-1]
+        else:
+            if direction == "after":
+                queryset = queryset.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, "pk__lt": pk}))
+            rows = list(queryset.order_by(f"-{field}", "-pk")[: per_page + 1])
+            self._has_previous = direction == "after"
+            self._has_next = len(rows) > per_page
+            rows = rows[:per_page]
+        self.object_list = rows
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            last = self.object_list[-1]
+            return _encode("after", getattr(last, self.field), last.pk)
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            first = self.object_list[0]
+            return _encode("before", getattr(first, self.field), first.pk)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Django admin changelist that uses ``KeysetPage`` on the default ordering
+    without a search, and ``EstimatedCountPaginator`` for the result count.
+    """
+    keyset_page = None
+    result_count_is_estimate = False
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Every link except the keyset ones starts from the newest rows again
+        new_params = {CURSOR_VAR: None, **(new_params or {})}
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or self.query or self.show_all:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset_page = KeysetPage(
+            self.queryset, self.model_admin.keyset_field, self.list_per_page, request.GET.get(CURSOR_VAR)
+        )
+        self.result_count = paginator.count
+        self.result_count_is_estimate = paginator.is_estimate
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = self.keyset_page.object_list
+        self.can_show_all = False
+        self.multi_page = self.keyset_page.has_other_pages()
+        self.paginator = paginator
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.keyset_page.next_cursor})
+
+    @property
+    def previous_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.keyset_page.previous_cursor})
+
+
+class KeysetPaginationAdminMixin:
+    """
+    ModelAdmin mixin: estimated counts and keyset pages on ``keyset_field``
+    (which must match the model's default ``-field`` ordering).
+    """
+    keyset_field = "created_at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class KeysetIndexViewMixin:
+    """
+    Mixin for Wagtail generic ``IndexView`` subclasses: estimated counts and,
+    on the default ordering without a search, keyset pages on ``keyset_field``.
+    """
+    keyset_field = None
+    paginator_class = EstimatedCountPaginator
+
+    @property
+    def uses_keyset(self):
+        return bool(self.keyset_field) and not self.is_searching and self.ordering in (
+            None, self.default_ordering, f"-{self.keyset_field}"
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.uses_keyset:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.get_paginator(queryset, page_size)
+        page = KeysetPage(queryset, self.keyset_field, page_size, self.request.GET.get(CURSOR_VAR))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        context["keyset"] = self.uses_keyset
+        return context
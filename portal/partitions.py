@@ -0,0 +1,136 @@
+# portal/partitions.py
+"""
+Monthly range partitions of the contact submission table (PostgreSQL).
+
+Migration 0017 turns ``portal_contactsubmission`` into a table partitioned
+by ``created_at`` with one partition per calendar month (UTC) plus a DEFAULT
+partition for anything outside them. Queries bounded on ``created_at`` (the
+admin's "Received" filter, the spam scorer's lookups) only touch the
+matching months, and archived months can be dropped as whole tables.
+
+``ensure_partitions`` creates the coming months ahead of time; the
+``archive_contact_submissions`` command calls it on every run. On other
+databases everything here is a no-op.
+"""
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "portal_contactsubmission"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing ``value``."""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def existing_partitions():
+    """``{month: table name}`` of the monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{PARENT_TABLE}_p"
+    months = {}
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            months[datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc)] = name
+    return months
+
+
+def create_partition(month):
+    """
+    Create the partition for ``month``. Rows that already landed in the
+    DEFAULT partition for that month are moved into it first, since
+    PostgreSQL refuses to add a partition that overlaps rows in DEFAULT.
+    """
+    qn = connection.ops.quote_name
+    name, parent, default = qn(partition_name(month)), qn(PARENT_TABLE), qn(DEFAULT_PARTITION)
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= %s AND created_at < %s)",
+            [start, end],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+            return
+        cursor.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+
+def ensure_partitions(now, months_ahead=3):
+    """Create missing partitions from ``now``'s month to ``months_ahead`` later."""
+    if not is_partitioned():
+        return []
+    existing = existing_partitions()
+    created = []
+    current = month_start(now)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            create_partition(month)
+            created.append(partition_name(month))
+    return created
+
+
+def drop_empty_partitions(before):
+    """Drop monthly partitions that end by ``before`` and hold no rows."""
+    if not is_partitioned():
+        return []
+    qn = connection.ops.quote_name
+    dropped = []
+    for month, name in sorted(existing_partitions().items()):
+        if add_months(month, 1) > before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(name)})")
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        logger.info("Dropped empty contact submission partition %s", name)
+        dropped.append(name)
+    return dropped
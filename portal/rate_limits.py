@@ -0,0 +1,183 @@
+# portal/rate_limits.py
+"""
+Cache-backed rate limiting for the public form endpoints.
+
+Each limit is a sliding-window counter: hits are counted in fixed windows
+with atomic ``cache.incr`` and the estimate is the current window plus the
+previous one weighted by how much of it still overlaps the sliding window.
+That is two cache keys per limit, no per-hit timestamps, and accurate enough
+to stop floods.
+
+Limits are keyed by client IP and by submitted email (hashed, so addresses
+never end up in cache keys) and configured per scope in PORTAL_RATE_LIMITS.
+Counters live in the PORTAL_RATE_LIMIT_CACHE cache, which must be shared
+by all workers and increment atomically (Redis or Memcached) for the limits
+to hold: the file and database caches read and rewrite the value, so
+concurrent hits are lost, and the local-memory cache counts per process.
+A system check warns (portal.W001) when the limits are on with any other
+backend. ``usage`` and the ``rate_limit_status`` command read the counters
+back without counting a hit.
+"""
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse
+
+_KEY_PREFIX = "portal:rl"
+
+# Backends whose incr() is atomic and whose counters every worker sees
+ATOMIC_SHARED_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+    "django_redis.cache.RedisCache",
+)
+
+DEFAULT_LIMITS = {
+    "newsletter": {"ip": (10, 60 * 60), "email": (3, 60 * 60)},
+    "contact": {"ip": (5, 60 * 60), "email": (3, 60 * 60)},
+}
+
+
+def client_ip(request):
+    """First X-Forwarded-For hop, else REMOTE_ADDR."""
+    xff = request.META.get("HTTP_X_FORWARDED_FOR")
+    if xff:
+        return xff.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR")
+
+
+def _cache():
+    return caches[getattr(settings, "PORTAL_RATE_LIMIT_CACHE", "default")]
+
+
+def limits_for(scope):
+    return getattr(settings, "PORTAL_RATE_LIMITS", DEFAULT_LIMITS).get(scope, {})
+
+
+def check_cache(app_configs, **kwargs):
+    """System check: the limits are only reliable on a shared, atomic cache."""
+    if not any(getattr(settings, "PORTAL_RATE_LIMITS", DEFAULT_LIMITS).values()):
+        return []
+    alias = getattr(settings, "PORTAL_RATE_LIMIT_CACHE", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    if backend in ATOMIC_SHARED_BACKENDS:
+        return []
+    return [checks.Warning(
+        f"Rate limits count in the {alias!r} cache ({backend}), which is not shared by all "
+        "workers or does not increment atomically, so the limits can be exceeded.",
+        hint="Point PORTAL_RATE_LIMIT_CACHE at a Redis or Memcached cache, "
+             "or set PORTAL_RATE_LIMITS = {} to turn the limits off.",
+        id="portal.W001",
+    )]
+
+
+def _identity(kind, value):
+    value = (value or "").strip().lower()
+    if kind == "email":
+        value = hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+    return value
+
+
+def _keys(scope, kind, value, window, now):
+    index = int(now // window)
+    base = f"{_KEY_PREFIX}:{scope}:{kind}:{_identity(kind, value)}:{window}"
+    return f"{base}:{index}", f"{base}:{index - 1}", now / window - index
+
+
+def _incr(cache, key, window):
+    # add() is a no-op when the key exists, so incr() is the only write racing
+    cache.add(key, 0, timeout=window * 2)
+    try:
+        return cache.incr(key)
+    except ValueError:  # expired between add() and incr()
+        cache.set(key, 1, timeout=window * 2)
+        return 1
+
+
+@dataclass
+class Usage:
+    scope: str
+    kind: str
+    limit: int
+    window: int
+    current: int
+    previous: int
+    elapsed: float  # fraction of the current window that has passed
+
+    @property
+    def estimated(self):
+        return self.current + self.previous * (1 - self.elapsed)
+
+    @property
+    def exceeded(self):
+        return self.estimated > self.limit
+
+    @property
+    def retry_after(self):
+        """Seconds until the estimate drops back to the limit."""
+        if not self.exceeded:
+            return 0
+        if self.current > self.limit or not self.previous:
+            return math.ceil((1 - self.elapsed) * self.window)
+        # The previous window's weight decays linearly over this window
+        needed = 1 - (self.limit - self.current) / self.previous
+        return max(1, math.ceil((needed - self.elapsed) * self.window))
+
+
+def usage(scope, kind, value, now=None):
+    """Current counters for one key, without counting a hit."""
+    limit, window = limits_for(scope)[kind]
+    current_key, previous_key, elapsed = _keys(scope, kind, value, window, now or time.time())
+    counts = _cache().get_many([current_key, previous_key])
+    return Usage(
+        scope, kind, limit, window,
+        current=counts.get(current_key, 0),
+        previous=counts.get(previous_key, 0),
+        elapsed=elapsed,
+    )
+
+
+def hit(scope, **identities):
+    """
+    Count one attempt against every configured limit of ``scope`` for the
+    given identities (e.g. ``ip=..., email=...``; empty values are skipped).
+    Returns the exceeded ``Usage`` with the longest wait, or None if allowed.
+    """
+    cache = _cache()
+    now = time.time()
+    worst = None
+    for kind, (limit, window) in limits_for(scope).items():
+        value = identities.get(kind)
+        if not value:
+            continue
+        current_key, previous_key, elapsed = _keys(scope, kind, value, window, now)
+        current = _incr(cache, current_key, window)
+        previous = cache.get(previous_key, 0)
+        result = Usage(scope, kind, limit, window, current, previous, elapsed)
+        if result.exceeded and (worst is None or result.retry_after > worst.retry_after):
+            worst = result
+    return worst
+
+
+def too_many_requests(limited):
+    """Plain 429 response for an exceeded ``Usage``."""
+    response = HttpResponse(
+        "Too many attempts. Please try again later.",
+        status=429,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Retry-After"] = str(limited.retry_after)
+    return response
+
+
+def reset(scope, kind, value):
+    """Clear the counters for one key (e.g. after a false positive)."""
+    limit, window = limits_for(scope)[kind]
+    current_key, previous_key, _ = _keys(scope, kind, value, window, time.time())
+    _cache().delete_many([current_key, previous_key])
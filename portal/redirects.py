@@ -0,0 +1,173 @@
+# portal/redirects.py
+"""
+Redirects (wagtail.contrib.redirects) served from memory.
+
+Wagtail's RedirectMiddleware queries the redirects table for every 404.
+Here the whole table is loaded once into a per-site lookup, ``{site_id or
+None: {old_path: (link, is_permanent)}}``, kept in the tiered cache's
+"redirects" namespace: invalidated on redirect save/delete and on page
+publish/unpublish/move/delete (links point at page URLs, and Wagtail
+creates redirects when pages move or change slug).
+
+A lookup tries the normalised full path, then without the query string,
+each as received and percent-decoded; the site's own redirects win over
+all-sites ones, as in Wagtail.
+
+404s that had no redirect are also remembered in a bounded per-process
+LRU (PORTAL_REDIRECTS["NEGATIVE_MAX_ENTRIES"], for NEGATIVE_TIMEOUT
+seconds), so repeated junk (``/wp-login.php``, ``/.env``) is answered with
+the 404 page before URL resolution or the page tree is touched. Only misses
+that did not resolve to a view, or resolved to Wagtail's page serving, are
+remembered; they are forgotten when redirects, pages, taxonomies or sites
+change.
+"""
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.http import Http404, HttpResponsePermanentRedirect, HttpResponseRedirect
+from django.utils.encoding import uri_to_iri
+from wagtail import views as wagtail_views
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.models import Site
+
+from .sites import site_id_for_request
+from .tiered_cache import tiered_cache
+
+NAMESPACE = "redirects"
+
+DEFAULTS = {
+    "NEGATIVE_MAX_ENTRIES": 10000,
+    "NEGATIVE_TIMEOUT": 10 * 60,
+    "NEGATIVE_MAX_PATH_LENGTH": 1024,
+}
+
+# A remembered 404 is void once any of these change
+_NEGATIVE_NAMESPACES = (NAMESPACE, "index-pages", "taxonomies", "sites")
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, "PORTAL_REDIRECTS", {})}
+
+
+# Redirect table
+
+def _load_table():
+    table = {}
+    for redirect in Redirect.objects.select_related("redirect_page"):
+        table.setdefault(redirect.site_id, {})[redirect.old_path] = (redirect.link, redirect.is_permanent)
+    return table
+
+
+def redirect_table():
+    return tiered_cache.get_or_set(NAMESPACE, "table", _load_table)
+
+
+def _variants(path):
+    yield path
+    decoded = uri_to_iri(path)
+    if decoded != path:
+        yield decoded
+
+
+def find_redirect(site, full_path):
+    """``(link, is_permanent)`` for ``full_path`` on ``site``, or None."""
+    table = redirect_table()
+    site_redirects = table.get(site.pk, {}) if site else {}
+    any_site = table.get(None, {})
+    path = Redirect.normalise_path(full_path)
+    candidates = [path]
+    path_without_query = urlparse(path).path
+    if path_without_query != path:
+        candidates.append(path_without_query)
+    for candidate in candidates:
+        for variant in _variants(candidate):
+            found = site_redirects.get(variant) or any_site.get(variant)
+            if found:
+                return found
+    return None
+
+
+# Known misses
+
+class NegativeCache:
+    """Bounded LRU of ``(site_id, path)`` known to 404 without a redirect."""
+
+    def __init__(self, **options):
+        self.options = {**_options(), **options}
+        self._entries = OrderedDict()  # (site_id, path) -> (generations, expires)
+        self._lock = threading.Lock()
+
+    def _generations(self):
+        return tuple(tiered_cache.generation(namespace) for namespace in _NEGATIVE_NAMESPACES)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[1] <= time.monotonic() or entry[0] != self._generations():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, key):
+        if len(key[1]) > self.options["NEGATIVE_MAX_PATH_LENGTH"]:
+            return
+        with self._lock:
+            self._entries[key] = (self._generations(), time.monotonic() + self.options["NEGATIVE_TIMEOUT"])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.options["NEGATIVE_MAX_ENTRIES"]:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+known_misses = NegativeCache()
+
+
+def _rememberable(request):
+    # Other views' 404s can depend on who is asking or on other tables
+    match = request.resolver_match
+    return match is None or match.func is wagtail_views.serve
+
+
+class RedirectMiddleware:
+    """Drop-in for Wagtail's RedirectMiddleware using the cached table."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        full_path = request.get_full_path()
+        key = None
+        if request.method in ("GET", "HEAD"):
+            key = (site_id_for_request(request), full_path)
+            if key in known_misses:
+                raise Http404
+
+        response = self.get_response(request)
+        if response.status_code != 404:
+            return response
+
+        if "\0" in full_path:
+            # Never stored (they crash PostgreSQL lookups)
+            return response
+        found = find_redirect(Site.find_for_request(request), full_path)
+        if found is None or found[0] is None:
+            if key is not None and _rememberable(request):
+                known_misses.add(key)
+            return response
+
+        link, is_permanent = found
+        if is_permanent:
+            return HttpResponsePermanentRedirect(link)
+        return HttpResponseRedirect(link)
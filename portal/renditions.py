@@ -0,0 +1,211 @@
+# portal/renditions.py
+"""
+Rendition pre-warming.
+
+The filter specs the portal templates ask for ({% image r.thumbnail fill-600x360 %})
+are discovered by scanning the templates, grouped by the attribute the image
+comes from (thumbnail, photo, cover_image, logo...). Publishing a page or
+saving a partner then generates the renditions of the attributes its images
+are used in, on the task worker, so page requests find them already in
+place instead of decoding the original inline. Nothing is warmed at upload
+time (usage is not known yet), nor when tasks run inline (the
+ImmediateBackend): the first page view renders them as before.
+
+{% picture %} and {% srcset_image %} specs are brace-expanded the way
+Wagtail expands them (fill-{600x360,320x192} format-{avif,webp,jpeg}), so
+every <picture> source and width is warmed in the same batch.
+"""
+import re
+import shlex
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from modelcluster.models import ClusterableModel, get_all_child_relations
+from wagtail.blocks import ListBlock, StreamBlock, StructBlock
+from wagtail.fields import StreamField
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageBlock, ImageChooserBlock
+from wagtail.images.models import Filter
+
+_IMAGE_TAG_RE = re.compile(
+    r"{%\s*(?P<tag>image|srcset_image|picture)\s+(?P<bits>[^%]*?)\s*%}"
+)
+
+
+def _template_dirs():
+    dirs = []
+    for engine in settings.TEMPLATES:
+        dirs.extend(Path(d) for d in engine.get("DIRS", []))
+    for app_label in ("portal", "search"):
+        if apps.is_installed(app_label):
+            dirs.append(Path(apps.get_app_config(app_label).path) / "templates")
+    return dirs
+
+
+@lru_cache(maxsize=None)
+def discover_filter_specs():
+    """
+    Return ``{attribute_name: (filter_spec, ...)}`` for every {% image %},
+    {% srcset_image %} and {% picture %} tag in the project/portal templates. Specs that use a template variable
+    (rather than a literal) cannot be resolved statically and are skipped.
+    """
+    found = defaultdict(set)
+    for template_dir in _template_dirs():
+        if not template_dir.is_dir():
+            continue
+        for path in template_dir.rglob("*.html"):
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            for match in _IMAGE_TAG_RE.finditer(text):
+                try:
+                    bits = shlex.split(match.group("bits"))
+                except ValueError:
+                    continue
+                if len(bits) < 2:
+                    continue
+                source, spec_bits = bits[0], []
+                # Filter specs run up to the first attribute or "as"
+                for bit in bits[1:]:
+                    if "=" in bit or bit == "as":
+                        break
+                    spec_bits.append(bit)
+                if not spec_bits or not all("-" in bit or bit == "original" for bit in spec_bits):
+                    continue
+                attribute = source.rsplit(".", 1)[-1]
+                if match.group("tag") == "image":
+                    found[attribute].add("|".join(spec_bits))
+                else:
+                    found[attribute].update(Filter.expand_spec(spec_bits))
+    return {attribute: tuple(sorted(specs)) for attribute, specs in found.items()}
+
+
+def all_filter_specs():
+    specs = set()
+    for field_specs in discover_filter_specs().values():
+        specs.update(field_specs)
+    return sorted(specs)
+
+
+def filter_specs_for(attribute):
+    return list(discover_filter_specs().get(attribute, ()))
+
+
+def generate_renditions(image_id, filter_specs):
+    """
+    Create any missing renditions for one image. ``get_renditions`` opens the
+    source file once for the whole batch; existing renditions are reused.
+    """
+    Image = get_image_model()
+    try:
+        image = Image.objects.get(pk=image_id)
+    except Image.DoesNotExist:
+        return []
+    if not filter_specs:
+        return []
+    return list(image.get_renditions(*filter_specs).keys())
+
+
+def _foreign_key_images(instance):
+    Image = get_image_model()
+    refs = []
+    for field in instance._meta.concrete_fields:
+        if field.is_relation and field.related_model is Image:
+            image_id = getattr(instance, field.attname)
+            if image_id:
+                refs.append((image_id, field.name))
+    return refs
+
+
+def _block_images(block, value, name):
+    # Named after the block the image sits in ({% image value.photo ... %})
+    if value is None:
+        return []
+    if isinstance(block, (ImageBlock, ImageChooserBlock)):
+        return [(value.pk, name)] if value.pk else []
+    if isinstance(block, StructBlock):
+        refs = []
+        for child_name, child_block in block.child_blocks.items():
+            refs.extend(_block_images(child_block, value.get(child_name), child_name))
+        return refs
+    if isinstance(block, ListBlock):
+        return [ref for item in value for ref in _block_images(block.child_block, item, name)]
+    if isinstance(block, StreamBlock):
+        return [ref for child in value for ref in _block_images(child.block, child.value, child.block_type)]
+    return []
+
+
+def image_references(instance):
+    """
+    ``[(image_id, attribute_name), ...]`` for the images a model instance
+    (page, partner snippet) shows: its own image foreign keys, image blocks
+    in its StreamFields, and the images of its child rows (orderables) and of
+    what those rows point at, such as the partners in a partner row.
+    """
+    refs = _foreign_key_images(instance)
+
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, StreamField):
+            refs.extend(_block_images(field.stream_block, getattr(instance, field.name), field.name))
+
+    if isinstance(instance, ClusterableModel):
+        # Not the parent key, nor the images already counted
+        skip = (instance._meta.model, get_image_model())
+        for relation in get_all_child_relations(instance):
+            for child in getattr(instance, relation.get_accessor_name()).all():
+                refs.extend(_foreign_key_images(child))
+                for field in child._meta.concrete_fields:
+                    if field.many_to_one and field.related_model not in skip:
+                        target = getattr(child, field.name)
+                        if target is not None:
+                            refs.extend(_foreign_key_images(target))
+    return refs
+
+
+def used_filter_specs(image_ids=None):
+    """
+    ``{image_id: {filter_spec, ...}}`` for the images used in the portal's
+    models, from the attribute each one is used as.
+    """
+    Image = get_image_model()
+    found = defaultdict(set)
+    for model in apps.get_app_config("portal").get_models():
+        for field in model._meta.concrete_fields:
+            if not (field.is_relation and field.related_model is Image):
+                continue
+            field_specs = filter_specs_for(field.name)
+            if not field_specs:
+                continue
+            qs = model._default_manager.exclude(**{field.attname: None})
+            if image_ids is not None:
+                qs = qs.filter(**{f"{field.attname}__in": image_ids})
+            for image_id in qs.values_list(field.attname, flat=True).distinct():
+                found[image_id].update(field_specs)
+    return found
+
+
+def enqueue_prewarm(image_id, filter_specs):
+    if not filter_specs or not getattr(settings, "PORTAL_PREWARM_RENDITIONS", True):
+        return
+
+    from .tasks import runs_inline
+
+    if runs_inline():
+        # Would only move the work into the editor's publish request
+        return
+
+    from .tasks import generate_renditions_task
+
+    transaction.on_commit(
+        lambda: generate_renditions_task.enqueue(image_id, list(filter_specs))
+    )
+
+
+def enqueue_prewarm_for_instance(instance):
+    specs_by_image = defaultdict(set)
+    for image_id, attribute in image_references(instance):
+        specs_by_image[image_id].update(filter_specs_for(attribute))
+    for image_id, specs in specs_by_image.items():
+        enqueue_prewarm(image_id, sorted(specs))
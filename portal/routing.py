@@ -0,0 +1,182 @@
+# portal/routing.py
+"""
+Cached URL → page routing for Wagtail's page serving.
+
+Wagtail resolves a page URL by walking the tree from the site root, one
+query per path segment (plus one to make each page specific). Here each
+resolved route is kept in the tiered cache's "routes" namespace as
+``(site_id, path) -> (page id, content type id, args, kwargs)``, so a known
+URL costs one query: the specific page itself. ``RouteCacheMiddleware``
+hands Wagtail the cached route through ``request._wagtail_route_for_request``,
+which ``Page.route_for_request`` (and so ``wagtail.views.serve``) already
+honours.
+
+The namespace is invalidated on page publish/unpublish/move/delete (a slug
+change takes effect on publish) and on Site save/delete, which covers root
+page changes (see signal_handlers.py). A cached page that is gone or no
+longer live falls back to the normal walk.
+
+Routes are not kept in the tiered cache's shared L1, so a crawl of many
+URLs can't push out the site and settings lookups: each worker has its own
+bounded LRU (PORTAL_ROUTE_CACHE["MAX_ENTRIES"]), and found routes are shared
+through L2 so only one worker walks each. URLs that match no page are
+remembered only in a separate per-process LRU (NEGATIVE_MAX_ENTRIES, for
+NEGATIVE_TIMEOUT seconds), never in the shared cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from wagtail import views as wagtail_views
+from wagtail.models import Page
+from wagtail.url_routing import RouteResult
+
+from .sites import site_id_for_request
+from .tiered_cache import tiered_cache
+
+NAMESPACE = "routes"
+_KEY_PREFIX = "portal:routes"
+_MISSING = object()
+
+# Longer paths are routed normally (and can't fill the cache with junk)
+MAX_PATH_LENGTH = 512
+
+DEFAULTS = {
+    "MAX_ENTRIES": 5000,
+    "NEGATIVE_MAX_ENTRIES": 10000,
+    "NEGATIVE_TIMEOUT": 10 * 60,
+    "L2_TIMEOUT": 60 * 60,
+}
+
+
+def _options():
+    return {**DEFAULTS, **getattr(settings, "PORTAL_ROUTE_CACHE", {})}
+
+
+def _walk(request, path):
+    """Wagtail's own routing, as (page id, content type id, args, kwargs)."""
+    result = Page.route_for_request(request, path)
+    if result is None:
+        return None
+    page, args, kwargs = result
+    return (page.pk, page.content_type_id, list(args), dict(kwargs))
+
+
+class RouteCache:
+    """
+    Per-process LRUs of ``(site_id, path)`` -> route and of paths known to
+    match no page, kept apart so misses can't push out routes.
+    """
+
+    def __init__(self, **options):
+        self.options = {**_options(), **options}
+        self._routes = OrderedDict()  # (site_id, path) -> (generation, route)
+        self._misses = OrderedDict()  # (site_id, path) -> (generation, expires)
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """The route for ``key``, None for a known miss, or ``_MISSING``."""
+        with self._lock:
+            entry = self._routes.get(key)
+            if entry is not None:
+                if entry[0] == generation:
+                    self._routes.move_to_end(key)
+                    return entry[1]
+                del self._routes[key]
+            entry = self._misses.get(key)
+            if entry is not None:
+                if entry[0] == generation and entry[1] > time.monotonic():
+                    self._misses.move_to_end(key)
+                    return None
+                del self._misses[key]
+        return _MISSING
+
+    def set(self, key, generation, route):
+        if route is None:
+            entries, limit = self._misses, self.options["NEGATIVE_MAX_ENTRIES"]
+            value = (generation, time.monotonic() + self.options["NEGATIVE_TIMEOUT"])
+        else:
+            entries, limit = self._routes, self.options["MAX_ENTRIES"]
+            value = (generation, route)
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > limit:
+                entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self._misses.clear()
+
+    def __len__(self):
+        return len(self._routes) + len(self._misses)
+
+
+route_cache = RouteCache()
+
+
+def _lookup(request, path, site_id, normalised):
+    generation = tiered_cache.generation(NAMESPACE)
+    key = (site_id, normalised)
+    route = route_cache.get(key, generation)
+    if route is not _MISSING:
+        tiered_cache.count(NAMESPACE, "l1_hit")
+        return route
+
+    shared_key = f"{_KEY_PREFIX}:{generation}:{site_id}:{normalised}"
+    route = tiered_cache.shared.get(shared_key)
+    if route is not None:
+        tiered_cache.count(NAMESPACE, "l2_hit")
+    else:
+        route = _walk(request, path)
+        tiered_cache.count(NAMESPACE, "miss")
+        if route is not None:
+            tiered_cache.shared.set(shared_key, route, route_cache.options["L2_TIMEOUT"])
+    route_cache.set(key, generation, route)
+    return route
+
+
+def cached_route(request, path):
+    """The RouteResult for ``path``, from the route cache when possible."""
+    site_id = site_id_for_request(request)
+    components = [component for component in path.split("/") if component]
+    normalised = "/".join(components)
+    if site_id is None or len(normalised) > MAX_PATH_LENGTH:
+        return Page.route_for_request(request, path)
+
+    route = _lookup(request, path, site_id, normalised)
+    if hasattr(request, "_wagtail_route_for_request"):
+        # Just walked (a cache miss)
+        return request._wagtail_route_for_request
+    if route is None:
+        # A known 404, until pages or sites change (or NEGATIVE_TIMEOUT)
+        request._wagtail_route_for_request = None
+        return None
+
+    page_id, content_type_id, args, kwargs = route
+    model = ContentType.objects.get_for_id(content_type_id).model_class()
+    page = model.objects.filter(pk=page_id).first() if model else None
+    if page is None or not page.live:
+        return Page.route_for_request(request, path)
+    result = RouteResult(page, list(args), dict(kwargs))
+    request._wagtail_route_for_request = result
+    return result
+
+
+class RouteCacheMiddleware:
+    """Routes requests for Wagtail's serve view through the route cache."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func is wagtail_views.serve and not hasattr(request, "_wagtail_route_for_request"):
+            path = view_kwargs.get("path", view_args[0] if view_args else "")
+            cached_route(request, path)
+        return None
@@ -0,0 +1,187 @@
+# portal/signal_handlers.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from wagtail.contrib.redirects.models import Redirect
+from wagtail.documents import get_document_model
+from wagtail.embeds.models import Embed
+from wagtail.images import get_image_model
+from wagtail.models import Page, Site
+from wagtail.signals import page_published, page_unpublished, post_page_move
+
+from .body_cache import touch_dependency
+from .conditional import bump
+from .db_routing import pin_primary
+from .document_processing import delete_preview_files, enqueue_processing
+from .document_storage import link_document, release_blob
+from .image_ingest import original_upload_name
+from .models import (
+    HAS_MEDIA, Audience, DocumentBlobLink, DocumentPreview, Language, Partner, PartnerRow,
+    PartnerRowItem, PortalSiteSettings, Region, Topic,
+)
+from .renditions import enqueue_prewarm_for_instance
+from .redirects import NAMESPACE as REDIRECTS
+from .routing import NAMESPACE as ROUTES
+from .single_flight import NAMESPACE as FRAGMENTS
+from .sites import clear_site_ids
+from .surrogate_keys import SITE_KEY, page_purge_keys, purge, term_purge_keys
+from .tiered_cache import invalidate
+
+
+def invalidate_document_bodies(instance, **kwargs):
+    touch_dependency("document", instance.pk)
+
+
+def link_document_blob(instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Set by PortalDocumentForm, which already hashed the upload
+    sha256 = instance.__dict__.pop("_portal_sha256", None)
+    link_document(instance, sha256=sha256)
+    enqueue_processing(instance)
+
+
+def release_document_blob(instance, **kwargs):
+    release_blob(instance.blob_id)
+
+
+def delete_document_preview_files(instance, **kwargs):
+    transaction.on_commit(lambda: delete_preview_files(instance))
+
+
+def invalidate_media_bodies(instance, **kwargs):
+    touch_dependency("media", instance.pk)
+
+
+def invalidate_embed_bodies(instance, **kwargs):
+    touch_dependency("embed", instance.url)
+
+
+def store_original_upload(instance, **kwargs):
+    # Only set by PortalImageForm when PORTAL_IMAGE_KEEP_ORIGINAL is on
+    original = instance.__dict__.pop("_portal_original_upload", None)
+    if original is None or not instance.file:
+        return
+    original.seek(0)
+    instance.file.storage.save(original_upload_name(instance.file.name), original)
+
+
+def delete_original_upload(instance, **kwargs):
+    if not instance.file:
+        return
+    name = original_upload_name(instance.file.name)
+    storage = instance.file.storage
+    transaction.on_commit(lambda: storage.exists(name) and storage.delete(name))
+
+
+def prewarm_published_page(instance, **kwargs):
+    enqueue_prewarm_for_instance(instance.specific)
+
+
+def prewarm_partner_logo(instance, raw=False, **kwargs):
+    if not raw:
+        enqueue_prewarm_for_instance(instance)
+
+
+def pin_primary_after_publish(**kwargs):
+    transaction.on_commit(pin_primary)
+
+
+def _invalidate_after_commit(*namespaces):
+    def run():
+        for namespace in namespaces:
+            invalidate(namespace)
+        # Keep the refill from reading a replica that has not replayed the change
+        pin_primary()
+
+    transaction.on_commit(run)
+
+
+def invalidate_site_settings(**kwargs):
+    _invalidate_after_commit("site-settings")
+
+
+def invalidate_page_caches(**kwargs):
+    # Nav index pages, the home summary and listing counts, URL routes, and
+    # redirect links (Wagtail adds redirects when a page moves or changes slug)
+    _invalidate_after_commit("index-pages", FRAGMENTS, ROUTES, REDIRECTS)
+
+
+def invalidate_redirects(**kwargs):
+    _invalidate_after_commit(REDIRECTS)
+
+
+def invalidate_taxonomies(**kwargs):
+    _invalidate_after_commit("taxonomies")
+
+
+# Edge purges and the conditional GET generations share the surrogate keys
+
+def _content_changed(keys):
+    purge(keys)
+    bump(keys)
+
+
+def purge_page(instance, **kwargs):
+    _content_changed(page_purge_keys(instance))
+
+
+def purge_site(**kwargs):
+    _content_changed([SITE_KEY])
+
+
+def purge_term(instance, **kwargs):
+    _content_changed(term_purge_keys(instance))
+
+
+def register_signal_handlers():
+    Document = get_document_model()
+    Image = get_image_model()
+
+    post_save.connect(invalidate_document_bodies, sender=Document)
+    post_delete.connect(invalidate_document_bodies, sender=Document)
+    post_save.connect(link_document_blob, sender=Document)
+    post_delete.connect(release_document_blob, sender=DocumentBlobLink)
+    post_delete.connect(delete_document_preview_files, sender=DocumentPreview)
+    post_save.connect(invalidate_embed_bodies, sender=Embed)
+    post_delete.connect(invalidate_embed_bodies, sender=Embed)
+
+    post_save.connect(store_original_upload, sender=Image)
+    post_delete.connect(delete_original_upload, sender=Image)
+    post_save.connect(prewarm_partner_logo, sender=Partner)
+    post_save.connect(prewarm_partner_logo, sender=PartnerRow)
+    page_published.connect(prewarm_published_page)
+    page_published.connect(pin_primary_after_publish)
+    page_unpublished.connect(pin_primary_after_publish)
+
+    post_save.connect(clear_site_ids, sender=Site)
+    post_delete.connect(clear_site_ids, sender=Site)
+    # Nav index pages and routes are cached per site id: a new root page counts
+    post_save.connect(invalidate_page_caches, sender=Site)
+    post_delete.connect(invalidate_page_caches, sender=Site)
+
+    for model in (PortalSiteSettings, Partner, PartnerRow, PartnerRowItem):
+        post_save.connect(invalidate_site_settings, sender=model)
+        post_delete.connect(invalidate_site_settings, sender=model)
+        post_save.connect(purge_site, sender=model)
+        post_delete.connect(purge_site, sender=model)
+    for signal in (page_published, page_unpublished, post_page_move):
+        signal.connect(invalidate_page_caches)
+        signal.connect(purge_page)
+    post_delete.connect(invalidate_page_caches, sender=Page)
+    post_delete.connect(purge_page, sender=Page)
+    post_save.connect(invalidate_redirects, sender=Redirect)
+    post_delete.connect(invalidate_redirects, sender=Redirect)
+    for model in (Topic, Audience, Region, Language):
+        post_save.connect(invalidate_taxonomies, sender=model)
+        post_delete.connect(invalidate_taxonomies, sender=model)
+        post_save.connect(purge_term, sender=model)
+        post_delete.connect(purge_term, sender=model)
+
+    if not HAS_MEDIA:
+        return
+
+    from wagtailmedia import get_media_model
+
+    Media = get_media_model()
+    post_save.connect(invalidate_media_bodies, sender=Media)
+    post_delete.connect(invalidate_media_bodies, sender=Media)
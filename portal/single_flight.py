@@ -0,0 +1,168 @@
+# portal/single_flight.py
+"""
+Stampede-safe caching of expensive computed values (the home page summary,
+the repository resource count).
+
+``SingleFlight.get`` keeps each value in the shared cache together with when
+it was computed, how long computing took and the generation of its
+namespace (a tiered-cache generation, so ``invalidate`` reaches every
+worker). On a lookup:
+
+* fresh value: returned. Shortly before expiry a lookup may refresh early,
+  with a probability that grows as expiry nears and with the compute time
+  (the "XFetch" rule: refresh when ``now - delta * beta * ln(rand)`` passes
+  expiry), so hot keys are usually recomputed before they ever expire.
+* expired or invalidated value: whoever takes the short lease
+  (``cache.add`` on a lock key) recomputes; everyone else keeps getting the
+  previous value meanwhile (stale-while-revalidate, for up to
+  STALE_TIMEOUT after expiry).
+* no value at all: the lease holder computes; the others poll the cache
+  for up to WAIT seconds and compute themselves only if it never appears.
+
+So after a publish one worker per key runs the queries instead of all of
+them. ``manage.py simulate_stampede`` measures this with concurrent workers.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "portal:sf"
+NAMESPACE = "fragments"
+
+DEFAULTS = {
+    "CACHE": "default",
+    "TIMEOUT": 5 * 60,
+    "STALE_TIMEOUT": 60 * 60,
+    "LEASE": 30,
+    "WAIT": 5.0,
+    "POLL": 0.05,
+    "BETA": 1.0,
+}
+
+
+# Set while a request is being handled (SurrogateKeyMiddleware) and flipped
+# when it was given a stale value, so the response is not cached at the edge
+stale_served = ContextVar("portal_single_flight_stale", default=None)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    delta: float  # seconds the computation took
+    generation: str
+
+
+def _tiered_generation(namespace):
+    from .tiered_cache import tiered_cache
+
+    return tiered_cache.generation(namespace)
+
+
+class SingleFlight:
+    def __init__(self, cache=None, generation=None, **options):
+        self.options = {**DEFAULTS, **getattr(settings, "PORTAL_SINGLE_FLIGHT", {}), **options}
+        self._cache = cache
+        self._generation = generation or _tiered_generation
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = caches[self.options["CACHE"]]
+        return self._cache
+
+    def _count(self, event):
+        with self._lock:
+            self._stats[event] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _due(self, entry, now):
+        # XFetch; 1 - random() is in (0, 1], so the log is defined and <= 0
+        jitter = -entry.delta * self.options["BETA"] * math.log(1 - random.random())
+        return now + jitter >= entry.expires_at
+
+    def _compute(self, key, compute, generation, timeout, stale_timeout):
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        entry = _Entry(value, time.time() + timeout, delta, generation)
+        self.cache.set(key, entry, timeout + stale_timeout)
+        self._count("computed")
+        return value
+
+    def get(self, key, compute, timeout=None, stale_timeout=None, namespace=NAMESPACE):
+        """Cached ``compute()`` for ``key``, recomputed by one caller at a time."""
+        timeout = self.options["TIMEOUT"] if timeout is None else timeout
+        stale_timeout = self.options["STALE_TIMEOUT"] if stale_timeout is None else stale_timeout
+        generation = self._generation(namespace)
+        cache_key = f"{_KEY_PREFIX}:{namespace}:{key}"
+
+        entry = self.cache.get(cache_key)
+        current = entry is not None and entry.generation == generation
+        if current and not self._due(entry, time.time()):
+            self._count("fresh")
+            return entry.value
+
+        lock_key = f"{cache_key}:lease"
+        token = get_random_string(12)
+        if self.cache.add(lock_key, token, self.options["LEASE"]):
+            try:
+                # The previous holder may have stored a new value since our read
+                latest = self.cache.get(cache_key)
+                newer = latest is not None and latest.generation == generation and (
+                    not current or latest.expires_at > entry.expires_at
+                )
+                if newer and time.time() < latest.expires_at:
+                    self._count("fresh")
+                    return latest.value
+                if current and time.time() < entry.expires_at:
+                    self._count("early_refresh")
+                return self._compute(cache_key, compute, generation, timeout, stale_timeout)
+            finally:
+                if self.cache.get(lock_key) == token:
+                    self.cache.delete(lock_key)
+
+        if entry is not None:
+            # Someone else is recomputing: serve what we have
+            if current and time.time() < entry.expires_at:
+                self._count("fresh")
+            else:
+                self._count("stale")
+                if stale_served.get() is not None:
+                    stale_served.set(True)
+            return entry.value
+
+        deadline = time.monotonic() + self.options["WAIT"]
+        while time.monotonic() < deadline:
+            time.sleep(self.options["POLL"])
+            entry = self.cache.get(cache_key)
+            if entry is not None and entry.generation == generation:
+                self._count("waited")
+                return entry.value
+        logger.warning("Gave up waiting for %s to be computed by another worker", cache_key)
+        self._count("wait_timeout")
+        return self._compute(cache_key, compute, generation, timeout, stale_timeout)
+
+
+single_flight = SingleFlight()
+
+
+def cached(key, compute, timeout=None):
+    return single_flight.get(key, compute, timeout=timeout)
@@ -0,0 +1,30 @@
+# portal/sites.py
+"""
+Cached id of the Wagtail Site serving each host, for hot paths (the
+newsletter POST) that only need the site id. Kept in the tiered cache
+(portal/tiered_cache.py) and invalidated in every worker whenever a Site is
+saved or deleted (see signal_handlers.py).
+"""
+from wagtail.models import Site
+
+from .tiered_cache import invalidate, tiered_cache
+
+
+def _find_site_id(request):
+    try:
+        site = Site.find_for_request(request)
+    except Exception:
+        site = None
+    return site.pk if site else None
+
+
+def site_id_for_request(request):
+    try:
+        key = f"{request.get_host()}:{request.get_port()}"
+    except Exception:
+        return None
+    return tiered_cache.get_or_set("sites", key, lambda: _find_site_id(request))
+
+
+def clear_site_ids(**kwargs):
+    invalidate("sites")
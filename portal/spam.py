@@ -0,0 +1,258 @@
+# portal/spam.py
+"""
+Spam scoring for contact form submissions.
+
+``ContactPage.serve`` only stores the submission; ``score_pending`` runs
+afterwards in a background task, scores unscored submissions in batches and
+queues the team notification and auto-reply only for those that are not
+spam. Obvious spam is marked ``Status.SPAM`` and never emailed.
+
+The score is a sum of cheap features, each looked up once per batch:
+
+* links: URLs in the subject/message, weighted by link density
+* duplicates: earlier submissions with the same normalised message
+* user agent: empty or a known HTTP library / crawler
+* velocity: earlier submissions from the same IP within the last hour
+
+Submissions scoring at least PORTAL_SPAM_THRESHOLD are spam. Weights are
+rough on purpose; ``spam_reasons`` records what contributed, and the
+``score_submissions`` command re-scores the backlog after tuning.
+"""
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_URL_RE = re.compile(r"(https?://|www\.)\S+", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+_BAD_USER_AGENT_RE = re.compile(
+    r"curl|wget|python-requests|python-urllib|aiohttp|httpx|go-http-client|"
+    r"java/|okhttp|libwww|scrapy|httpclient|headless|phantomjs|\bbot\b|spider|crawler",
+    re.IGNORECASE,
+)
+
+DUPLICATE_WINDOW = timedelta(days=30)
+VELOCITY_WINDOW = timedelta(hours=1)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def message_hash(message):
+    """Hash of the message with case and whitespace normalised away."""
+    normalised = " ".join((message or "").lower().split())
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+
+def _link_score(submission):
+    text = f"{submission.subject} {submission.message}"
+    links = len(_URL_RE.findall(text))
+    if not links:
+        return 0.0, None
+    words = max(len(_WORD_RE.findall(text)), 1)
+    density = links / words
+    score = min(0.2 * links + 4 * density, 1.5)
+    return score, f"{links} link{'s' if links != 1 else ''}"
+
+
+def _user_agent_score(submission):
+    user_agent = (submission.user_agent or "").strip()
+    if not user_agent:
+        return 0.5, "no user agent"
+    if _BAD_USER_AGENT_RE.search(user_agent):
+        return 1.0, "automated user agent"
+    return 0.0, None
+
+
+def _earlier_counts(model, field, values, keys, window):
+    """
+    For each ``(value, pk, created_at)`` in ``keys``, count the rows with the
+    same ``field`` value created in the ``window`` before it. One query.
+    """
+    if not values:
+        return {}
+    start = min(created for _, _, created in keys) - window
+    seen = defaultdict(list)
+    rows = (
+        model.objects
+        .filter(**{f"{field}__in": values}, created_at__gte=start)
+        .values_list(field, "pk", "created_at")
+        .order_by()
+    )
+    for value, pk, created in rows:
+        seen[value].append((created, pk))
+    counts = {}
+    for value, pk, created in keys:
+        counts[(value, pk)] = sum(
+            1 for other_created, other_pk in seen.get(value, ())
+            if other_pk != pk
+            and created - window <= other_created
+            and (other_created, other_pk) < (created, pk)
+        )
+    return counts
+
+
+def score_batch(submissions):
+    """Set ``spam_score``/``spam_reasons`` (and the hash) on each submission, unsaved."""
+    from .models import ContactSubmission
+
+    for s in submissions:
+        if not s.message_hash:
+            s.message_hash = message_hash(s.message)
+
+    duplicates = _earlier_counts(
+        ContactSubmission, "message_hash",
+        {s.message_hash for s in submissions},
+        [(s.message_hash, s.pk, s.created_at) for s in submissions],
+        DUPLICATE_WINDOW,
+    )
+    with_ip = [s for s in submissions if s.ip_address]
+    velocity = _earlier_counts(
+        ContactSubmission, "ip_address",
+        {s.ip_address for s in with_ip},
+        [(s.ip_address, s.pk, s.created_at) for s in with_ip],
+        VELOCITY_WINDOW,
+    )
+
+    for s in submissions:
+        parts = [_link_score(s), _user_agent_score(s)]
+        copies = duplicates.get((s.message_hash, s.pk), 0)
+        if copies:
+            parts.append((min(0.6 * copies, 1.5), f"{copies} earlier duplicate{'s' if copies != 1 else ''}"))
+        recent = velocity.get((s.ip_address, s.pk), 0)
+        if recent >= 2:
+            parts.append((min(0.3 * recent, 1.5), f"{recent} earlier from this IP in the last hour"))
+
+        s.spam_score = round(sum(score for score, _ in parts), 3)
+        s.spam_reasons = "; ".join(reason for _, reason in parts if reason)
+        s.scored_at = timezone.now()
+    return submissions
+
+
+def is_spam(submission):
+    return submission.spam_score is not None and (
+        submission.spam_score >= _setting("PORTAL_SPAM_THRESHOLD", 1.0)
+    )
+
+
+def cancel_notifications(submissions):
+    """Cancel emails still waiting in the outbox for these submissions."""
+    from .models import OutgoingEmail
+
+    return OutgoingEmail.objects.filter(
+        submission__in=submissions, status=OutgoingEmail.Status.QUEUED
+    ).update(status=OutgoingEmail.Status.CANCELLED)
+
+
+def _save_scores(submissions):
+    from .models import ContactSubmission
+
+    ContactSubmission.objects.bulk_update(
+        submissions, ["spam_score", "spam_reasons", "scored_at", "message_hash"]
+    )
+
+
+def _mark_spam(spam_ids, **fields):
+    """
+    Mark the still-NEW submissions among ``spam_ids`` as spam; returns how
+    many. The status filter keeps a triage decision made since they were
+    loaded.
+    """
+    from .models import ContactSubmission
+
+    return ContactSubmission.objects.filter(
+        pk__in=spam_ids, status=ContactSubmission.Status.NEW
+    ).update(status=ContactSubmission.Status.SPAM, **fields)
+
+
+def score_pending(limit=None):
+    """
+    Score one batch of never-scored submissions and queue the notifications
+    of those that are not spam. Returns ``(scored, spam)``.
+    """
+    from .models import ContactSubmission
+
+    with transaction.atomic():
+        submissions = list(
+            ContactSubmission.objects
+            # Only the submission rows: PostgreSQL can't lock the nullable
+            # side of the outer join to the page
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("page")
+            .filter(scored_at__isnull=True)
+            .order_by("created_at", "pk")[: limit or _setting("PORTAL_SPAM_BATCH_SIZE", 100)]
+        )
+        if not submissions:
+            return 0, 0
+
+        score_batch(submissions)
+        spam_ids = {s.pk for s in submissions if is_spam(s)}
+        _save_scores(submissions)
+        _mark_spam(spam_ids, held_at=timezone.now())
+        for s in submissions:
+            if s.pk in spam_ids:
+                logger.info("Contact submission %s marked as spam (%s)", s.pk, s.spam_reasons)
+            elif s.page is not None:
+                s.page.queue_notifications(s)
+    return len(submissions), len(spam_ids)
+
+
+def score_all_pending():
+    scored = spam = 0
+    while True:
+        batch_scored, batch_spam = score_pending()
+        if not batch_scored:
+            return scored, spam
+        scored += batch_scored
+        spam += batch_spam
+
+
+def rescore(queryset, batch_size=None):
+    """
+    Re-score already stored submissions (e.g. after tuning weights). Only
+    NEW submissions are re-classified; ones a person has triaged keep their
+    status. Returns ``(scored, newly_spam)``.
+    """
+    from .models import ContactSubmission
+
+    batch_size = batch_size or _setting("PORTAL_SPAM_BATCH_SIZE", 100)
+    scored = newly_spam = 0
+    batch = []
+
+    def flush():
+        nonlocal scored, newly_spam
+        score_batch(batch)
+        spam_ids = {
+            s.pk for s in batch
+            if s.status == ContactSubmission.Status.NEW and is_spam(s)
+        }
+        with transaction.atomic():
+            _save_scores(batch)
+            newly_spam += _mark_spam(spam_ids)
+            cancel_notifications(ContactSubmission.objects.filter(
+                pk__in=spam_ids, status=ContactSubmission.Status.SPAM
+            ))
+        scored += len(batch)
+        batch.clear()
+
+    for submission in queryset.order_by("created_at", "pk").iterator(chunk_size=batch_size):
+        batch.append(submission)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return scored, newly_spam
+
+
+def schedule_scoring():
+    from .tasks import score_submissions_task
+
+    transaction.on_commit(lambda: score_submissions_task.enqueue())
@@ -0,0 +1,188 @@
+// portal/static/portal/js/chunked_upload.js
+//
+// Sends large files picked in the Wagtail document / image / media upload
+// forms (including the chooser modals) as checksummed chunks, resuming after
+// network failures, then submits the form with the upload id instead of the
+// file body. See portal/chunked_uploads.py for the server side.
+(function () {
+  "use strict";
+
+  var script = document.currentScript;
+  if (!script || !window.fetch || !window.crypto || !window.crypto.subtle) {
+    return;
+  }
+
+  var CREATE_URL = script.dataset.chunkedUploadUrl;
+  var CHUNK_SIZE = 4 * 1024 * 1024;
+  var THRESHOLD = 8 * 1024 * 1024;
+  var MAX_RETRIES = 6;
+
+  function kindFor(form) {
+    var action = form.getAttribute("action") || window.location.pathname;
+    if (/\/images\//.test(action)) return "image";
+    if (/\/documents\//.test(action)) return "document";
+    if (/\/media\//.test(action)) return "media";
+    return null;
+  }
+
+  function csrfToken(form) {
+    var input = form.querySelector("input[name=csrfmiddlewaretoken]");
+    if (input) return input.value;
+    return (window.wagtailConfig && window.wagtailConfig.CSRF_TOKEN) || "";
+  }
+
+  function largeFileInputs(form) {
+    return Array.prototype.filter.call(
+      form.querySelectorAll("input[type=file]"),
+      function (input) {
+        var isMainFile = input.name === "file" || /-file$/.test(input.name);
+        return isMainFile && !input.disabled && input.files.length === 1 &&
+          input.files[0].size > THRESHOLD;
+      }
+    );
+  }
+
+  function sleep(ms) {
+    return new Promise(function (resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function sha256Hex(blob) {
+    var digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+    return Array.prototype.map.call(new Uint8Array(digest), function (b) {
+      return b.toString(16).padStart(2, "0");
+    }).join("");
+  }
+
+  async function call(method, url, token, body, headers) {
+    var response = await fetch(url, {
+      method: method,
+      body: body,
+      credentials: "same-origin",
+      headers: Object.assign({ "X-CSRFToken": token }, headers || {}),
+    });
+    var data = response.status === 204 ? {} : await response.json();
+    if (!response.ok) {
+      var error = new Error(data.error || response.statusText);
+      error.status = response.status;
+      throw error;
+    }
+    return data;
+  }
+
+  async function withRetries(fn) {
+    for (var attempt = 0; ; attempt++) {
+      try {
+        return await fn();
+      } catch (error) {
+        // 4xx are final (bad checksum, too large...); network errors retry
+        if ((error.status && error.status < 500) || attempt >= MAX_RETRIES) throw error;
+        await sleep(Math.min(30000, 1000 * Math.pow(2, attempt)));
+      }
+    }
+  }
+
+  function resumeKey(file, kind) {
+    return "portal-chunked:" + kind + ":" + file.name + ":" + file.size + ":" + file.lastModified;
+  }
+
+  async function openSession(file, kind, token) {
+    var key = resumeKey(file, kind);
+    var existing = window.localStorage.getItem(key);
+    if (existing) {
+      try {
+        return await call("GET", CREATE_URL + existing + "/", token);
+      } catch (error) {
+        window.localStorage.removeItem(key);
+      }
+    }
+    var body = new FormData();
+    body.append("filename", file.name);
+    body.append("size", file.size);
+    body.append("chunk_size", CHUNK_SIZE);
+    body.append("kind", kind);
+    var session = await withRetries(function () { return call("POST", CREATE_URL, token, body); });
+    window.localStorage.setItem(key, session.id);
+    return session;
+  }
+
+  async function upload(file, kind, token, progress) {
+    var session = await openSession(file, kind, token);
+    var base = CREATE_URL + session.id + "/";
+    var received = new Set(session.received);
+
+    if (!session.complete) {
+      for (var index = 0; index < session.total_chunks; index++) {
+        if (received.has(index)) continue;
+        var chunk = file.slice(index * session.chunk_size, (index + 1) * session.chunk_size);
+        var checksum = await sha256Hex(chunk);
+        await withRetries(function () {
+          return call("PUT", base + "chunks/" + index + "/", token, chunk, {
+            "X-Chunk-SHA256": checksum,
+            "Content-Type": "application/octet-stream",
+          });
+        });
+        received.add(index);
+        progress(received.size / session.total_chunks);
+      }
+      session = await withRetries(function () { return call("POST", base + "complete/", token); });
+    }
+    window.localStorage.removeItem(resumeKey(file, kind));
+    return session.id;
+  }
+
+  function statusLine(input) {
+    var line = input.parentNode.querySelector(".portal-chunked-status");
+    if (!line) {
+      line = document.createElement("p");
+      line.className = "portal-chunked-status help";
+      input.parentNode.appendChild(line);
+    }
+    return line;
+  }
+
+  document.addEventListener("submit", async function (event) {
+    var form = event.target;
+    if (form.dataset.chunkedReady === "1") {
+      delete form.dataset.chunkedReady;
+      return;
+    }
+    var kind = kindFor(form);
+    var inputs = kind ? largeFileInputs(form) : [];
+    if (!inputs.length || !CREATE_URL) return;
+
+    // Hold the form back (including Wagtail's modal handlers) until uploaded
+    event.preventDefault();
+    event.stopImmediatePropagation();
+
+    var token = csrfToken(form);
+    try {
+      for (var i = 0; i < inputs.length; i++) {
+        var input = inputs[i];
+        var line = statusLine(input);
+        var uploadId = await upload(input.files[0], kind, token, function (fraction) {
+          line.textContent = "Uploading… " + Math.round(fraction * 100) + "%";
+        });
+        line.textContent = "Upload complete.";
+
+        var hidden = document.createElement("input");
+        hidden.type = "hidden";
+        hidden.name = input.name + "-chunked";
+        hidden.value = uploadId;
+        form.appendChild(hidden);
+        input.disabled = true;
+      }
+    } catch (error) {
+      inputs.forEach(function (input) {
+        statusLine(input).textContent = "Upload failed: " + error.message + ". Submit again to resume.";
+      });
+      return;
+    }
+
+    form.dataset.chunkedReady = "1";
+    if (form.requestSubmit) {
+      form.requestSubmit();
+    } else {
+      form.submit();
+    }
+  }, true);
+})();
@@ -0,0 +1,196 @@
+# portal/subscriber_csv.py
+"""
+Streaming CSV import/export of newsletter subscribers.
+
+Export walks the table with ``QuerySet.iterator`` (a server-side cursor on
+PostgreSQL) over plain value tuples and yields one CSV line at a time, so it
+can feed a StreamingHttpResponse or a file without holding the list.
+
+Import reads rows one at a time, validates and normalises them (emails get
+the same strip/lowercase as ``NewsletterSubscriber.save``) and writes them in
+batches with ``bulk_create(update_conflicts=True)``, i.e. INSERT ... ON
+CONFLICT (email) DO UPDATE. Only the current batch is kept in memory.
+
+An existing address only gets the columns the CSV actually has, so a file
+of bare emails never resets names or statuses, and an address that
+unsubscribed stays unsubscribed unless the import is told to resubscribe.
+"""
+import csv
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import NewsletterSubscriber
+
+EXPORT_FIELDS = [
+    "email", "full_name", "status", "source", "site_id",
+    "subscribed_at", "unsubscribed_at", "notes",
+]
+# Fields an import may update on an existing address, by the CSV column that
+# sets them; subscribed_at and source keep describing the original signup
+UPDATE_COLUMNS = {
+    "full_name": ["full_name"],
+    "status": ["status", "unsubscribed_at"],
+    "site_id": ["site_id"],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+
+
+class _Echo:
+    """File-like object whose write() just returns the line (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def _format(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield CSV lines (header first) for ``queryset`` (default: all subscribers)."""
+    if queryset is None:
+        queryset = NewsletterSubscriber.objects.all()
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    rows = queryset.order_by("pk").values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow([_format(value) for value in row])
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    written: int = 0
+    invalid: int = 0
+    kept_unsubscribed: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+
+def _parse_datetime(value, column):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValidationError(f"{column} is not a valid date/time")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def clean_row(row, default_source="import"):
+    """Validate one CSV row (a dict); returns an unsaved NewsletterSubscriber."""
+    email = NewsletterSubscriber.normalise_email(row.get("email"))
+    if not email:
+        raise ValidationError("email is missing")
+    validate_email(email)
+
+    status = (row.get("status") or NewsletterSubscriber.Status.SUBSCRIBED).strip().lower()
+    if status not in NewsletterSubscriber.Status.values:
+        raise ValidationError(f"unknown status {status!r}")
+
+    site_id = (row.get("site_id") or "").strip()
+    if site_id and not site_id.isdigit():
+        raise ValidationError("site_id must be a number")
+
+    subscribed_at = _parse_datetime((row.get("subscribed_at") or "").strip(), "subscribed_at")
+    unsubscribed_at = _parse_datetime((row.get("unsubscribed_at") or "").strip(), "unsubscribed_at")
+    if status == NewsletterSubscriber.Status.UNSUBSCRIBED and unsubscribed_at is None:
+        unsubscribed_at = timezone.now()
+
+    return NewsletterSubscriber(
+        email=email,
+        full_name=(row.get("full_name") or "").strip()[:120],
+        status=status,
+        source=((row.get("source") or "").strip() or default_source)[:50],
+        site_id=int(site_id) if site_id else None,
+        subscribed_at=subscribed_at or timezone.now(),
+        unsubscribed_at=unsubscribed_at if status == NewsletterSubscriber.Status.UNSUBSCRIBED else None,
+        notes=(row.get("notes") or "").strip(),
+    )
+
+
+def update_fields_for(columns):
+    """The fields an import with these CSV ``columns`` updates on existing addresses."""
+    return [name for column, names in UPDATE_COLUMNS.items() if column in columns for name in names]
+
+
+def _keep_unsubscribed(batch):
+    """
+    Leave addresses that unsubscribed as they are, whatever status their row
+    asks for. Returns how many rows were changed back.
+    """
+    Status = NewsletterSubscriber.Status
+    wanted = [email for email, subscriber in batch.items() if subscriber.status != Status.UNSUBSCRIBED]
+    kept = NewsletterSubscriber.objects.filter(email__in=wanted, status=Status.UNSUBSCRIBED)
+    count = 0
+    for email, unsubscribed_at in kept.values_list("email", "unsubscribed_at"):
+        batch[email].status = Status.UNSUBSCRIBED
+        batch[email].unsubscribed_at = unsubscribed_at
+        count += 1
+    return count
+
+
+def _write(batch, update_fields, resubscribe, dry_run, result):
+    if "status" in update_fields and not resubscribe:
+        result.kept_unsubscribed += _keep_unsubscribed(batch)
+    objs = list(batch.values())
+    if dry_run:
+        return len(objs)
+    if update_fields:
+        NewsletterSubscriber.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=["email"],
+            update_fields=update_fields,
+        )
+    else:
+        NewsletterSubscriber.objects.bulk_create(objs, ignore_conflicts=True)
+    return len(objs)
+
+
+def import_rows(text_stream, update_existing=True, batch_size=DEFAULT_BATCH_SIZE, dry_run=False,
+                default_source="import", resubscribe=False):
+    """
+    Import subscribers from a CSV text stream with at least an ``email``
+    column. Later rows for the same address win within a batch. With
+    ``update_existing``, addresses already present get the name, status and
+    site columns the CSV has (unsubscribed ones are only resubscribed with
+    ``resubscribe``); without it they are left untouched.
+    """
+    reader = csv.DictReader(text_stream)
+    if not reader.fieldnames or "email" not in [f.strip().lower() for f in reader.fieldnames]:
+        raise ValidationError("The CSV needs a header row with an 'email' column.")
+    reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+    update_fields = update_fields_for(reader.fieldnames) if update_existing else []
+
+    result = ImportResult()
+    batch = {}
+    for row in reader:
+        result.rows += 1
+        try:
+            subscriber = clean_row(row, default_source)
+        except ValidationError as exc:
+            result.error(reader.line_num, "; ".join(exc.messages))
+            continue
+        batch[subscriber.email] = subscriber
+        if len(batch) >= batch_size:
+            result.written += _write(batch, update_fields, resubscribe, dry_run, result)
+            batch = {}
+    if batch:
+        result.written += _write(batch, update_fields, resubscribe, dry_run, result)
+    return result
@@ -0,0 +1,220 @@
+# portal/surrogate_keys.py
+"""
+Surrogate keys for the edge cache in front of the portal.
+
+Every page response lists the keys of what was rendered into it, in a
+``Surrogate-Key`` header (space separated; Fastly, Varnish xkey) and a
+``Cache-Tag`` header (comma separated; Cloudflare):
+
+* ``p<id>``: the page served, and the nav index pages in the header/footer
+* ``t:<app>.<model>``: the page types a listing page lists (home,
+  repository, experts...), plus the taxonomy types listings filter by
+* ``<taxonomy>:<id>``: the topics/audiences/regions/languages of a detail page
+* ``site``: site-wide parts (site settings, footer partner row)
+
+When content changes, exactly the affected keys are purged:
+
+* page publish/unpublish/move/delete: ``p<id>`` and ``t:<its type>``: the
+  page itself and every listing that shows that type, not its siblings
+* taxonomy term saved/deleted: ``<taxonomy>:<id>`` and ``t:<taxonomy>``
+* site settings, partner or partner row saved: ``site``
+
+Purges are collected per request (or sent per transaction outside
+requests), deduplicated, and only after the transaction commits. They run
+in a background task that POSTs them to PORTAL_EDGE_PURGE["URL"] in batches
+of BATCH_SIZE keys, one ``Surrogate-Key`` header per request. With the
+ImmediateBackend the task would run in the request, so purges are skipped
+(and logged) unless PORTAL_EDGE_PURGE["INLINE"] is set.
+``manage.py edge_cache_proxy`` is a local caching proxy that honours these
+headers, as a stand-in for the real one.
+
+Responses rendered with a stale single-flight value (portal/single_flight.py)
+get ``Surrogate-Control: no-store``, so the edge does not keep them after a
+purge.
+"""
+import logging
+import urllib.error
+import urllib.request
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+
+from .single_flight import stale_served
+from .tiered_cache import tiered_cache
+
+logger = logging.getLogger(__name__)
+
+SITE_KEY = "site"
+
+TAXONOMY_FIELDS = ("topics", "audiences", "regions", "languages")
+TAXONOMY_MODELS = ("portal.topic", "portal.audience", "portal.region", "portal.language")
+
+# Listing pages → page types they render
+LISTINGS = {
+    "portal.homepage": ("portal.resourcepage", "portal.webinarpage", "portal.expertpage", "portal.testimonialpage"),
+    "portal.repositoryindexpage": ("portal.resourcepage", *TAXONOMY_MODELS),
+    "portal.expertindexpage": ("portal.expertpage", *TAXONOMY_MODELS),
+    "portal.webinarindexpage": ("portal.webinarpage", *TAXONOMY_MODELS),
+    "portal.trainingindexpage": ("portal.trainingpage", *TAXONOMY_MODELS),
+    "portal.testimonialindexpage": ("portal.testimonialpage", *TAXONOMY_MODELS),
+}
+
+HEADER_SEPARATORS = {"Surrogate-Key": " ", "Cache-Tag": ","}
+
+DEFAULT_PURGE = {
+    "URL": None,
+    "METHOD": "POST",
+    "KEY_HEADER": "Surrogate-Key",
+    "HEADERS": {},
+    "BATCH_SIZE": 256,
+    "TIMEOUT": 5,
+    # None: only when tasks run on a worker, not inline in the request
+    "INLINE": None,
+}
+
+
+def page_key(page):
+    return f"p{page.pk}"
+
+
+def type_key(label):
+    return f"t:{label}"
+
+
+def term_key(instance):
+    return f"{instance._meta.model_name}:{instance.pk}"
+
+
+# Tagging responses
+
+def add_keys(request, keys):
+    if not hasattr(request, "surrogate_keys"):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(keys)
+
+
+def _term_keys(page, fields):
+    keys = []
+    for field in fields:
+        related = getattr(page, field)
+        keys.extend(f"{related.model._meta.model_name}:{pk}" for pk in related.values_list("pk", flat=True))
+    return keys
+
+
+def page_keys(page):
+    """Keys for serving ``page`` (specific): itself, the types it lists, its taxonomy terms."""
+    keys = {page_key(page)}
+    keys.update(type_key(listed) for listed in LISTINGS.get(page._meta.label_lower, ()))
+    fields = [field for field in TAXONOMY_FIELDS if hasattr(page, field)]
+    if fields:
+        # A live page's terms change only when it is published (a new
+        # last_published_at) or a term is saved/deleted (a new "taxonomies"
+        # generation), so detail pages don't query them on every render
+        published = page.last_published_at.timestamp() if page.last_published_at else 0
+        keys.update(tiered_cache.get_or_set(
+            "taxonomies", f"page-terms:{page.pk}:{published!r}", lambda: _term_keys(page, fields),
+        ))
+    return keys
+
+
+def _header_names():
+    return getattr(settings, "PORTAL_SURROGATE_KEY_HEADERS", list(HEADER_SEPARATORS))
+
+
+# Purging
+
+def _purge_settings():
+    return {**DEFAULT_PURGE, **getattr(settings, "PORTAL_EDGE_PURGE", {})}
+
+
+_request_purges = ContextVar("portal_surrogate_purges", default=None)
+
+
+def purge(keys):
+    """Purge ``keys`` from the edge once the current transaction commits."""
+    keys = set(keys)
+    if not keys or not _purge_settings()["URL"]:
+        return
+    collected = _request_purges.get()
+    if collected is not None:
+        # Sent together when the request finishes
+        transaction.on_commit(lambda: collected.update(keys))
+    else:
+        transaction.on_commit(lambda: _enqueue(keys))
+
+
+def page_purge_keys(page):
+    model = page.specific_class or type(page)
+    return {page_key(page), type_key(model._meta.label_lower)}
+
+
+def term_purge_keys(instance):
+    return {term_key(instance), type_key(instance._meta.label_lower)}
+
+
+def _enqueue(keys):
+    from .tasks import purge_surrogate_keys_task, runs_inline
+
+    inline = _purge_settings()["INLINE"]
+    if inline is None:
+        inline = not runs_inline()
+    if not inline:
+        # Up to TIMEOUT seconds per batch inside the request; the edge keeps
+        # these until they expire
+        logger.warning("Edge purge of %d keys skipped: tasks run inline", len(keys))
+        return
+    purge_surrogate_keys_task.enqueue(sorted(keys))
+
+
+def send_purge(keys):
+    """POST the purge requests now. Returns the number of keys purged."""
+    options = _purge_settings()
+    keys = sorted(set(keys))
+    purged = 0
+    for start in range(0, len(keys), options["BATCH_SIZE"]):
+        batch = keys[start:start + options["BATCH_SIZE"]]
+        request = urllib.request.Request(
+            options["URL"],
+            method=options["METHOD"],
+            headers={**options["HEADERS"], options["KEY_HEADER"]: " ".join(batch)},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=options["TIMEOUT"]) as response:
+                response.read()
+        except (urllib.error.URLError, OSError) as exc:
+            logger.error("Edge purge of %d keys failed: %s", len(batch), exc)
+            continue
+        purged += len(batch)
+    return purged
+
+
+class SurrogateKeyMiddleware:
+    """Adds the surrogate key headers and sends the request's purges at the end."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collected = set()
+        token = _request_purges.set(collected)
+        stale_token = stale_served.set(False)
+        try:
+            response = self.get_response(request)
+            stale = stale_served.get()
+        finally:
+            _request_purges.reset(token)
+            stale_served.reset(stale_token)
+        if collected:
+            _enqueue(collected)
+
+        keys = getattr(request, "surrogate_keys", None)
+        if keys and request.method in ("GET", "HEAD"):
+            ordered = sorted(keys)
+            for header in _header_names():
+                if header not in response:
+                    response[header] = HEADER_SEPARATORS.get(header, " ").join(ordered)
+            if stale:
+                # Rendered from a value being recomputed: don't let the edge keep it
+                response["Surrogate-Control"] = "no-store"
+        return response
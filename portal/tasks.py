@@ -0,0 +1,55 @@
+# portal/tasks.py
+from django_tasks import DEFAULT_TASK_BACKEND_ALIAS, task, tasks
+from django_tasks.backends.immediate import ImmediateBackend
+
+
+def runs_inline():
+    """True when tasks run in the request that enqueues them (ImmediateBackend)."""
+    # Not default_task_backend: that is a proxy, never an ImmediateBackend instance
+    return isinstance(tasks[DEFAULT_TASK_BACKEND_ALIAS], ImmediateBackend)
+
+
+@task()
+def generate_renditions_task(image_id, filter_specs):
+    from .renditions import generate_renditions
+
+    generate_renditions(image_id, filter_specs)
+
+
+@task()
+def process_document_task(document_id):
+    from .document_processing import process_document
+
+    process_document(document_id)
+
+
+@task()
+def send_outbox_task():
+    from .outbox import send_due
+
+    send_due()
+
+
+@task()
+def index_subscriber_task(subscriber_id):
+    from wagtail.search import index
+
+    from .models import NewsletterSubscriber
+
+    subscriber = NewsletterSubscriber.objects.filter(pk=subscriber_id).first()
+    if subscriber is not None:
+        index.insert_or_update_object(subscriber)
+
+
+@task()
+def score_submissions_task():
+    from .spam import score_all_pending
+
+    score_all_pending()
+
+
+@task()
+def purge_surrogate_keys_task(keys):
+    from .surrogate_keys import send_purge
+
+    send_purge(keys)
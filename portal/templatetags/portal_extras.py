@@ -19,3 +19,40 @@ def kind_badge(kind: str) -> str:
     if not kind:
         return "bg-slate-200 text-slate-800 dark:bg-slate-700 dark:text-slate-100"
     return _BADGES.get(kind, "bg-slate-200 text-slate-800 dark:bg-slate-700 dark:text-slate-100")
+
+
+@register.simple_tag(takes_context=True)
+def cached_body(context, page, field_name="body"):
+    """
+    Render a page StreamField (with block wrappers, like {% include_block %}),
+    reusing the cached HTML for the current revision and host.
+    """
+    from portal.body_cache import render_cached_stream
+
+    return render_cached_stream(page, field_name, context.flatten())
+
+
+@register.filter
+def document_preview(document):
+    """The ready DocumentPreview (page count, preview image) for a document, or None."""
+    from portal.document_processing import document_preview as _document_preview
+
+    return _document_preview(document)
+
+
+@register.filter
+def document_preview_url(document):
+    from portal.document_processing import preview_image_url
+
+    return preview_image_url(document)
+
+
+@register.filter
+def document_viewer_url(document):
+    """Linearised PDF when available, else the document itself."""
+    from portal.document_processing import document_preview as _document_preview, web_pdf_url
+
+    preview = _document_preview(document)
+    if preview and preview.web_pdf:
+        return web_pdf_url(document)
+    return document.url
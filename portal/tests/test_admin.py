@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from portal.models import ContactSubmission
+
+
+class ContactSubmissionChangelistTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.org", "password")
+        self.client.force_login(user)
+        self.url = reverse("admin:portal_contactsubmission_changelist")
+
+        old = ContactSubmission.objects.create(
+            name="Old", email="old@example.org", subject="Untriaged for a year", message="Hello",
+        )
+        ContactSubmission.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        ContactSubmission.objects.create(
+            name="Recent", email="recent@example.org", subject="Sent this week", message="Hello",
+        )
+
+    def test_default_shows_old_submissions(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "Untriaged for a year")
+        self.assertContains(response, "Sent this week")
+
+    def test_period_narrows_the_list(self):
+        response = self.client.get(self.url, {"received": "90"})
+        self.assertNotContains(response, "Untriaged for a year")
+        self.assertContains(response, "Sent this week")
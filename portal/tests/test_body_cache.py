@@ -0,0 +1,77 @@
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+from wagtail.documents import get_document_model
+from wagtail.models import Page
+
+from portal.body_cache import (
+    _fingerprint, dependency_key, render_cached_stream, stream_dependencies, touch_dependency,
+)
+from portal.models import ResourcePage
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+
+
+class FingerprintTests(TestCase):
+    def setUp(self):
+        self.keys = [dependency_key("document", "901"), dependency_key("media", "902")]
+        cache.delete_many(self.keys)
+
+    def test_touch_changes_the_fingerprint(self):
+        before = _fingerprint(self.keys)
+        self.assertEqual(_fingerprint(self.keys), before)
+        touch_dependency("document", "901")
+        self.assertNotEqual(_fingerprint(self.keys), before)
+
+    def test_culled_token_is_not_reseeded_with_an_old_value(self):
+        first = _fingerprint(self.keys)
+        touch_dependency("document", "901")
+        bumped = _fingerprint(self.keys)
+        # Evicted by the cache: the next fingerprint matches neither
+        cache.delete(self.keys[0])
+        reseeded = _fingerprint(self.keys)
+        self.assertNotIn(reseeded, (first, bumped))
+        self.assertEqual(_fingerprint(self.keys), reseeded)
+
+
+@override_settings(TASKS=DUMMY_TASKS)
+class RenderCachedStreamTests(TestCase):
+    def setUp(self):
+        Document = get_document_model()
+        self.document = Document.objects.create(title="Guide", file=ContentFile(b"%PDF-1.4 v1", name="guide-v1.pdf"))
+        cache.delete(dependency_key("document", self.document.pk))
+        body = [
+            {"type": "notes", "value": f'<p>Read <a linktype="document" id="{self.document.pk}">the guide</a></p>'},
+            {"type": "external_link", "value": "https://example.org/"},
+        ]
+        self.page = Page.objects.get(depth=1).add_child(instance=ResourcePage(
+            title="Body cache", slug="body-cache", kind=ResourcePage.Kind.DOCUMENT, date=date(2025, 1, 1),
+            body=json.dumps(body),
+        ))
+        self.page.save_revision().publish()
+        self.page.refresh_from_db()
+
+    def render(self):
+        return render_cached_stream(self.page, "body", {"request": RequestFactory().get("/")})
+
+    def test_rich_text_document_links_are_dependencies(self):
+        self.assertEqual(stream_dependencies(self.page.body), [dependency_key("document", str(self.document.pk))])
+
+    def test_replacing_a_linked_document_rerenders(self):
+        old_url = self.document.url
+        self.assertIn(old_url, self.render())
+
+        self.document.file.save("guide-v2.pdf", ContentFile(b"%PDF-1.4 v2"), save=False)
+        self.document.save()
+
+        html = self.render()
+        self.assertIn(self.document.url, html)
+        self.assertNotIn(old_url, html)
+
+    def test_unchanged_body_is_served_from_the_cache(self):
+        first = self.render()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), first)
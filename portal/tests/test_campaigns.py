@@ -0,0 +1,131 @@
+from datetime import timedelta
+
+from unittest import mock
+
+from django.core import mail
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from portal.campaigns import CampaignLocked, CampaignSender, is_locked, unsubscribe_token, unsubscribe_url
+from portal.models import CampaignDelivery, NewsletterCampaign, NewsletterSubscriber
+
+
+@override_settings(PORTAL_CAMPAIGN_RATE=0, PORTAL_CAMPAIGN_LEASE=600)
+class CampaignSenderTests(TestCase):
+    def setUp(self):
+        self.campaign = NewsletterCampaign.objects.create(subject="Issue 1", body="<p>News</p>")
+        NewsletterSubscriber.objects.bulk_create([
+            NewsletterSubscriber(email="plain@example.org"),
+            NewsletterSubscriber(email="comma@example.org", full_name="Doe, Jane"),
+            NewsletterSubscriber(
+                email="gone@example.org", status=NewsletterSubscriber.Status.UNSUBSCRIBED,
+            ),
+        ])
+
+    def test_sends_to_subscribed_and_releases_the_lease(self):
+        stats = CampaignSender(self.campaign).send()
+
+        self.assertEqual((stats["sent"], stats["failed"]), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [
+            '"Doe, Jane" <comma@example.org>',
+            "plain@example.org",
+        ])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, NewsletterCampaign.Status.SENT)
+        self.assertEqual(self.campaign.sent_count, 2)
+        self.assertIsNone(self.campaign.lease_until)
+        self.assertFalse(is_locked(self.campaign))
+
+    def test_second_sender_is_refused_while_leased(self):
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            status=NewsletterCampaign.Status.SENDING,
+            lease_until=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertTrue(is_locked(self.campaign))
+
+        with self.assertRaises(CampaignLocked):
+            CampaignSender(self.campaign).send()
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(CampaignDelivery.objects.exists())
+
+    def test_expired_lease_is_taken_over(self):
+        NewsletterCampaign.objects.filter(pk=self.campaign.pk).update(
+            status=NewsletterCampaign.Status.SENDING,
+            lease_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.campaign.refresh_from_db()
+
+        stats = CampaignSender(self.campaign).send()
+        self.assertEqual(stats["sent"], 2)
+        self.campaign.refresh_from_db()
+        self.assertIsNone(self.campaign.lease_until)
+
+    def test_resumes_after_recorded_deliveries(self):
+        subscriber = NewsletterSubscriber.objects.get(email="plain@example.org")
+        CampaignDelivery.objects.create(
+            campaign=self.campaign, subscriber=subscriber, status=CampaignDelivery.Status.SENT,
+        )
+
+        stats = CampaignSender(self.campaign).send()
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual([m.to[0] for m in mail.outbox], ['"Doe, Jane" <comma@example.org>'])
+
+    def test_messages_carry_an_unsubscribe_link(self):
+        CampaignSender(self.campaign).send()
+
+        subscriber = NewsletterSubscriber.objects.get(email="plain@example.org")
+        url = unsubscribe_url(subscriber.pk)
+        self.assertTrue(url.startswith("http"))
+        message = next(m for m in mail.outbox if m.to == ["plain@example.org"])
+        self.assertEqual(message.extra_headers["List-Unsubscribe"], f"<{url}>")
+        self.assertEqual(message.extra_headers["List-Unsubscribe-Post"], "List-Unsubscribe=One-Click")
+        self.assertIn(url, message.body)
+        self.assertIn(url, message.alternatives[0][0])
+
+    def test_unsubscribed_mid_send_is_skipped(self):
+        comma = NewsletterSubscriber.objects.get(email="comma@example.org")
+        send_one = CampaignSender._send_one
+
+        def unsubscribe_then_send(sender, *args):
+            NewsletterSubscriber.unsubscribe(comma.pk)
+            return send_one(sender, *args)
+
+        with mock.patch.object(CampaignSender, "_send_one", unsubscribe_then_send):
+            stats = CampaignSender(self.campaign, batch_size=1).send()
+
+        self.assertEqual(stats["sent"], 1)
+        self.assertEqual([m.to[0] for m in mail.outbox], ["plain@example.org"])
+
+
+class UnsubscribeTests(TestCase):
+    def setUp(self):
+        self.subscriber = NewsletterSubscriber.objects.create(email="reader@example.org")
+        self.url = reverse("newsletter_unsubscribe", args=[unsubscribe_token(self.subscriber.pk)])
+
+    def status(self):
+        self.subscriber.refresh_from_db()
+        return self.subscriber.status
+
+    def test_link_asks_before_unsubscribing(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "reader@example.org")
+        self.assertEqual(self.status(), NewsletterSubscriber.Status.SUBSCRIBED)
+
+        self.client.post(self.url)
+        self.assertEqual(self.status(), NewsletterSubscriber.Status.UNSUBSCRIBED)
+        self.assertIsNotNone(self.subscriber.unsubscribed_at)
+
+    def test_one_click_post_needs_no_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(self.url, {"List-Unsubscribe": "One-Click"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.status(), NewsletterSubscriber.Status.UNSUBSCRIBED)
+
+    def test_forged_token_is_refused(self):
+        other = NewsletterSubscriber.objects.create(email="other@example.org")
+        token = unsubscribe_token(self.subscriber.pk).replace(str(self.subscriber.pk), str(other.pk), 1)
+        response = self.client.post(reverse("newsletter_unsubscribe", args=[token]))
+        self.assertEqual(response.status_code, 404)
+        other.refresh_from_db()
+        self.assertEqual(other.status, NewsletterSubscriber.Status.SUBSCRIBED)
@@ -0,0 +1,121 @@
+import hashlib
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from wagtail.documents import get_document_model
+from wagtail.models import Collection, GroupCollectionPermission
+
+from portal import chunked_uploads
+
+CONTENT = b"%PDF-1.4 chunked upload"
+CHUNK = 8
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        settings = override_settings(PORTAL_CHUNKED_UPLOAD_DIR=upload_dir, PORTAL_CHUNKED_UPLOAD_MIN_CHUNK=1)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_superuser("admin", "admin@example.org", "password")
+        self.client.force_login(self.user)
+
+    def editor(self, *codenames):
+        group = Group.objects.create(name="Chunked upload editors")
+        group.permissions.add(Permission.objects.get(codename="access_admin"))
+        for permission in Permission.objects.filter(codename__in=codenames):
+            GroupCollectionPermission.objects.create(
+                group=group, collection=Collection.get_first_root_node(), permission=permission,
+            )
+        user = get_user_model().objects.create_user("editor", "editor@example.org", "password")
+        user.groups.add(group)
+        return user
+
+    def create(self, kind="document"):
+        return self.client.post(reverse("portal_chunked_upload_create"), {
+            "filename": "report.pdf", "size": len(CONTENT), "chunk_size": CHUNK, "kind": kind,
+        })
+
+    def put_chunk(self, upload_id, index, data=None, checksum=None):
+        data = CONTENT[index * CHUNK:(index + 1) * CHUNK] if data is None else data
+        return self.client.put(
+            reverse("portal_chunked_upload_chunk", args=[upload_id, index]),
+            data, content_type="application/octet-stream",
+            headers={"X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest()},
+        )
+
+    def upload(self):
+        upload_id = self.create().json()["id"]
+        for index in range(3):
+            self.assertEqual(self.put_chunk(upload_id, index).status_code, 200)
+        response = self.client.post(reverse("portal_chunked_upload_complete", args=[upload_id]))
+        self.assertEqual(response.json()["sha256"], hashlib.sha256(CONTENT).hexdigest())
+        return upload_id
+
+    def test_upload_resumes_from_the_received_chunks(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        upload = response.json()
+        self.assertEqual((upload["total_chunks"], upload["received"]), (3, []))
+
+        self.put_chunk(upload["id"], 2)
+        status = self.client.get(reverse("portal_chunked_upload_status", args=[upload["id"]])).json()
+        self.assertEqual(status["received"], [2])
+
+        response = self.client.post(reverse("portal_chunked_upload_complete", args=[upload["id"]]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunk_with_a_bad_checksum_is_not_kept(self):
+        upload_id = self.create().json()["id"]
+        response = self.put_chunk(upload_id, 0, checksum="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        status = self.client.get(reverse("portal_chunked_upload_status", args=[upload_id])).json()
+        self.assertEqual(status["received"], [])
+
+    def test_completed_upload_is_saved_by_the_document_form(self):
+        upload_id = self.upload()
+        response = self.client.post(reverse("wagtaildocs:add"), {
+            "title": "Chunked report", "file-chunked": upload_id, "collection": 1,
+        })
+        self.assertEqual(response.status_code, 302)
+        document = get_document_model().objects.get(title="Chunked report")
+        with document.open_file() as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_handle_is_closed_when_the_form_is_invalid(self):
+        upload_id = self.upload()
+        opened = []
+        original = chunked_uploads.open_completed
+
+        def open_completed(*args):
+            opened.append(original(*args))
+            return opened[-1]
+
+        with mock.patch("portal.chunked_uploads.open_completed", open_completed):
+            response = self.client.post(reverse("wagtaildocs:add"), {"title": "", "file-chunked": upload_id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+    def test_kind_needs_the_add_permission(self):
+        self.client.force_login(self.editor("add_image"))
+        self.assertEqual(self.create("document").status_code, 403)
+        self.assertEqual(self.create("image").status_code, 201)
+
+    def test_revoked_permission_stops_the_upload(self):
+        editor = self.editor("add_document")
+        self.client.force_login(editor)
+        upload_id = self.create().json()["id"]
+        self.assertEqual(self.put_chunk(upload_id, 0).status_code, 200)
+
+        editor.groups.clear()
+        editor.user_permissions.add(Permission.objects.get(codename="access_admin"))
+        self.assertEqual(self.put_chunk(upload_id, 1).status_code, 403)
@@ -0,0 +1,53 @@
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from wagtail.documents import get_document_model
+from wagtail.models import Page
+
+from portal.body_cache import dependency_key
+from portal.conditional import page_validators
+from portal.models import ResourcePage
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+
+
+@override_settings(TASKS=DUMMY_TASKS, PORTAL_CONDITIONAL_RELEASE="test")
+class PageValidatorTests(TestCase):
+    def setUp(self):
+        Document = get_document_model()
+        self.document = Document.objects.create(title="Guide", file=ContentFile(b"%PDF-1.4 v1", name="guide.pdf"))
+        self.linked = Document.objects.create(title="Annex", file=ContentFile(b"%PDF-1.4 v1", name="annex.pdf"))
+        cache.delete_many([dependency_key("document", self.document.pk), dependency_key("document", self.linked.pk)])
+        body = [
+            {"type": "document", "value": self.document.pk},
+            {"type": "notes", "value": f'<p><a linktype="document" id="{self.linked.pk}">Annex</a></p>'},
+        ]
+        self.page = Page.objects.get(depth=1).add_child(instance=ResourcePage(
+            title="Validators", slug="validators", kind=ResourcePage.Kind.DOCUMENT, date=date(2025, 1, 1),
+            body=json.dumps(body),
+        ))
+
+    def replace(self, document):
+        document.file.save("replacement.pdf", ContentFile(b"%PDF-1.4 v2"), save=False)
+        document.save()
+
+    def test_stable_while_nothing_changes(self):
+        self.assertEqual(page_validators(self.page), page_validators(self.page))
+
+    def test_replacing_a_referenced_document_changes_the_validators(self):
+        for document in (self.document, self.linked):
+            with self.subTest(document.title):
+                etag, last_modified = page_validators(self.page)
+                self.replace(document)
+                new_etag, new_last_modified = page_validators(self.page)
+                self.assertNotEqual(new_etag, etag)
+                self.assertGreaterEqual(new_last_modified, last_modified)
+
+    def test_unrelated_document_keeps_the_validators(self):
+        other = get_document_model().objects.create(title="Other", file=ContentFile(b"%PDF-1.4", name="other.pdf"))
+        before = page_validators(self.page)
+        self.replace(other)
+        self.assertEqual(page_validators(self.page), before)
@@ -0,0 +1,134 @@
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from wagtail.models import Site
+
+from portal import db_routing
+from portal.db_routing import PRIMARY_COOKIE, ReplicaMiddleware, ReplicaRouter, ReplicaStatus
+
+REPLICA = "replica"
+HAS_REPLICA = REPLICA in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, "needs the replica alias of knowledge_portal.settings.test")
+@override_settings(PORTAL_DB_REPLICAS=[REPLICA], PORTAL_DB_PRIMARY_AFTER_WRITE=10)
+class ReplicaRoutingTests(TestCase):
+    """Routing with the test settings' ``replica`` alias, a mirror of the test database."""
+
+    databases = {"default", REPLICA} if HAS_REPLICA else {"default"}
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.delete(db_routing._PIN_KEY)
+        patcher = mock.patch("portal.db_routing.usable_replicas", return_value=[REPLICA])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def serve(self, request, view=None):
+        """Run ``view`` behind ReplicaMiddleware; returns (response, where reads went)."""
+        seen = {}
+
+        def get_response(request):
+            seen["read"] = Site.objects.all().db
+            if view is not None:
+                view(request, seen)
+            return HttpResponse()
+
+        return ReplicaMiddleware(get_response)(request), seen
+
+    def test_anonymous_get_reads_from_the_replica(self):
+        response, seen = self.serve(self.factory.get("/resources/"))
+        self.assertEqual(seen["read"], REPLICA)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_replica_mirrors_the_primary(self):
+        self.assertEqual(
+            list(Site.objects.using(REPLICA).values_list("pk", flat=True)),
+            list(Site.objects.using("default").values_list("pk", flat=True)),
+        )
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        def view(request, seen):
+            Site.objects.filter(pk=0).update(site_name="x")
+            seen["after_write"] = Site.objects.all().db
+
+        _, seen = self.serve(self.factory.get("/"), view)
+        self.assertEqual(seen["read"], REPLICA)
+        self.assertEqual(seen["after_write"], "default")
+
+    def test_primary_requests(self):
+        cases = {
+            "post": self.factory.post("/contact/"),
+            "session": self.factory.get("/", HTTP_COOKIE=f"{settings.SESSION_COOKIE_NAME}=abc"),
+            "admin": self.factory.get("/admin/pages/"),
+            "recent write": self.factory.get("/", HTTP_COOKIE=f"{PRIMARY_COOKIE}={int(time.time()) + 5}"),
+        }
+        for name, request in cases.items():
+            with self.subTest(name):
+                _, seen = self.serve(request)
+                self.assertEqual(seen["read"], "default")
+
+    def test_expired_write_cookie_reads_from_the_replica(self):
+        _, seen = self.serve(self.factory.get("/", HTTP_COOKIE=f"{PRIMARY_COOKIE}={int(time.time()) - 1}"))
+        self.assertEqual(seen["read"], REPLICA)
+
+    def test_publish_pins_everyone_to_the_primary(self):
+        db_routing.pin_primary()
+        _, seen = self.serve(self.factory.get("/"))
+        self.assertEqual(seen["read"], "default")
+
+    def test_post_that_writes_sets_the_cookie(self):
+        def view(request, seen):
+            get_user_model().objects.create_user("visitor")
+
+        response, _ = self.serve(self.factory.post("/contact/"), view)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        self.assertGreater(float(response.cookies[PRIMARY_COOKIE].value), time.time())
+
+        response, _ = self.serve(self.factory.post("/contact/"))
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_outside_requests_use_the_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Site))
+        self.assertEqual(Site.objects.all().db, "default")
+
+    def test_no_migrations_on_the_replica(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate(REPLICA, "portal"))
+        self.assertIsNone(router.allow_migrate("default", "portal"))
+
+    def test_relations_across_primary_and_replica(self):
+        site = Site.objects.using(REPLICA).first()
+        other = Site.objects.using("default").first()
+        self.assertTrue(ReplicaRouter().allow_relation(site, other))
+
+
+@override_settings(PORTAL_DB_REPLICAS=["replica1", "replica2"], PORTAL_DB_REPLICA_MAX_LAG=5)
+class UsableReplicasTests(TestCase):
+    def setUp(self):
+        db_routing._usable, db_routing._checked_at = [], None
+        self.addCleanup(setattr, db_routing, "_checked_at", None)
+
+    def test_lagging_and_unreachable_replicas_are_skipped(self):
+        statuses = {
+            "replica1": ReplicaStatus("replica1", True, 1.5),
+            "replica2": ReplicaStatus("replica2", True, 30.0),
+        }
+        with mock.patch("portal.db_routing.check_replica", side_effect=statuses.get) as check, \
+                self.assertLogs("portal.db_routing", "WARNING"):
+            self.assertEqual(db_routing.usable_replicas(), ["replica1"])
+            # Within the check interval: not checked again
+            self.assertEqual(db_routing.usable_replicas(), ["replica1"])
+        self.assertEqual(check.call_count, 2)
+
+        statuses["replica1"] = ReplicaStatus("replica1", error="connection refused")
+        db_routing._checked_at = None
+        with mock.patch("portal.db_routing.check_replica", side_effect=statuses.get), \
+                self.assertLogs("portal.db_routing", "WARNING") as logs:
+            self.assertEqual(db_routing.usable_replicas(), [])
+        self.assertIn("connection refused", logs.output[0])
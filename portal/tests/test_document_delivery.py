@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.http import http_date
+
+from portal.document_delivery import _direct_response, _if_range_matches, parse_range
+
+ETAG = '"5d41402abc4b2a76b9719d911017c592"'
+LAST_MODIFIED = 1_700_000_000.0
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        cases = {
+            "bytes=0-99": (0, 99),
+            "bytes=100-": (100, 999),
+            "bytes=900-5000": (900, 999),
+            # Suffix ranges: the last N bytes, all of them if N >= size
+            "bytes=-100": (900, 999),
+            "bytes=-5000": (0, 999),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertEqual(parse_range(header, 1000), expected)
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=1000-", "bytes=1000-1200", "bytes=-0"):
+            with self.subTest(header):
+                self.assertIs(parse_range(header, 1000), False)
+
+    def test_ignored(self):
+        for header in (None, "", "bytes=-", "bytes=500-100", "bytes=0-99,200-299", "items=0-99", "bytes=a-b"):
+            with self.subTest(header):
+                self.assertIsNone(parse_range(header, 1000))
+
+
+class IfRangeTests(SimpleTestCase):
+    def matches(self, if_range):
+        headers = {"HTTP_IF_RANGE": if_range} if if_range else {}
+        request = RequestFactory().get("/", **headers)
+        return _if_range_matches(request, ETAG, LAST_MODIFIED)
+
+    def test_validators(self):
+        self.assertTrue(self.matches(None))
+        self.assertTrue(self.matches(ETAG))
+        self.assertTrue(self.matches(http_date(LAST_MODIFIED)))
+        self.assertFalse(self.matches('"another-version"'))
+        self.assertFalse(self.matches(f"W/{ETAG}"))
+        self.assertFalse(self.matches(http_date(LAST_MODIFIED - 60)))
+        self.assertFalse(self.matches("not a date"))
+
+    def test_etag_without_a_stored_hash(self):
+        request = RequestFactory().get("/", HTTP_IF_RANGE=ETAG)
+        self.assertFalse(_if_range_matches(request, None, LAST_MODIFIED))
+
+
+class DirectResponseTests(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(range(256)) * 4)
+        self.addCleanup(os.unlink, self.path)
+
+    def respond(self, **headers):
+        request = RequestFactory().get("/", **headers)
+        response = _direct_response(request, self.path, 1024, ETAG, LAST_MODIFIED)
+        self.addCleanup(response.close)
+        return response
+
+    def test_partial_content(self):
+        response = self.respond(HTTP_RANGE="bytes=-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1020-1023/1024")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertEqual(b"".join(response.streaming_content), bytes([252, 253, 254, 255]))
+
+    def test_start_past_the_end(self):
+        response = self.respond(HTTP_RANGE="bytes=1024-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_ignored_ranges_get_the_whole_file(self):
+        cases = {
+            "start after end": {"HTTP_RANGE": "bytes=10-5"},
+            "multi-range": {"HTTP_RANGE": "bytes=0-1,4-5"},
+            "etag changed": {"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": '"another-version"'},
+            "modified since": {"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": http_date(LAST_MODIFIED - 60)},
+        }
+        for name, headers in cases.items():
+            with self.subTest(name):
+                response = self.respond(**headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Length"], "1024")
+                self.assertNotIn("Content-Range", response)
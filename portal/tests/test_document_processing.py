@@ -0,0 +1,172 @@
+import subprocess
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from wagtail.documents import get_document_model
+
+from portal.document_processing import ProcessingError, ToolNotInstalled, process_document, run_tool
+from portal.models import DocumentPreview
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+IMMEDIATE_TASKS = {"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+
+
+def completed(returncode=0, stdout=b"", stderr=b""):
+    return subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+
+def working_tools(args, **kwargs):
+    """qpdf and pdftoppm that write their outputs and count one page."""
+    if args[:2] == ["qpdf", "--show-npages"]:
+        return completed(stdout=b"1\n")
+    output = args[-1] + (".png" if args[0] == "pdftoppm" else "")
+    with open(output, "wb") as f:
+        f.write(b"output")
+    return completed()
+
+
+class Installed:
+    """Patches every tool as installed and ``subprocess.run`` with ``run``."""
+
+    def __init__(self, run):
+        self.which = mock.patch("portal.document_processing.shutil.which", side_effect=lambda name: f"/usr/bin/{name}")
+        self.run = mock.patch("portal.document_processing.subprocess.run", side_effect=run)
+
+    def __enter__(self):
+        self.which.start()
+        return self.run.start()
+
+    def __exit__(self, *exc_info):
+        self.run.stop()
+        self.which.stop()
+
+
+@override_settings(PORTAL_DOCUMENT_PROCESSING_TIMEOUT=5, PORTAL_DOCUMENT_PROCESSING_MEMORY_MB=64)
+class RunToolTests(SimpleTestCase):
+    def test_time_and_memory_caps(self):
+        with Installed(lambda *args, **kwargs: completed(stdout=b"3\n")) as run:
+            self.assertEqual(run_tool(["qpdf", "--show-npages", "a.pdf"]), "3\n")
+
+        kwargs = run.call_args.kwargs
+        self.assertEqual(kwargs["timeout"], 5)
+        with mock.patch("portal.document_processing.resource.setrlimit") as setrlimit:
+            kwargs["preexec_fn"]()
+        limit = 64 * 1024 * 1024
+        setrlimit.assert_called_once_with(mock.ANY, (limit, limit))
+
+    def test_timeout(self):
+        def run(args, **kwargs):
+            raise subprocess.TimeoutExpired(args, kwargs["timeout"])
+
+        with Installed(run), self.assertRaisesMessage(ProcessingError, "qpdf timed out"):
+            run_tool(["qpdf", "--linearize", "a.pdf", "b.pdf"])
+
+    def test_failure_reports_the_end_of_stderr(self):
+        with Installed(lambda *args, **kwargs: completed(2, stderr=b"damaged xref table")):
+            with self.assertRaisesMessage(ProcessingError, "qpdf exited with 2: damaged xref table"):
+                run_tool(["qpdf", "--linearize", "a.pdf", "b.pdf"])
+
+    def test_missing_tool(self):
+        with mock.patch("portal.document_processing.shutil.which", return_value=None), \
+                mock.patch("portal.document_processing.subprocess.run") as run:
+            with self.assertRaises(ToolNotInstalled):
+                run_tool(["pdftoppm", "a.pdf"])
+        run.assert_not_called()
+
+
+@override_settings(
+    TASKS=DUMMY_TASKS,
+    PORTAL_DOCUMENT_PROCESSING_MAX_ATTEMPTS=2,
+    PORTAL_DOCUMENT_PROCESSING_RETRY_BASE=60,
+)
+class ProcessDocumentTests(TestCase):
+    def setUp(self):
+        from django_tasks import default_task_backend
+
+        self.backend = default_task_backend
+        self.backend.clear()
+
+    def document(self, name, content=b"%PDF-1.4 test"):
+        return get_document_model().objects.create(title=name, file=ContentFile(content, name=name))
+
+    def timing_out(self, args, **kwargs):
+        raise subprocess.TimeoutExpired(args, kwargs["timeout"])
+
+    def test_unsupported_type_is_not_retried(self):
+        preview = process_document(self.document("notes.txt", b"plain text").pk)
+        self.assertEqual(preview.status, DocumentPreview.Status.UNSUPPORTED)
+        self.assertIsNone(preview.retry_at)
+
+    def test_failed_run_is_retried_with_backoff(self):
+        document = self.document("slides.pptx", b"PK office")
+        with self.captureOnCommitCallbacks(execute=True), Installed(self.timing_out), self.assertLogs("portal"):
+            preview = process_document(document.pk)
+
+        self.assertEqual((preview.status, preview.attempts), (DocumentPreview.Status.FAILED, 1))
+        self.assertIn("timed out", preview.error)
+        delay = (preview.retry_at - timezone.now()).total_seconds()
+        self.assertTrue(55 < delay <= 60, delay)
+        # Deferred to when the retry is due
+        self.assertEqual(len(self.backend.results), 1)
+        self.assertEqual(self.backend.results[0].task.run_after, preview.retry_at)
+
+        # Not due yet: left alone
+        with Installed(self.timing_out) as run:
+            self.assertEqual(process_document(document.pk).attempts, 1)
+        run.assert_not_called()
+
+        DocumentPreview.objects.filter(pk=preview.pk).update(retry_at=timezone.now())
+        with Installed(self.timing_out), self.assertLogs("portal"):
+            preview = process_document(document.pk)
+        # The last attempt
+        self.assertEqual((preview.attempts, preview.retry_at), (2, None))
+
+    @override_settings(TASKS=IMMEDIATE_TASKS)
+    def test_retry_waits_for_the_command_without_deferred_tasks(self):
+        document = self.document("sheet.xlsx", b"PK office")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, Installed(self.timing_out), \
+                self.assertLogs("portal"):
+            preview = process_document(document.pk)
+        self.assertIsNotNone(preview.retry_at)
+        self.assertEqual(callbacks, [])
+
+    def test_missing_converter_is_retried(self):
+        document = self.document("report.docx", b"PK office")
+        with mock.patch("portal.document_processing.shutil.which", return_value=None):
+            preview = process_document(document.pk)
+        self.assertEqual(preview.status, DocumentPreview.Status.UNSUPPORTED)
+        self.assertIn("is not installed", preview.error)
+        self.assertIsNotNone(preview.retry_at)
+
+    def test_preview_created_by_a_concurrent_task(self):
+        document = self.document("guide.pdf")
+        existing = DocumentPreview.objects.create(
+            blob=document.blob_link.blob, status=DocumentPreview.Status.READY,
+        )
+        # This task's lookup ran before the other task's insert
+        missing = mock.Mock(**{"first.return_value": None})
+        with mock.patch.object(DocumentPreview.objects, "filter", return_value=missing):
+            self.assertEqual(process_document(document.pk).pk, existing.pk)
+
+    def test_force_rebuilds_what_gave_up(self):
+        document = self.document("old.pdf")
+        DocumentPreview.objects.create(
+            blob=document.blob_link.blob, status=DocumentPreview.Status.FAILED, attempts=2,
+        )
+        with Installed(working_tools):
+            self.assertEqual(process_document(document.pk).status, DocumentPreview.Status.FAILED)
+            preview = process_document(document.pk, force=True)
+        self.assertEqual((preview.status, preview.attempts, preview.page_count), (DocumentPreview.Status.READY, 0, 1))
+
+    def test_due_retry_is_not_early(self):
+        document = self.document("later.pdf")
+        DocumentPreview.objects.create(
+            blob=document.blob_link.blob, status=DocumentPreview.Status.FAILED, attempts=1,
+            retry_at=timezone.now() + timedelta(minutes=5),
+        )
+        with Installed(working_tools) as run:
+            process_document(document.pk)
+        run.assert_not_called()
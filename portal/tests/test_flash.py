@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from portal.flash import FlashCookieStorage, FlashStorage
+
+
+@override_settings(PORTAL_RATE_LIMITS={})
+class FlashStorageTests(TestCase):
+    def test_anonymous_messages_use_the_cookie(self):
+        response = self.client.post(reverse("newsletter_subscribe"), {"email": "visitor@example.org", "next": "/"})
+
+        self.assertIn(FlashCookieStorage.cookie_name, response.cookies)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+    def test_logged_in_messages_use_the_session(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.org", "password")
+        self.client.force_login(user)
+        rows = "".join(f"not-an-email-{n},\n" for n in range(50))
+        upload = SimpleUploadedFile("subscribers.csv", f"email,status\n{rows}".encode())
+
+        response = self.client.post(
+            reverse("admin:portal_newslettersubscriber_import"),
+            {"file": upload, "update_existing": "on"},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(FlashCookieStorage.cookie_name, response.cookies)
+        # Far more than a cookie holds: the summary and every row's error
+        response = self.client.get(response.url)
+        shown = [message.message for message in response.context["messages"]]
+        self.assertEqual(len(shown), 51)
+        self.assertTrue(shown[-1].startswith("line 51:"))
+
+    def test_untouched_storage_does_not_load_the_user(self):
+        loaded = []
+
+        def load_user():
+            loaded.append(True)
+            return AnonymousUser()
+
+        request = RequestFactory().get("/")
+        request.user = SimpleLazyObject(load_user)
+        storage = FlashStorage(request)
+        storage.update(HttpResponse())
+        self.assertEqual(loaded, [])
+
+        storage.add(messages.INFO, "Hello")
+        response = HttpResponse()
+        storage.update(response)
+        self.assertEqual(loaded, [True])
+        self.assertIn(FlashCookieStorage.cookie_name, response.cookies)
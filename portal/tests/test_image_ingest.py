@@ -0,0 +1,51 @@
+import io
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image as PILImage
+
+from portal.image_ingest import ingest_image
+
+# A 400x200 upload (before orientation) with a 40x20 red block centred on
+# (100, 50); the master is downscaled to 200 on its longest edge
+UPLOAD_SIZE = (400, 200)
+FOCAL_POINT = (100, 50, 40, 20)
+
+
+def upload(orientation):
+    img = PILImage.new("RGB", UPLOAD_SIZE, "black")
+    x, y, width, height = FOCAL_POINT
+    img.paste((255, 0, 0), (x - width // 2, y - height // 2, x + width // 2, y + height // 2))
+    exif = PILImage.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=95, exif=exif)
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+def is_red(pixel):
+    r, g, b = pixel
+    return r > 180 and g < 80 and b < 80
+
+
+@override_settings(PORTAL_IMAGE_MAX_EDGE=200)
+class MasterGeometryTests(SimpleTestCase):
+    def test_focal_point_follows_each_orientation(self):
+        for orientation in range(1, 9):
+            with self.subTest(orientation=orientation):
+                master, geometry = ingest_image(upload(orientation))
+                x, y, width, height = geometry.map_rect(*FOCAL_POINT)
+
+                with PILImage.open(master) as img:
+                    img = img.convert("RGB")
+                    rotated = orientation >= 5
+                    self.assertEqual(img.size, (100, 200) if rotated else (200, 100))
+                    # Half the upload's size, turned with the image
+                    self.assertEqual((width, height), (10, 20) if rotated else (20, 10))
+
+                    self.assertTrue(is_red(img.getpixel((x, y))))
+                    half_w, half_h = width // 2, height // 2
+                    for inside in ((x - half_w + 2, y), (x + half_w - 2, y), (x, y - half_h + 2), (x, y + half_h - 2)):
+                        self.assertTrue(is_red(img.getpixel(inside)), inside)
+                    for outside in ((x - half_w - 3, y), (x + half_w + 3, y), (x, y - half_h - 3), (x, y + half_h + 3)):
+                        self.assertFalse(is_red(img.getpixel(outside)), outside)
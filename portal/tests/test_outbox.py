@@ -0,0 +1,195 @@
+import smtplib
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from portal.models import OutgoingEmail
+from portal.outbox import OutboxSender, claim_due, queue_email, retry_delay, send_due
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+IMMEDIATE_TASKS = {"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+
+
+def _queue(**kwargs):
+    return queue_email(
+        kwargs.get("subject", "Hello"),
+        "Body",
+        kwargs.get("recipients", ["visitor@example.org"]),
+        reply_to=kwargs.get("reply_to", ""),
+    )
+
+
+@override_settings(TASKS=DUMMY_TASKS)
+class QueueEmailTests(TestCase):
+    def setUp(self):
+        from django_tasks import default_task_backend
+
+        self.backend = default_task_backend
+        self.backend.clear()
+
+    def test_queue_only_inserts_a_row(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = _queue()
+        self.assertEqual(email.status, OutgoingEmail.Status.QUEUED)
+        self.assertEqual(email.recipients, "visitor@example.org")
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(self.backend.results, [])
+        self.assertEqual(len(callbacks), 1)
+
+    def test_delivery_task_queued_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _queue()
+        self.assertEqual(len(self.backend.results), 1)
+        self.assertEqual(self.backend.results[0].task.name, "send_outbox_task")
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(PORTAL_OUTBOX_SEND_ON_COMMIT=False)
+    def test_send_on_commit_disabled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _queue()
+        self.assertEqual(self.backend.results, [])
+
+
+@override_settings(TASKS=IMMEDIATE_TASKS)
+class InlineBackendTests(TestCase):
+    def test_request_never_sends(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            email = _queue()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(mail.outbox, [])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.QUEUED)
+
+    @override_settings(PORTAL_OUTBOX_SEND_ON_COMMIT=True)
+    def test_inline_sending_when_asked_for(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            email = _queue()
+        self.assertEqual(len(mail.outbox), 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.SENT)
+
+
+@override_settings(
+    TASKS=DUMMY_TASKS,
+    PORTAL_OUTBOX_RETRY_BASE=30,
+    PORTAL_OUTBOX_RETRY_MAX=3600,
+    PORTAL_OUTBOX_MAX_ATTEMPTS=3,
+    PORTAL_OUTBOX_LEASE=300,
+)
+class SendTests(TestCase):
+    def test_send_due(self):
+        email = _queue(recipients=["a@example.org", "b@example.org"], reply_to="c@example.org")
+        self.assertEqual(send_due(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["a@example.org", "b@example.org"])
+        self.assertEqual(mail.outbox[0].reply_to, ["c@example.org"])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+
+        # Nothing left to send
+        self.assertEqual(send_due(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claimed_rows_are_leased(self):
+        email = _queue()
+        self.assertEqual([e.pk for e in claim_due(10)], [email.pk])
+        self.assertEqual(claim_due(10), [])
+        email.refresh_from_db()
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=290))
+
+    def test_future_rows_wait(self):
+        email = _queue()
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(send_due(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_retry_delay_backs_off(self):
+        self.assertEqual([retry_delay(n) for n in range(1, 5)], [30, 60, 120, 240])
+        self.assertEqual(retry_delay(20), 3600)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = _queue()
+        rejected = smtplib.SMTPDataError(451, b"try again later")
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=rejected), self.assertLogs("portal.outbox"):
+            self.assertEqual(send_due(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.QUEUED)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("SMTPDataError", email.last_error)
+        delay = (email.next_attempt_at - timezone.now()).total_seconds()
+        self.assertTrue(25 < delay <= 30, delay)
+
+        # Not due yet
+        self.assertEqual(send_due(), (0, 0))
+
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_due(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.SENT)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.last_error, "")
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        email = _queue()
+        disconnected = smtplib.SMTPServerDisconnected()
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=disconnected), self.assertLogs("portal.outbox"):
+            for attempt in range(1, 4):
+                OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+                self.assertEqual(send_due(), (0, 1))
+                email.refresh_from_db()
+                self.assertEqual(email.attempts, attempt)
+
+        self.assertEqual(email.status, OutgoingEmail.Status.FAILED)
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(send_due(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+class _KeptOpenConnection:
+    """An email backend whose SMTP connection is already open."""
+
+    def __init__(self):
+        self.connection = mock.Mock()
+        self.sent = []
+
+    def open(self):
+        return False
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        self.sent.extend(messages)
+        return len(messages)
+
+
+@override_settings(TASKS=DUMMY_TASKS, PORTAL_OUTBOX_IDLE_PROBE=30)
+class KeptOpenConnectionTests(TestCase):
+    def test_probed_only_after_being_idle(self):
+        connection = _KeptOpenConnection()
+        sender = OutboxSender(connection)
+        for _ in range(3):
+            _queue()
+
+        with mock.patch("portal.outbox.time.monotonic", return_value=1000.0):
+            self.assertEqual(sender.send_batch(), (3, 0))
+        self.assertEqual(len(connection.sent), 3)
+        self.assertEqual(connection.connection.noop.call_count, 1)
+
+        _queue()
+        with mock.patch("portal.outbox.time.monotonic", return_value=1020.0):
+            sender.send_batch()
+        self.assertEqual(connection.connection.noop.call_count, 1)
+
+        _queue()
+        with mock.patch("portal.outbox.time.monotonic", return_value=1051.0):
+            sender.send_batch()
+        self.assertEqual(connection.connection.noop.call_count, 2)
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from portal.models import NewsletterSubscriber
+from portal.pagination import EstimatedCountPaginator, KeysetPage, _planner_estimate, estimated_count
+
+
+def subscribers():
+    now = timezone.now()
+    # Two pairs share a timestamp, so pages have to split ties on pk
+    for n, hours in enumerate([1, 2, 2, 3, 4, 4, 5]):
+        NewsletterSubscriber.objects.create(email=f"reader{n}@example.org", subscribed_at=now - timedelta(hours=hours))
+    return list(NewsletterSubscriber.objects.order_by("-subscribed_at", "-pk"))
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        self.expected = subscribers()
+        self.queryset = NewsletterSubscriber.objects.all()
+
+    def page(self, cursor=None):
+        return KeysetPage(self.queryset, "subscribed_at", 3, cursor)
+
+    def test_pages_forward_and_back(self):
+        pages = [self.page()]
+        while pages[-1].has_next():
+            pages.append(self.page(pages[-1].next_cursor))
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([row for page in pages for row in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertIsNone(pages[-1].next_cursor)
+
+        back = self.page(pages[2].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        self.assertTrue(back.has_next())
+        first = self.page(back.previous_cursor)
+        self.assertEqual(first.object_list, pages[0].object_list)
+        self.assertFalse(first.has_previous())
+
+    def test_bad_cursor_starts_from_the_newest(self):
+        for cursor in ("not-base64!", "WzEsMiwzXQ"):  # the second decodes to [1, 2, 3]
+            with self.subTest(cursor):
+                self.assertEqual(self.page(cursor).object_list, self.expected[:3])
+
+
+@override_settings(PORTAL_ADMIN_EXACT_COUNT_LIMIT=1000)
+class EstimatedCountTests(TestCase):
+    def setUp(self):
+        subscribers()
+        self.queryset = NewsletterSubscriber.objects.all()
+
+    def estimate(self, rows):
+        return mock.patch("portal.pagination._planner_estimate", return_value=rows)
+
+    def test_large_estimates_are_not_counted(self):
+        with self.estimate(250000), self.assertNumQueries(0):
+            self.assertEqual(estimated_count(self.queryset), (250000, True))
+
+        paginator = EstimatedCountPaginator(self.queryset, 20)
+        with self.estimate(250000):
+            self.assertEqual(paginator.count, 250000)
+        self.assertTrue(paginator.is_estimate)
+        self.assertTrue(paginator.items_count_label.startswith("about "))
+
+    def test_small_or_missing_estimates_are_counted(self):
+        for rows in (900, None):
+            with self.subTest(rows), self.estimate(rows):
+                self.assertEqual(estimated_count(self.queryset), (7, False))
+
+    def test_planner_estimate(self):
+        estimate = _planner_estimate(self.queryset.filter(status=NewsletterSubscriber.Status.SUBSCRIBED))
+        if connection.vendor == "postgresql":
+            self.assertIsInstance(estimate, int)
+        else:
+            self.assertIsNone(estimate)
+
+
+class KeysetListingTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.org", "password")
+        self.client.force_login(user)
+        subscribers()
+
+    def test_changelist_falls_back_to_numbered_pages(self):
+        url = reverse("admin:portal_newslettersubscriber_changelist")
+        self.assertIsNotNone(self.client.get(url).context["cl"].keyset_page)
+        for params in ({"q": "reader1"}, {"o": "1"}, {"all": ""}):
+            with self.subTest(params):
+                cl = self.client.get(url, params).context["cl"]
+                self.assertIsNone(cl.keyset_page)
+
+        cl = self.client.get(url, {"q": "reader1"}).context["cl"]
+        self.assertEqual([row.email for row in cl.result_list], ["reader1@example.org"])
+
+    def test_snippet_index_falls_back_when_searching(self):
+        url = reverse("wagtailsnippets_portal_newslettersubscriber:list")
+        self.assertTrue(self.client.get(url).context["keyset"])
+        self.assertFalse(self.client.get(url, {"q": "reader1"}).context["keyset"])
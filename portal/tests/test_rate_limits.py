@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from portal import rate_limits
+from portal.rate_limits import check_cache, hit, usage
+
+LOCMEM = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "rate-limit-tests"}
+LIMITS = {"newsletter": {"ip": (3, 100), "email": (2, 100)}}
+
+
+@override_settings(
+    CACHES={**settings.CACHES, "rate_limits": LOCMEM},
+    PORTAL_RATE_LIMIT_CACHE="rate_limits",
+    PORTAL_RATE_LIMITS=LIMITS,
+)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        caches["rate_limits"].clear()
+
+    def hit_at(self, now, **identities):
+        # Not time.time itself: the cache expires keys by it
+        with mock.patch("portal.rate_limits.time") as clock:
+            clock.time.return_value = now
+            return hit("newsletter", **identities)
+
+    def test_limit_per_ip(self):
+        for _ in range(3):
+            self.assertIsNone(self.hit_at(1000, ip="192.0.2.1"))
+        limited = self.hit_at(1000, ip="192.0.2.1")
+        self.assertEqual((limited.kind, limited.current), ("ip", 4))
+        self.assertIsNone(self.hit_at(1000, ip="192.0.2.2"))
+
+    def test_limit_per_address(self):
+        self.assertIsNone(self.hit_at(1000, ip="192.0.2.1", email="reader@example.org"))
+        self.assertIsNone(self.hit_at(1000, ip="192.0.2.2", email="Reader@Example.org "))
+        limited = self.hit_at(1000, ip="192.0.2.3", email="reader@example.org")
+        self.assertEqual(limited.kind, "email")
+        self.assertFalse(any("reader" in key for key in caches["rate_limits"]._cache))
+
+    def test_previous_window_counts_for_what_still_overlaps(self):
+        for _ in range(3):
+            self.hit_at(1050, ip="192.0.2.1")
+
+        # Halfway into the next window, half of those still count
+        current = usage("newsletter", "ip", "192.0.2.1", now=1150)
+        self.assertEqual((current.current, current.previous), (0, 3))
+        self.assertAlmostEqual(current.estimated, 1.5)
+
+        self.assertIsNone(self.hit_at(1150, ip="192.0.2.1"))
+        limited = self.hit_at(1150, ip="192.0.2.1")
+        self.assertAlmostEqual(limited.estimated, 3.5)
+        # 2 current + 3 previous * (1 - elapsed) <= 3 once elapsed >= 2/3
+        self.assertEqual(limited.retry_after, 17)
+
+        # Two windows on, nothing is left
+        self.assertIsNone(self.hit_at(1300, ip="192.0.2.1"))
+
+    def test_empty_identities_are_not_counted(self):
+        for _ in range(5):
+            self.assertIsNone(self.hit_at(1000, ip="", email=None))
+
+
+@override_settings(
+    CACHES={**settings.CACHES, "rate_limits": LOCMEM},
+    PORTAL_RATE_LIMIT_CACHE="rate_limits",
+    PORTAL_RATE_LIMITS={"newsletter": {"ip": (2, 3600)}},
+)
+class TooManyRequestsTests(TestCase):
+    def setUp(self):
+        caches["rate_limits"].clear()
+
+    def test_over_the_limit_is_refused_with_retry_after(self):
+        url = reverse("newsletter_subscribe")
+        for n in range(2):
+            response = self.client.post(url, {"email": f"reader{n}@example.org", "next": "/"})
+            self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(url, {"email": "reader9@example.org", "next": "/"})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertEqual(rate_limits.usage("newsletter", "ip", "127.0.0.1").current, 3)
+
+
+class CacheCheckTests(SimpleTestCase):
+    def check(self, backend, limits=LIMITS):
+        with override_settings(
+            CACHES={"default": {"BACKEND": backend}}, PORTAL_RATE_LIMIT_CACHE="default", PORTAL_RATE_LIMITS=limits,
+        ):
+            return [warning.id for warning in check_cache(None)]
+
+    def test_warns_unless_the_cache_is_shared_and_atomic(self):
+        self.assertEqual(self.check("django.core.cache.backends.filebased.FileBasedCache"), ["portal.W001"])
+        self.assertEqual(self.check("django.core.cache.backends.locmem.LocMemCache"), ["portal.W001"])
+        self.assertEqual(self.check("django.core.cache.backends.redis.RedisCache"), [])
+
+    def test_quiet_when_the_limits_are_off(self):
+        self.assertEqual(self.check("django.core.cache.backends.filebased.FileBasedCache", limits={}), [])
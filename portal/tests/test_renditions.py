@@ -0,0 +1,65 @@
+from django.test import TestCase, override_settings
+from wagtail.blocks import CharBlock, ListBlock, StreamBlock, StructBlock
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageChooserBlock
+from wagtail.images.tests.utils import get_test_image_file
+from wagtail.models import Page
+
+from portal.models import ExpertPage, Partner, PartnerRow, PartnerRowItem, TrainingPage, TrainingTrainer
+from portal.renditions import _block_images, filter_specs_for, image_references
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+
+
+class ImageReferencesTests(TestCase):
+    def image(self, title):
+        return get_image_model().objects.create(title=title, file=get_test_image_file())
+
+    def partner_row(self):
+        logos = [self.image("Logo A"), self.image("Logo B")]
+        partners = [Partner.objects.create(name=f"Partner {n}", logo=logo) for n, logo in enumerate(logos)]
+        partners.append(Partner.objects.create(name="Partner without a logo"))
+        row = PartnerRow(title="Funders", slug="funders")
+        row.items = [PartnerRowItem(partner=partner) for partner in partners]
+        return row, logos
+
+    def test_partner_logos_in_a_row(self):
+        row, logos = self.partner_row()
+        self.assertEqual(image_references(row), [(logo.pk, "logo") for logo in logos])
+
+    def test_unsaved_child_rows_of_a_page(self):
+        root = Page.objects.get(depth=1)
+        photo = self.image("Trainer photo")
+        expert = root.add_child(instance=ExpertPage(title="Trainer", slug="trainer", photo=photo))
+        cover = self.image("Cover")
+        # As a page revision holds them, before its children are saved
+        page = TrainingPage(title="Course", slug="course", cover_image=cover)
+        page.trainers = [TrainingTrainer(expert=expert)]
+        self.assertEqual(image_references(page), [(cover.pk, "cover_image"), (photo.pk, "photo")])
+
+    def test_image_blocks_in_a_stream(self):
+        gallery, photo = self.image("Gallery"), self.image("Card photo")
+        block = StreamBlock([
+            ("gallery", ListBlock(ImageChooserBlock())),
+            ("card", StructBlock([("photo", ImageChooserBlock(required=False)), ("caption", CharBlock())])),
+        ])
+        value = block.to_python([
+            {"type": "gallery", "value": [gallery.pk]},
+            {"type": "card", "value": {"photo": photo.pk, "caption": "With a photo"}},
+            {"type": "card", "value": {"photo": None, "caption": "Without"}},
+        ])
+        self.assertEqual(_block_images(block, value, "body"), [(gallery.pk, "gallery"), (photo.pk, "photo")])
+
+    @override_settings(TASKS=DUMMY_TASKS)
+    def test_saving_a_row_warms_its_logos(self):
+        from django_tasks import default_task_backend
+
+        default_task_backend.clear()
+        row, logos = self.partner_row()
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        warmed = {
+            result.args[0]: result.args[1] for result in default_task_backend.results
+            if result.task.name == "generate_renditions_task"
+        }
+        self.assertEqual(warmed, {logo.pk: filter_specs_for("logo") for logo in logos})
@@ -0,0 +1,82 @@
+from datetime import date
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from wagtail.models import Site
+
+from portal.models import ResourcePage
+from portal.routing import _MISSING, NAMESPACE, RouteCache, cached_route, route_cache
+from portal.tiered_cache import tiered_cache
+
+
+class RouteCacheTests(SimpleTestCase):
+    def test_routes_and_misses_are_bounded_apart(self):
+        cache = RouteCache(MAX_ENTRIES=2, NEGATIVE_MAX_ENTRIES=2)
+        cache.set((1, "a"), "g", ("route-a",))
+        cache.set((1, "b"), "g", ("route-b",))
+        for path in ("x", "y", "z"):
+            cache.set((1, path), "g", None)
+
+        self.assertEqual(cache.get((1, "a"), "g"), ("route-a",))
+        self.assertEqual(cache.get((1, "b"), "g"), ("route-b",))
+        self.assertIs(cache.get((1, "x"), "g"), _MISSING)
+        self.assertIsNone(cache.get((1, "z"), "g"))
+        self.assertEqual(len(cache), 4)
+
+        cache.set((1, "c"), "g", ("route-c",))
+        self.assertIs(cache.get((1, "a"), "g"), _MISSING)
+
+    def test_entries_end_with_their_generation(self):
+        cache = RouteCache()
+        cache.set((1, "a"), "g1", ("route-a",))
+        cache.set((1, "x"), "g1", None)
+        self.assertIs(cache.get((1, "a"), "g2"), _MISSING)
+        self.assertIs(cache.get((1, "x"), "g2"), _MISSING)
+        self.assertEqual(len(cache), 0)
+
+    def test_misses_expire(self):
+        cache = RouteCache(NEGATIVE_TIMEOUT=60)
+        with mock.patch("portal.routing.time.monotonic", return_value=1000.0):
+            cache.set((1, "x"), "g", None)
+        with mock.patch("portal.routing.time.monotonic", return_value=1061.0):
+            self.assertIs(cache.get((1, "x"), "g"), _MISSING)
+
+
+class CachedRouteTests(TestCase):
+    def setUp(self):
+        route_cache.clear()
+        tiered_cache.invalidate(NAMESPACE)
+        self.site = Site.objects.get(is_default_site=True)
+        self.page = self.site.root_page.add_child(instance=ResourcePage(
+            title="Guide", slug="routing-guide", kind=ResourcePage.Kind.DOCUMENT, date=date(2025, 1, 1),
+        ))
+
+    def route(self, path):
+        return cached_route(RequestFactory().get(f"/{path}"), path)
+
+    def shared_key(self, path):
+        return f"portal:routes:{tiered_cache.generation(NAMESPACE)}:{self.site.pk}:{path}"
+
+    def test_found_route_is_shared(self):
+        self.assertEqual(self.route("routing-guide/").page, self.page)
+        self.assertIsNotNone(tiered_cache.shared.get(self.shared_key("routing-guide")))
+
+        # Another worker: walks nothing, loads only the page
+        route_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.route("routing-guide/").page, self.page)
+
+    def test_miss_stays_in_the_process(self):
+        self.assertIsNone(self.route("no-such-page/"))
+        self.assertIsNone(tiered_cache.shared.get(self.shared_key("no-such-page")))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.route("no-such-page/"))
+
+    def test_publish_ends_cached_misses(self):
+        self.assertIsNone(self.route("later/"))
+        self.site.root_page.add_child(instance=ResourcePage(
+            title="Later", slug="later", kind=ResourcePage.Kind.DOCUMENT, date=date(2025, 1, 1),
+        ))
+        tiered_cache.invalidate(NAMESPACE)
+        self.assertEqual(self.route("later/").page.slug, "later")
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from portal.single_flight import SingleFlight, stale_served
+
+THREADS = 8
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache("portal-single-flight-tests", {})
+        self.cache.clear()
+        self.generation = "g1"
+        # BETA=0: no early refresh, so the counts below are exact
+        self.flight = SingleFlight(
+            self.cache, generation=lambda namespace: self.generation,
+            BETA=0, WAIT=5.0, POLL=0.01, LEASE=30,
+        )
+        self.fills = 0
+        self.fills_lock = threading.Lock()
+
+    def compute(self, value, seconds=0.2):
+        def compute():
+            with self.fills_lock:
+                self.fills += 1
+            time.sleep(seconds)
+            return value
+        return compute
+
+    def concurrently(self, compute, **kwargs):
+        """``self.flight.get("summary", compute)`` from THREADS threads at once."""
+        barrier = threading.Barrier(THREADS)
+        results = [None] * THREADS
+
+        def worker(index):
+            barrier.wait()
+            results[index] = self.flight.get("summary", compute, **kwargs)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def expire(self, key="summary"):
+        cache_key = f"portal:sf:fragments:{key}"
+        entry = self.cache.get(cache_key)
+        entry.expires_at = time.time() - 1
+        self.cache.set(cache_key, entry)
+
+    def test_cold_key_is_computed_once(self):
+        results = self.concurrently(self.compute("v1"))
+
+        self.assertEqual(results, ["v1"] * THREADS)
+        self.assertEqual(self.fills, 1)
+        self.assertEqual(self.flight.stats(), {"computed": 1, "waited": THREADS - 1})
+
+    def test_expired_value_is_served_stale_while_one_recomputes(self):
+        self.flight.get("summary", self.compute("v1", 0))
+        self.expire()
+
+        results = self.concurrently(self.compute("v2"))
+
+        self.assertEqual(self.fills, 2)
+        self.assertEqual(sorted(results), ["v1"] * (THREADS - 1) + ["v2"])
+        self.assertEqual(self.flight.stats()["stale"], THREADS - 1)
+        self.assertEqual(self.flight.get("summary", self.compute("v3")), "v2")
+
+    def test_new_generation_is_recomputed_once(self):
+        self.flight.get("summary", self.compute("v1", 0))
+        self.generation = "g2"
+
+        results = self.concurrently(self.compute("v2"))
+
+        self.assertEqual(self.fills, 2)
+        self.assertEqual(results.count("v2"), 1)
+        self.assertEqual(self.flight.get("summary", self.compute("v3")), "v2")
+
+    def test_fresh_value_is_not_recomputed(self):
+        self.flight.get("summary", self.compute("v1", 0))
+        results = self.concurrently(self.compute("v2"))
+        self.assertEqual(results, ["v1"] * THREADS)
+        self.assertEqual(self.fills, 1)
+
+    def test_waiters_compute_when_the_holder_never_stores(self):
+        flight = SingleFlight(self.cache, generation=lambda namespace: "g1", WAIT=0.05, POLL=0.01)
+        self.cache.add("portal:sf:fragments:summary:lease", "someone-else", 30)
+
+        with self.assertLogs("portal.single_flight", "WARNING"):
+            self.assertEqual(flight.get("summary", self.compute("v1", 0)), "v1")
+        self.assertEqual(flight.stats(), {"wait_timeout": 1, "computed": 1})
+
+    def test_stale_value_is_flagged_for_the_response(self):
+        self.flight.get("summary", self.compute("v1", 0))
+        self.expire()
+        self.cache.add("portal:sf:fragments:summary:lease", "someone-else", 30)
+
+        token = stale_served.set(False)
+        try:
+            self.assertEqual(self.flight.get("summary", self.compute("v2")), "v1")
+            self.assertTrue(stale_served.get())
+        finally:
+            stale_served.reset(token)
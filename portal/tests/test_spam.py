@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from wagtail.models import Page
+
+from portal import spam
+from portal.models import ContactPage, ContactSubmission, OutgoingEmail
+from portal.spam import rescore, score_pending
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+SPAM_MESSAGE = "Cheap deals http://spam.example/1 http://spam.example/2 http://spam.example/3"
+
+
+@override_settings(PORTAL_SPAM_THRESHOLD=1.0)
+class ScorePendingTests(TestCase):
+    def submit(self, message, user_agent="Mozilla/5.0", **kwargs):
+        return ContactSubmission.objects.create(
+            name="Visitor", email="visitor@example.org", subject="Question",
+            message=message, user_agent=user_agent, ip_address="192.0.2.1", **kwargs,
+        )
+
+    def test_scores_pending_submissions(self):
+        # Locks only the submission rows: the nullable page join can't be
+        # locked on PostgreSQL
+        ham = self.submit("Where can I find the training calendar for next year?")
+        spam = self.submit(SPAM_MESSAGE, user_agent="python-requests/2.32")
+
+        scored, spam_count = score_pending()
+
+        self.assertEqual((scored, spam_count), (2, 1))
+        ham.refresh_from_db()
+        spam.refresh_from_db()
+        self.assertIsNotNone(ham.scored_at)
+        self.assertEqual(ham.status, ContactSubmission.Status.NEW)
+        self.assertEqual(spam.status, ContactSubmission.Status.SPAM)
+        self.assertIsNotNone(spam.held_at)
+        self.assertIsNone(ham.held_at)
+        self.assertIn("links", spam.spam_reasons)
+
+        self.assertEqual(score_pending(), (0, 0))
+
+
+@override_settings(PORTAL_SPAM_THRESHOLD=1.0, TASKS=DUMMY_TASKS)
+class TriageTests(TestCase):
+    def setUp(self):
+        self.page = Page.objects.get(depth=1).add_child(instance=ContactPage(
+            title="Contact", slug="contact-triage", notification_emails="team@example.org",
+        ))
+        user = get_user_model().objects.create_superuser("admin", "admin@example.org", "password")
+        self.client.force_login(user)
+
+    def submit(self, **kwargs):
+        return ContactSubmission.objects.create(
+            page=self.page, name="Visitor", email="visitor@example.org", subject="Question",
+            message=SPAM_MESSAGE, user_agent="python-requests/2.32", **kwargs,
+        )
+
+    def test_not_spam_notifies_only_what_the_scorer_held(self):
+        held = self.submit()
+        score_pending()
+        # Arrived before the outbox, notified then, marked spam by hand later
+        earlier = self.submit(status=ContactSubmission.Status.SPAM, scored_at=timezone.now())
+
+        self.client.post(reverse("admin:portal_contactsubmission_changelist"), {
+            "action": "mark_not_spam", "_selected_action": [held.pk, earlier.pk],
+        })
+
+        held.refresh_from_db()
+        self.assertEqual(held.status, ContactSubmission.Status.NEW)
+        self.assertIsNone(held.held_at)
+        self.assertTrue(OutgoingEmail.objects.filter(submission=held).exists())
+        self.assertFalse(OutgoingEmail.objects.filter(submission=earlier).exists())
+
+    def test_rescore_keeps_a_triage_made_meanwhile(self):
+        submission = self.submit(scored_at=timezone.now())
+        score_batch = spam.score_batch
+
+        def triaged_while_scoring(batch):
+            ContactSubmission.objects.filter(pk=submission.pk).update(status=ContactSubmission.Status.RESOLVED)
+            return score_batch(batch)
+
+        with mock.patch("portal.spam.score_batch", triaged_while_scoring):
+            self.assertEqual(rescore(ContactSubmission.objects.filter(pk=submission.pk)), (1, 0))
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, ContactSubmission.Status.RESOLVED)
+        self.assertIsNotNone(submission.spam_score)
@@ -0,0 +1,99 @@
+import io
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from portal.models import NewsletterSubscriber
+from portal.subscriber_csv import export_rows, import_rows, update_fields_for
+
+Status = NewsletterSubscriber.Status
+
+
+def _import(text, **kwargs):
+    return import_rows(io.StringIO(text), **kwargs)
+
+
+class SubscriberImportTests(TestCase):
+    def setUp(self):
+        self.left_at = timezone.now() - timedelta(days=30)
+        NewsletterSubscriber.objects.bulk_create([
+            NewsletterSubscriber(email="named@example.org", full_name="Named Person", source="footer"),
+            NewsletterSubscriber(
+                email="left@example.org", full_name="Left", status=Status.UNSUBSCRIBED,
+                unsubscribed_at=self.left_at,
+            ),
+        ])
+
+    def get(self, email):
+        return NewsletterSubscriber.objects.get(email=email)
+
+    def test_update_fields_follow_the_header(self):
+        self.assertEqual(update_fields_for(["email"]), [])
+        self.assertEqual(update_fields_for(["email", "full_name"]), ["full_name"])
+        self.assertEqual(
+            update_fields_for(["email", "status", "site_id"]),
+            ["status", "unsubscribed_at", "site_id"],
+        )
+
+    def test_bare_emails_change_nothing_existing(self):
+        result = _import("email\nNamed@Example.org\nleft@example.org\nnew@example.org\n")
+
+        self.assertEqual((result.rows, result.written, result.invalid), (3, 3, 0))
+        named, left = self.get("named@example.org"), self.get("left@example.org")
+        self.assertEqual((named.full_name, named.status, named.source), ("Named Person", Status.SUBSCRIBED, "footer"))
+        self.assertEqual((left.full_name, left.status), ("Left", Status.UNSUBSCRIBED))
+        self.assertEqual(left.unsubscribed_at, self.left_at)
+        new = self.get("new@example.org")
+        self.assertEqual((new.status, new.source), (Status.SUBSCRIBED, "import"))
+
+    def test_present_columns_are_updated(self):
+        _import("email,full_name\nnamed@example.org,Renamed\n")
+        named = self.get("named@example.org")
+        self.assertEqual(named.full_name, "Renamed")
+        self.assertEqual(named.source, "footer")
+
+    def test_status_column_never_resubscribes_by_default(self):
+        result = _import("email,status\nleft@example.org,subscribed\nnamed@example.org,unsubscribed\n")
+
+        self.assertEqual(result.kept_unsubscribed, 1)
+        left = self.get("left@example.org")
+        self.assertEqual(left.status, Status.UNSUBSCRIBED)
+        self.assertEqual(left.unsubscribed_at, self.left_at)
+        named = self.get("named@example.org")
+        self.assertEqual(named.status, Status.UNSUBSCRIBED)
+        self.assertIsNotNone(named.unsubscribed_at)
+
+    def test_resubscribe_when_asked(self):
+        result = _import("email,status\nleft@example.org,subscribed\n", resubscribe=True)
+
+        self.assertEqual(result.kept_unsubscribed, 0)
+        left = self.get("left@example.org")
+        self.assertEqual(left.status, Status.SUBSCRIBED)
+        self.assertIsNone(left.unsubscribed_at)
+
+    def test_skip_existing(self):
+        _import("email,full_name,status\nnamed@example.org,Renamed,unsubscribed\n", update_existing=False)
+        named = self.get("named@example.org")
+        self.assertEqual((named.full_name, named.status), ("Named Person", Status.SUBSCRIBED))
+
+    def test_dry_run_writes_nothing(self):
+        result = _import("email,status\nleft@example.org,subscribed\nnew@example.org,\n", dry_run=True)
+        self.assertEqual((result.written, result.kept_unsubscribed), (2, 1))
+        self.assertFalse(NewsletterSubscriber.objects.filter(email="new@example.org").exists())
+
+    def test_invalid_rows_are_reported(self):
+        result = _import("email,status\nnot-an-email,\nok@example.org,maybe\n")
+        self.assertEqual((result.written, result.invalid), (0, 2))
+        self.assertEqual(len(result.errors), 2)
+        self.assertTrue(result.errors[1].startswith("line 3: unknown status"))
+
+    def test_export_round_trip(self):
+        exported = "".join(export_rows())
+        NewsletterSubscriber.objects.all().delete()
+
+        result = _import(exported)
+        self.assertEqual(result.written, 2)
+        left = self.get("left@example.org")
+        self.assertEqual((left.full_name, left.status), ("Left", Status.UNSUBSCRIBED))
+        self.assertEqual(left.unsubscribed_at, self.left_at)
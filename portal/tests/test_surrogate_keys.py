@@ -0,0 +1,169 @@
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from wagtail.models import Page
+
+from portal.models import Region, ResourcePage, Topic
+from portal.single_flight import stale_served
+from portal.surrogate_keys import SurrogateKeyMiddleware, add_keys, page_keys, purge, send_purge
+from portal.tiered_cache import tiered_cache
+
+DUMMY_TASKS = {"default": {"BACKEND": "django_tasks.backends.dummy.DummyBackend"}}
+IMMEDIATE_TASKS = {"default": {"BACKEND": "django_tasks.backends.immediate.ImmediateBackend"}}
+
+
+class _PurgeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.server.received.append((self.path, self.headers["Surrogate-Key"], self.headers["Fastly-Key"]))
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class PurgeServerMixin:
+    """A stub purge endpoint on localhost, recording what it was sent."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _PurgeHandler)
+        cls.server.received = []
+        thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        thread.start()
+        cls.purge_url = f"http://127.0.0.1:{cls.server.server_port}/purge"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.received = []
+        self.server.status = 200
+
+    def purge_settings(self, **options):
+        return override_settings(PORTAL_EDGE_PURGE={
+            "URL": self.purge_url, "HEADERS": {"Fastly-Key": "secret"}, "BATCH_SIZE": 2, "TIMEOUT": 2,
+            **options,
+        })
+
+
+class SendPurgeTests(PurgeServerMixin, SimpleTestCase):
+    def test_keys_are_sent_in_batches(self):
+        with self.purge_settings():
+            purged = send_purge(["p3", "p1", "site", "t:portal.topic", "p2", "p1"])
+
+        self.assertEqual(purged, 5)
+        self.assertEqual(self.server.received, [
+            ("/purge", "p1 p2", "secret"),
+            ("/purge", "p3 site", "secret"),
+            ("/purge", "t:portal.topic", "secret"),
+        ])
+
+    def test_failed_batches_are_logged_and_not_counted(self):
+        self.server.status = 503
+        with self.purge_settings(), self.assertLogs("portal.surrogate_keys", "ERROR") as logs:
+            self.assertEqual(send_purge(["p1", "p2", "p3"]), 0)
+        self.assertEqual(len(self.server.received), 2)
+        self.assertEqual(len(logs.output), 2)
+
+    def test_unreachable_endpoint(self):
+        with self.purge_settings(URL="http://127.0.0.1:9/purge"), self.assertLogs("portal.surrogate_keys", "ERROR"):
+            self.assertEqual(send_purge(["p1"]), 0)
+
+
+class PurgeSchedulingTests(PurgeServerMixin, TestCase):
+    @override_settings(TASKS=DUMMY_TASKS)
+    def test_purged_on_commit_by_the_task(self):
+        from django_tasks import default_task_backend
+
+        default_task_backend.clear()
+        with self.purge_settings(), self.captureOnCommitCallbacks(execute=True):
+            purge(["p2", "p1"])
+            self.assertEqual(default_task_backend.results, [])
+
+        self.assertEqual(len(default_task_backend.results), 1)
+        self.assertEqual(default_task_backend.results[0].args, [["p1", "p2"]])
+        self.assertEqual(self.server.received, [])
+
+    def test_nothing_to_purge_without_a_url(self):
+        with override_settings(PORTAL_EDGE_PURGE={"URL": None}), self.captureOnCommitCallbacks() as callbacks:
+            purge(["p1"])
+        self.assertEqual(callbacks, [])
+
+    @override_settings(TASKS=IMMEDIATE_TASKS)
+    def test_skipped_when_tasks_run_inline(self):
+        with self.purge_settings(), self.assertLogs("portal.surrogate_keys", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                purge(["p1"])
+        self.assertEqual(self.server.received, [])
+
+    @override_settings(TASKS=IMMEDIATE_TASKS)
+    def test_inline_when_asked_for(self):
+        with self.purge_settings(INLINE=True), self.captureOnCommitCallbacks(execute=True):
+            purge(["p1"])
+        self.assertEqual(self.server.received, [("/purge", "p1", "secret")])
+
+
+class PageKeysTests(TestCase):
+    def setUp(self):
+        tiered_cache.invalidate("taxonomies")
+        self.topic = Topic.objects.create(name="Surrogate key test topic")
+        self.region = Region.objects.create(name="Surrogate key test region")
+        self.page = Page.objects.get(depth=1).add_child(instance=ResourcePage(
+            title="Guide", slug="guide", kind=ResourcePage.Kind.DOCUMENT, date=date(2025, 1, 1),
+            last_published_at=timezone.now(),
+        ))
+        self.page.topics.add(self.topic)
+        self.page.regions.add(self.region)
+        self.page.save()
+
+    def expected(self, *terms):
+        return {f"p{self.page.pk}", *terms}
+
+    def test_terms_are_queried_once_per_publish(self):
+        keys = self.expected(f"topic:{self.topic.pk}", f"region:{self.region.pk}")
+        self.assertEqual(page_keys(self.page), keys)
+        with self.assertNumQueries(0):
+            self.assertEqual(page_keys(self.page), keys)
+
+        self.page.topics.clear()
+        self.page.last_published_at += timedelta(minutes=1)
+        self.page.save()
+        self.assertEqual(page_keys(self.page), self.expected(f"region:{self.region.pk}"))
+
+    def test_deleted_term_is_dropped(self):
+        page_keys(self.page)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.region.delete()
+        self.assertEqual(page_keys(self.page), self.expected(f"topic:{self.topic.pk}"))
+
+
+class SurrogateKeyMiddlewareTests(SimpleTestCase):
+    def serve(self, stale=False):
+        def view(request):
+            add_keys(request, ["p2", "site"])
+            add_keys(request, ["p1"])
+            if stale:
+                stale_served.set(True)
+            return HttpResponse()
+
+        return SurrogateKeyMiddleware(view)(RequestFactory().get("/"))
+
+    def test_headers(self):
+        response = self.serve()
+        self.assertEqual(response["Surrogate-Key"], "p1 p2 site")
+        self.assertEqual(response["Cache-Tag"], "p1,p2,site")
+        self.assertNotIn("Surrogate-Control", response)
+
+    def test_stale_response_is_not_kept_at_the_edge(self):
+        self.assertEqual(self.serve(stale=True)["Surrogate-Control"], "no-store")
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from portal.tiered_cache import TieredCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Two ``TieredCache`` instances over one LocMemCache act as two workers."""
+
+    def setUp(self):
+        shared = LocMemCache("portal-tiered-cache-tests", {})
+        shared.clear()
+        options = {"CHECK_INTERVAL": 1.0, "L1_TIMEOUT": 60, "L1_MAX_ENTRIES": 100, "STATS_INTERVAL": 3600}
+        self.clock = Clock()
+        patcher = mock.patch("portal.tiered_cache.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.worker1 = TieredCache(shared, **options)
+        self.worker2 = TieredCache(shared, **options)
+        self.fills = 0
+
+    def fill(self, value="v1"):
+        def fill():
+            self.fills += 1
+            return value
+        return fill
+
+    def test_filled_once_across_workers(self):
+        self.assertEqual(self.worker1.get_or_set("sites", "a", self.fill()), "v1")
+        self.assertEqual(self.worker2.get_or_set("sites", "a", self.fill()), "v1")
+        self.assertEqual(self.worker1.get_or_set("sites", "a", self.fill()), "v1")
+        self.assertEqual(self.fills, 1)
+        self.assertEqual(self.worker1.local_stats(), {("sites", "miss"): 1, ("sites", "l1_hit"): 1})
+        self.assertEqual(self.worker2.local_stats(), {("sites", "l2_hit"): 1})
+
+    def test_invalidate_reaches_the_other_worker_after_the_check_interval(self):
+        self.worker1.get_or_set("sites", "a", self.fill("v1"))
+        self.worker2.get_or_set("sites", "a", self.fill("v1"))
+
+        self.worker1.invalidate("sites")
+        self.assertEqual(self.worker1.get_or_set("sites", "a", self.fill("v2")), "v2")
+        # worker2 has not re-checked the generation yet
+        self.assertEqual(self.worker2.get_or_set("sites", "a", self.fill("v3")), "v1")
+
+        self.clock.now += 1.0
+        self.assertEqual(self.worker2.get_or_set("sites", "a", self.fill("v3")), "v2")
+        self.assertEqual(self.fills, 2)
+
+    def test_invalidate_is_per_namespace(self):
+        self.worker1.get_or_set("sites", "a", self.fill("site"))
+        self.worker1.get_or_set("redirects", "a", self.fill("redirect"))
+        self.worker2.invalidate("redirects")
+        self.clock.now += 1.0
+
+        self.assertEqual(self.worker1.get_or_set("sites", "a", self.fill("new")), "site")
+        self.assertEqual(self.worker1.get_or_set("redirects", "a", self.fill("new")), "new")
+
+    def test_l1_is_bounded_lru(self):
+        worker = TieredCache(self.worker1.shared, L1_MAX_ENTRIES=2, CHECK_INTERVAL=3600)
+        for key in ("a", "b"):
+            worker.get_or_set("sites", key, self.fill(key))
+        worker.get_or_set("sites", "a", self.fill())  # a is now most recent
+        worker.get_or_set("sites", "c", self.fill("c"))
+
+        self.assertEqual(list(worker._l1), ["sites:a", "sites:c"])
+        self.assertEqual(worker.get_or_set("sites", "b", self.fill()), "b")
+        self.assertEqual(worker.local_stats()[("sites", "l2_hit")], 1)
+
+    def test_l1_entries_expire(self):
+        self.worker1.get_or_set("sites", "a", self.fill("v1"))
+        self.clock.now += 61
+        self.worker1.get_or_set("sites", "a", self.fill("v2"))
+        self.assertEqual(self.worker1.local_stats()[("sites", "l2_hit")], 1)
+
+    def test_stats_are_summed_across_workers(self):
+        self.worker1.get_or_set("sites", "a", self.fill())
+        self.worker1.get_or_set("sites", "a", self.fill())
+        self.worker2.get_or_set("sites", "a", self.fill())
+        self.worker1.flush_stats()
+        self.worker2.flush_stats()
+
+        stats = self.worker1.shared_stats(["sites"])
+        self.assertEqual(stats, {"sites": {"l1_hit": 1, "l2_hit": 1, "miss": 1}})
+        self.assertEqual(self.worker1.local_stats(), {})
@@ -0,0 +1,202 @@
+# portal/tiered_cache.py
+"""
+Two-tier cache for small, hot, rarely changing objects: the site lookup,
+site settings, the index-page registry used by the navigation, the
+taxonomy lists (and each page's taxonomy terms) and the redirect table.
+Page routes use the same generations and L2 but keep their own per-process
+LRU (portal/routing.py).
+
+L1 is a bounded LRU dict inside each worker process; L2 is the shared
+PORTAL_TIERED_CACHE["SHARED"] cache (Redis in production). Values are
+grouped in namespaces, and each namespace has a generation token stored in
+L2. Entries in both tiers are keyed by that token, so ``invalidate`` just
+writes a new token: L2 entries under the old token are never read again
+(and expire), and each worker notices the new token on its next generation
+check, at most CHECK_INTERVAL seconds later, and drops its L1 entries.
+Generation checks are batched: one ``get_many`` for all namespaces per
+interval, not one per lookup.
+
+Hits and misses are counted per namespace and tier in each process and
+added to counters in L2 every STATS_INTERVAL seconds; ``manage.py
+cache_stats`` prints the hit rates across all workers.
+
+L1 hands out the same object to every request in the process, so cached
+values must be treated as read-only.
+
+With a LocMemCache as the shared cache, two ``TieredCache`` instances in
+one process behave like two workers, which is how this can be exercised
+without Redis.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import get_random_string
+
+_KEY_PREFIX = "portal:tc"
+_MISSING = object()
+
+NAMESPACES = ["sites", "site-settings", "index-pages", "taxonomies", "redirects", "routes"]
+
+DEFAULTS = {
+    "SHARED": "default",
+    "L1_MAX_ENTRIES": 1000,
+    "L1_TIMEOUT": 5 * 60,
+    "L2_TIMEOUT": 60 * 60,
+    "CHECK_INTERVAL": 1.0,
+    "STATS_INTERVAL": 30,
+}
+
+
+class TieredCache:
+    def __init__(self, shared=None, **options):
+        self.options = {**DEFAULTS, **getattr(settings, "PORTAL_TIERED_CACHE", {}), **options}
+        self._shared = shared
+        self._l1 = OrderedDict()  # "namespace:key" -> (generation, expires, value)
+        self._lock = threading.RLock()
+        self._generations = {}
+        self._checked_at = 0
+        self._stats = Counter()  # (namespace, "l1_hit" | "l2_hit" | "miss") -> count
+        self._stats_flushed_at = time.monotonic()
+
+    @property
+    def shared(self):
+        if self._shared is None:
+            self._shared = caches[self.options["SHARED"]]
+        return self._shared
+
+    # Generations
+
+    def _generation_key(self, namespace):
+        return f"{_KEY_PREFIX}:gen:{namespace}"
+
+    def _refresh_generations(self, namespaces):
+        keys = {self._generation_key(ns): ns for ns in namespaces}
+        found = self.shared.get_many(list(keys))
+        for key, namespace in keys.items():
+            token = found.get(key)
+            if token is None:
+                token = get_random_string(8)
+                # add(): a concurrent first writer wins and we read theirs back
+                if not self.shared.add(key, token, None):
+                    token = self.shared.get(key, token)
+            self._generations[namespace] = token
+
+    def generation(self, namespace):
+        now = time.monotonic()
+        with self._lock:
+            if namespace not in self._generations or now - self._checked_at >= self.options["CHECK_INTERVAL"]:
+                self._refresh_generations({*self._generations, namespace})
+                self._checked_at = now
+            if now - self._stats_flushed_at >= self.options["STATS_INTERVAL"]:
+                self.flush_stats()
+            return self._generations[namespace]
+
+    def invalidate(self, namespace):
+        """Start a new generation of ``namespace`` in every worker."""
+        token = get_random_string(8)
+        self.shared.set(self._generation_key(namespace), token, None)
+        with self._lock:
+            self._generations[namespace] = token
+            prefix = f"{namespace}:"
+            for key in [key for key in self._l1 if key.startswith(prefix)]:
+                del self._l1[key]
+
+    # Lookups
+
+    def get_or_set(self, namespace, key, fill, timeout=None):
+        """
+        Value of ``key`` in ``namespace`` from L1, else L2, else ``fill()``
+        (stored in both). ``timeout`` applies to L2; L1 uses L1_TIMEOUT.
+        """
+        generation = self.generation(namespace)
+        l1_key = f"{namespace}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            entry = self._l1.get(l1_key)
+            if entry is not None and entry[0] == generation and entry[1] > now:
+                self._l1.move_to_end(l1_key)
+                self._stats[namespace, "l1_hit"] += 1
+                return entry[2]
+
+        l2_key = f"{_KEY_PREFIX}:{namespace}:{generation}:{key}"
+        value = self.shared.get(l2_key, _MISSING)
+        if value is _MISSING:
+            value = fill()
+            self.shared.set(l2_key, value, self.options["L2_TIMEOUT"] if timeout is None else timeout)
+            event = "miss"
+        else:
+            event = "l2_hit"
+
+        with self._lock:
+            self._stats[namespace, event] += 1
+            self._l1[l1_key] = (generation, now + self.options["L1_TIMEOUT"], value)
+            self._l1.move_to_end(l1_key)
+            while len(self._l1) > self.options["L1_MAX_ENTRIES"]:
+                self._l1.popitem(last=False)
+        return value
+
+    def count(self, namespace, event):
+        """Count a lookup of ``namespace`` cached outside ``get_or_set`` (page routes)."""
+        with self._lock:
+            self._stats[namespace, event] += 1
+
+    def clear_local(self):
+        with self._lock:
+            self._l1.clear()
+            self._generations.clear()
+
+    # Metrics
+
+    def _stats_key(self, namespace, event):
+        return f"{_KEY_PREFIX}:stats:{namespace}:{event}"
+
+    def flush_stats(self):
+        """Add this process's counters to the shared ones."""
+        with self._lock:
+            pending, self._stats = self._stats, Counter()
+            self._stats_flushed_at = time.monotonic()
+        for (namespace, event), count in pending.items():
+            key = self._stats_key(namespace, event)
+            self.shared.add(key, 0, None)
+            try:
+                self.shared.incr(key, count)
+            except ValueError:
+                self.shared.set(key, count, None)
+
+    def local_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def shared_stats(self, namespaces=None):
+        """``{namespace: {"l1_hit": n, "l2_hit": n, "miss": n}}`` across all workers."""
+        namespaces = namespaces or NAMESPACES
+        events = ("l1_hit", "l2_hit", "miss")
+        keys = {self._stats_key(ns, event): (ns, event) for ns in namespaces for event in events}
+        found = self.shared.get_many(list(keys))
+        stats = {ns: dict.fromkeys(events, 0) for ns in namespaces}
+        for key, (namespace, event) in keys.items():
+            stats[namespace][event] = found.get(key, 0)
+        return stats
+
+    def reset_stats(self, namespaces=None):
+        namespaces = namespaces or NAMESPACES
+        self.shared.delete_many([
+            self._stats_key(ns, event) for ns in namespaces for event in ("l1_hit", "l2_hit", "miss")
+        ])
+
+
+tiered_cache = TieredCache()
+
+
+def invalidate(namespace):
+    tiered_cache.invalidate(namespace)
+
+
+def cached_list(model):
+    """All rows of a small model (e.g. a taxonomy), in its default ordering."""
+    return tiered_cache.get_or_set(
+        "taxonomies", model._meta.label_lower, lambda: list(model.objects.all())
+    )
@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path("newsletter/subscribe/", views.newsletter_subscribe, name="newsletter_subscribe"),
+    path("newsletter/unsubscribe/<str:token>/", views.newsletter_unsubscribe, name="newsletter_unsubscribe"),
 ]
\ No newline at end of file
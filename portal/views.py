@@ -1,15 +1,40 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from django.shortcuts import render
 from django.contrib import messages
-from django.shortcuts import redirect
-from django.views.decorators.http import require_POST
-from wagtail.models import Site
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
+from wagtail import hooks
+from wagtail.documents import get_document_model
+from wagtail.documents.models import document_served
+from wagtail.documents.views.serve import serve as wagtail_serve
 
+from . import chunked_uploads, rate_limits
+from .campaigns import subscriber_for_token
+from .document_delivery import deliver_document
+from .document_processing import document_preview
 from .forms import FooterNewsletterForm
 from .models import NewsletterSubscriber
+from .sites import site_id_for_request
+from .tasks import index_subscriber_task
 
 
 @require_POST
 def newsletter_subscribe(request):
+    # Counted before validation, so floods never reach the database
+    limited = rate_limits.hit(
+        "newsletter",
+        ip=rate_limits.client_ip(request),
+        email=NewsletterSubscriber.normalise_email(request.POST.get("email")),
+    )
+    if limited:
+        return rate_limits.too_many_requests(limited)
+
     form = FooterNewsletterForm(request.POST)
     next_url = request.POST.get("next") or request.META.get("HTTP_REFERER") or "/"
 
@@ -17,37 +42,21 @@ def newsletter_subscribe(request):
         messages.error(request, "Please enter a valid email address.")
         return redirect(next_url)
 
-    email = form.cleaned_data["email"].strip().lower()
+    email = NewsletterSubscriber.normalise_email(form.cleaned_data["email"])
     source = (request.POST.get("source") or "footer").strip()[:50]
 
-    current_site = None
-    try:
-        current_site = Site.find_for_request(request)
-    except Exception:
-        current_site = None
-
-    subscriber, created = NewsletterSubscriber.objects.get_or_create(
-        email=email,
-        defaults={
-            "site": current_site,
-            "source": source,
-            "status": NewsletterSubscriber.Status.SUBSCRIBED,
-        },
+    subscriber_id, outcome = NewsletterSubscriber.subscribe(
+        email, site_id=site_id_for_request(request), source=source
     )
+    if subscriber_id is not None:
+        # The raw upsert bypasses post_save, so update the admin search index here
+        transaction.on_commit(lambda: index_subscriber_task.enqueue(subscriber_id))
 
-    if created:
+    if outcome == "created":
         messages.success(request, "Thanks for subscribing — you’ll receive updates from SCACAF e-Hub.")
         return redirect(next_url)
 
-    # Existing subscriber found
-    if subscriber.status == NewsletterSubscriber.Status.UNSUBSCRIBED:
-        subscriber.status = NewsletterSubscriber.Status.SUBSCRIBED
-        subscriber.unsubscribed_at = None
-        if current_site and not subscriber.site:
-            subscriber.site = current_site
-        if source and not subscriber.source:
-            subscriber.source = source
-        subscriber.save()
+    if outcome == "reactivated":
         messages.success(request, "Welcome back — your subscription has been re-activated.")
         return redirect(next_url)
 
@@ -55,3 +64,209 @@ def newsletter_subscribe(request):
     return redirect(next_url)
 
 
+# GET only asks for confirmation, since mail scanners prefetch links. The POST
+# comes from that page's button or from a mail client's RFC 8058 one-click
+# request, which has no CSRF token: the signed token is the credential.
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def newsletter_unsubscribe(request, token):
+    subscriber_id = subscriber_for_token(token)
+    if subscriber_id is None:
+        raise Http404("Unknown unsubscribe link.")
+    subscriber = get_object_or_404(NewsletterSubscriber, pk=subscriber_id)
+
+    unsubscribed = subscriber.status == NewsletterSubscriber.Status.UNSUBSCRIBED
+    if request.method == "POST":
+        if NewsletterSubscriber.unsubscribe(subscriber.pk):
+            transaction.on_commit(lambda: index_subscriber_task.enqueue(subscriber.pk))
+        unsubscribed = True
+
+    return render(request, "portal/newsletter_unsubscribe.html", {
+        "subscriber": subscriber,
+        "unsubscribed": unsubscribed,
+    })
+
+
+
+
+# ============================================================
+#  CHUNKED UPLOADS (admin choosers, see portal/chunked_uploads.py)
+# ============================================================
+
+# Answered here: Wagtail's admin turns an uncaught PermissionDenied into a
+# redirect, which the upload script cannot tell from success
+_CHUNKED_FORBIDDEN = {"error": "You do not have permission to upload this kind of file."}
+
+
+def _chunked_session_payload(path, manifest):
+    return {
+        "id": manifest["id"],
+        "chunk_size": manifest["chunk_size"],
+        "total_chunks": manifest["total_chunks"],
+        "total_size": manifest["total_size"],
+        "received": chunked_uploads.received_chunks(path, manifest),
+        "complete": bool(manifest["sha256"]),
+        "sha256": manifest["sha256"],
+    }
+
+
+@require_POST
+def chunked_upload_create(request):
+    try:
+        manifest = chunked_uploads.create_session(
+            request.user,
+            filename=request.POST.get("filename", ""),
+            total_size=int(request.POST.get("size", 0)),
+            chunk_size=int(request.POST.get("chunk_size", 0)),
+            kind=request.POST.get("kind", ""),
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid size."}, status=400)
+    except chunked_uploads.ChunkedUploadError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+    except PermissionDenied:
+        return JsonResponse(_CHUNKED_FORBIDDEN, status=403)
+
+    path, manifest = chunked_uploads.load_session(manifest["id"], request.user)
+    return JsonResponse(_chunked_session_payload(path, manifest), status=201)
+
+
+@require_http_methods(["GET", "DELETE"])
+def chunked_upload_status(request, upload_id):
+    try:
+        path, manifest = chunked_uploads.load_session(upload_id, request.user)
+    except chunked_uploads.ChunkedUploadError as e:
+        return JsonResponse({"error": e.messages[0]}, status=404)
+    except PermissionDenied:
+        return JsonResponse(_CHUNKED_FORBIDDEN, status=403)
+
+    if request.method == "DELETE":
+        chunked_uploads.discard_session(upload_id)
+        return HttpResponse(status=204)
+    return JsonResponse(_chunked_session_payload(path, manifest))
+
+
+@require_http_methods(["PUT"])
+def chunked_upload_chunk(request, upload_id, index):
+    try:
+        path, manifest = chunked_uploads.load_session(upload_id, request.user)
+        # The body is read straight from the WSGI stream, block by block
+        chunked_uploads.store_chunk(
+            path, manifest, index, request, request.headers.get("X-Chunk-SHA256")
+        )
+    except chunked_uploads.ChunkedUploadError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+    except PermissionDenied:
+        return JsonResponse(_CHUNKED_FORBIDDEN, status=403)
+    return JsonResponse({"index": index})
+
+
+@require_POST
+def chunked_upload_complete(request, upload_id):
+    try:
+        path, manifest = chunked_uploads.load_session(upload_id, request.user)
+        manifest = chunked_uploads.complete_session(path, manifest)
+    except chunked_uploads.ChunkedUploadError as e:
+        return JsonResponse({"error": e.messages[0]}, status=400)
+    except PermissionDenied:
+        return JsonResponse(_CHUNKED_FORBIDDEN, status=403)
+    return JsonResponse(_chunked_session_payload(path, manifest))
+
+
+# ============================================================
+#  DOCUMENTS (see portal/document_delivery.py)
+# ============================================================
+
+def _get_document(document_id, document_filename):
+    doc = get_object_or_404(get_document_model(), id=document_id)
+    if doc.filename != document_filename:
+        raise Http404("This document does not match the given filename.")
+    return doc
+
+
+def _before_serve_response(request, doc):
+    """
+    Run Wagtail's before_serve_document hooks (e.g. collection view
+    restrictions); returns the response of a hook that answered instead.
+    """
+    for fn in hooks.get_hooks("before_serve_document"):
+        result = fn(doc, request)
+        if isinstance(result, HttpResponse):
+            return result
+    return None
+
+
+def _document_headers(response):
+    if getattr(settings, "WAGTAILDOCS_BLOCK_EMBEDDED_CONTENT", True):
+        response["Content-Security-Policy"] = "default-src 'none'"
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_document(request, document_id, document_filename):
+    """
+    Replacement for Wagtail's document serve view that runs the same checks
+    and then hands the transfer off (or serves byte ranges itself).
+    """
+    doc = _get_document(document_id, document_filename)
+
+    try:
+        local_path = doc.file.path
+    except NotImplementedError:
+        local_path = None
+    if not local_path or getattr(settings, "WAGTAILDOCS_SERVE_METHOD", None) in ("redirect", "direct"):
+        # Remote storage: Wagtail redirects to (or proxies) the storage URL
+        return wagtail_serve(request, document_id, document_filename)
+
+    response = _before_serve_response(request, doc)
+    if response is not None:
+        return response
+
+    if not os.path.exists(local_path):
+        raise Http404("Document file is missing.")
+
+    # Count downloads only, not every range request the PDF viewer makes
+    if "range" not in request.headers:
+        document_served.send(sender=type(doc), instance=doc, request=request)
+
+    return _document_headers(deliver_document(request, doc, local_path))
+
+
+def _serve_derived_file(request, document_id, document_filename, field_name, content_type):
+    doc = _get_document(document_id, document_filename)
+    response = _before_serve_response(request, doc)
+    if response is not None:
+        return response
+
+    preview = document_preview(doc)
+    field_file = getattr(preview, field_name, None) if preview else None
+    if not field_file:
+        raise Http404("No preview for this document.")
+
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        return redirect(field_file.url)
+    if not os.path.exists(path):
+        raise Http404("Preview file is missing.")
+
+    response = deliver_document(
+        request, doc, path,
+        content_type=content_type,
+        content_disposition="inline",
+        etag=f'"{preview.blob.sha256[:40]}-{field_name}"',
+    )
+    return _document_headers(response)
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_document_preview(request, document_id, document_filename):
+    """First-page PNG preview of a document."""
+    return _serve_derived_file(request, document_id, document_filename, "preview_image", "image/png")
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_document_web(request, document_id, document_filename):
+    """Linearised PDF for the inline viewer."""
+    return _serve_derived_file(request, document_id, document_filename, "web_pdf", "application/pdf")
@@ -0,0 +1,68 @@
+# portal/wagtail_hooks.py
+from django.templatetags.static import static
+from django.urls import path, reverse
+from django.utils.html import format_html
+from wagtail import hooks
+from wagtail.snippets.models import register_snippet
+from wagtail.snippets.views.snippets import IndexView as SnippetIndexView
+from wagtail.snippets.views.snippets import SnippetViewSet
+
+from . import views
+from .conditional import conditional_page_response
+from .models import NewsletterSubscriber
+from .pagination import KeysetIndexViewMixin
+from .surrogate_keys import add_keys, page_keys
+
+
+@hooks.register("register_admin_urls")
+def register_chunked_upload_urls():
+    return [
+        path("chunked-uploads/", views.chunked_upload_create, name="portal_chunked_upload_create"),
+        path("chunked-uploads/<str:upload_id>/", views.chunked_upload_status, name="portal_chunked_upload_status"),
+        path("chunked-uploads/<str:upload_id>/chunks/<int:index>/", views.chunked_upload_chunk, name="portal_chunked_upload_chunk"),
+        path("chunked-uploads/<str:upload_id>/complete/", views.chunked_upload_complete, name="portal_chunked_upload_complete"),
+    ]
+
+
+@hooks.register("insert_global_admin_js")
+def chunked_upload_js():
+    return format_html(
+        '<script src="{}" data-chunked-upload-url="{}" defer></script>',
+        static("portal/js/chunked_upload.js"),
+        reverse("portal_chunked_upload_create"),
+    )
+
+
+# Inside Wagtail's view restriction check
+@hooks.register("on_serve_page", order=100)
+def answer_conditional_requests(next_serve_page):
+    def inner(page, request, serve_args, serve_kwargs):
+        response = conditional_page_response(page, request)
+        if response is not None:
+            return response
+        return next_serve_page(page, request, serve_args, serve_kwargs)
+
+    return inner
+
+
+# Only pages actually rendered (not 304s) need their surrogate keys
+@hooks.register("on_serve_page", order=200)
+def tag_served_page(next_serve_page):
+    def inner(page, request, serve_args, serve_kwargs):
+        add_keys(request, page_keys(page))
+        return next_serve_page(page, request, serve_args, serve_kwargs)
+
+    return inner
+
+
+class NewsletterSubscriberIndexView(KeysetIndexViewMixin, SnippetIndexView):
+    keyset_field = "subscribed_at"
+
+
+class NewsletterSubscriberViewSet(SnippetViewSet):
+    model = NewsletterSubscriber
+    index_view_class = NewsletterSubscriberIndexView
+    index_results_template_name = "portal/admin/snippet_keyset_index_results.html"
+
+
+register_snippet(NewsletterSubscriberViewSet)